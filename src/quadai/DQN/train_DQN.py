@@ -2,42 +2,24 @@
 train_DQN.py
 Train a DQN agent with improved parameters, more steps, and evaluation callback.
 Ensure env_DQN is updated with reward shaping.
+Experience is collected from batches of drones by quadai.train (see there
+for every option), e.g.
+python train_DQN.py --workers 4 --seed 0
 """
 
-import os
-from stable_baselines3 import DQN
-from stable_baselines3.common.callbacks import EvalCallback
-from stable_baselines3.common.monitor import Monitor
-import gym
 import sys
 
-# Assume env_DQN.py is in the same directory
-from env_DQN import droneEnv
-
-# Create log dir
-log_dir = "tmp_dqn/"
-os.makedirs(log_dir, exist_ok=True)
-
-# Create and wrap the environment
-env = droneEnv(False, False, width=900, height=900)
-env = Monitor(env, log_dir)
-
-eval_env = droneEnv(False, False, width=900, height=900)
-
-model = DQN(
-    "MlpPolicy", env, verbose=1, tensorboard_log=log_dir,
-    learning_rate=5e-5,  # improved hyperparam
-    batch_size=128,
-    buffer_size=1000000,
-    exploration_fraction=0.2,
-    gamma=0.99,
-    policy_kwargs={"net_arch": [256,256]}
-)
-
-eval_callback = EvalCallback(eval_env, best_model_save_path='./dqn_logs/',
-                             log_path='./dqn_logs/', eval_freq=50000,
-                             deterministic=True, render=False)
-
-model.learn(total_timesteps=1000000, callback=eval_callback)
-
-model.save("dqn_improved_model.zip")
\ No newline at end of file
+from quadai.train import main
+
+if __name__ == "__main__":
+    main(
+        sys.argv[1:], algo="DQN",
+        total_timesteps=1000000,
+        envs_per_worker=64,
+        replay_ratio=0.25,  # one gradient step per 4 transitions, as with a single env and train_freq=4
+        log_dir="tmp_dqn/",
+        eval_dir="./dqn_logs/",
+        # Resumed from here when run again after a crash or a stop
+        checkpoint_dir="tmp_dqn/checkpoint/",
+        save_path="dqn_improved_model.zip",
+    )
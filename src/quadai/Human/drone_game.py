@@ -5,25 +5,27 @@ The game
 import pygame
 import os
 from pygame.locals import *
-from math import sin, cos, pi, sqrt
+from math import sqrt
 from random import randrange
 
+from quadai import physics
+
 # Game constants
 FPS = 60
 WIDTH = 800
 HEIGHT = 800
 
 # Physics constants
-gravity = 0.08
+gravity = physics.GRAVITY
 # Propeller force for UP and DOWN
 thruster_amplitude = 0.04
 # Propeller force for LEFT and RIGHT rotations
 diff_amplitude = 0.003
 # By default, thruster will apply a force of thruster_mean
 thruster_mean = 0.04
-mass = 1
+mass = physics.MASS
 # Length from center of mass to propeller
-arm = 25
+arm = physics.ARM
 
 # Initialize Pygame, load sprites
 FramePerSec = pygame.time.Clock()
@@ -124,11 +126,6 @@ while True:
     step += 1
 
     if dead == False:
-        # Initialize accelerations
-        x_acceleration = 0
-        y_acceleration = gravity
-        angular_acceleration = 0
-
         # Calculate propeller force in function of input
         thruster_left = thruster_mean
         thruster_right = thruster_mean
@@ -144,24 +141,30 @@ while True:
         if pressed_keys[K_RIGHT]:
             thruster_right -= diff_amplitude
 
-        # Calculate accelerations according to Newton's laws of motion
-        x_acceleration += (
-            -(thruster_left + thruster_right) * sin(angle * pi / 180) / mass
-        )
-        y_acceleration += (
-            -(thruster_left + thruster_right) * cos(angle * pi / 180) / mass
+        # Calculate accelerations, speed and position
+        (
+            x_position,
+            x_speed,
+            y_position,
+            y_speed,
+            angle,
+            angular_speed,
+            x_acceleration,
+            y_acceleration,
+            angular_acceleration,
+        ) = physics.step(
+            x_position,
+            x_speed,
+            y_position,
+            y_speed,
+            angle,
+            angular_speed,
+            thruster_left,
+            thruster_right,
+            gravity,
+            mass,
+            arm,
         )
-        angular_acceleration += arm * (thruster_right - thruster_left) / mass
-
-        # Calculate speed
-        x_speed += x_acceleration
-        y_speed += y_acceleration
-        angular_speed += angular_acceleration
-
-        # Calculate position
-        x_position += x_speed
-        y_position += y_speed
-        angle += angular_speed
 
         # Calculate distance to target
         dist = sqrt((x_position - x_target) ** 2 + (y_position - y_target) ** 2)
@@ -0,0 +1,77 @@
+"""
+Cascaded position controller for many drones at once, built from PIDBanks
+
+Same loops as PIDPlayer, one row per drone:
+- x position error -> target angle (xPID), angle error -> thrust difference (aPID)
+- y position error -> target vertical speed (yPID), speed error -> mean thrust (ydPID)
+
+The two outputs are in [-1, 1] like the continuous actions of env_SAC, so
+they can drive DroneVecEnv (discrete_actions=False) directly.
+"""
+
+import json
+
+import numpy as np
+
+from quadai.PID.controller_PID import PIDBank
+
+# KP, KI, KD, saturation_max, saturation_min of each loop, as tuned for PIDPlayer
+DEFAULT_GAINS = {
+    "x": (0.2, 0, 0.2, 25, -25),
+    "a": (0.02, 0, 0.01, 1, -1),
+    "y": (2.5, 0, 1.5, 100, -100),
+    "yd": (1, 0, 0, 1, -1),
+}
+
+LOOPS = ("x", "a", "y", "yd")
+
+
+def load_gains(path):
+    """Gains of every loop from a JSON file written by save_gains (e.g. by python -m quadai.PID.tune)."""
+    with open(path) as f:
+        gains = json.load(f)["gains"]
+    return {loop: tuple(gains[loop]) for loop in LOOPS}
+
+
+def save_gains(path, gains, **info):
+    """Write gains, plus any extra information (how they were found), to a JSON file."""
+    with open(path, "w") as f:
+        json.dump(dict(info, gains={loop: [float(v) for v in gains[loop]] for loop in LOOPS}), f, indent=2)
+
+
+class CascadePositionController:
+    def __init__(self, size, gains=DEFAULT_GAINS):
+        self.banks = {loop: PIDBank(*gains[loop], size=size) for loop in LOOPS}
+
+    @classmethod
+    def from_pids(cls, pids):
+        """Controller for drones given as (xPID, aPID, yPID, ydPID) tuples, with their gains and state."""
+        controller = cls.__new__(cls)
+        controller.banks = {loop: PIDBank.from_pids([p[i] for p in pids]) for i, loop in enumerate(LOOPS)}
+        return controller
+
+    def __len__(self):
+        return len(self.banks["x"])
+
+    def reset(self, mask=None):
+        for bank in self.banks.values():
+            bank.reset(mask)
+
+    def store(self, i, pids):
+        """Copy the state of drone i into its (xPID, aPID, yPID, ydPID)."""
+        for loop, pid in zip(LOOPS, pids):
+            self.banks[loop].store(i, pid)
+
+    def compute(self, obs, dt, index=None):
+        """(action0, action1) arrays for obs rows (error_x, xd, error_y, yd, a, ad) of all drones or those in index."""
+        obs = np.asarray(obs, dtype=np.float64)
+        error_x, xd, error_y, yd, a, ad = obs.T
+
+        ac = self.banks["x"].compute(-error_x, dt, index)
+        error_a = ac - a
+        action1 = self.banks["a"].compute(-error_a, dt, index)
+
+        ydc = self.banks["y"].compute(error_y, dt, index)
+        error_yd = ydc - yd
+        action0 = self.banks["yd"].compute(-error_yd, dt, index)
+        return action0, action1
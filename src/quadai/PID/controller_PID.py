@@ -1,7 +1,9 @@
 """
-Simple PID Controller
+Simple PID Controller, and a bank of them stepped with NumPy
 """
 
+import numpy as np
+
 class PID:
     def __init__(self, KP, KI, KD, saturation_max, saturation_min):
         self.kp = KP
@@ -22,3 +24,78 @@ class PID:
         elif self.saturation_min is not None and output < self.saturation_min:
             output = self.saturation_min
         return output
+
+
+class PIDBank:
+    """Many PID controllers computed together.
+
+    Gains, saturation limits, integrators and last errors are arrays with one
+    entry per controller (scalars are broadcast to size). None as a limit
+    means no saturation on that side, as for PID.
+    """
+
+    def __init__(self, KP, KI, KD, saturation_max, saturation_min, size=None):
+        saturation_max = np.inf if saturation_max is None else saturation_max
+        saturation_min = -np.inf if saturation_min is None else saturation_min
+        params = [np.asarray(p, dtype=np.float64) for p in (KP, KI, KD, saturation_max, saturation_min)]
+        if size is None:
+            size = max([p.size for p in params])
+        self.kp, self.ki, self.kd, self.saturation_max, self.saturation_min = [
+            np.array(np.broadcast_to(p, (size,))) for p in params
+        ]
+        self.error_last = np.zeros(size)
+        self.integral_error = np.zeros(size)
+
+    @classmethod
+    def from_pids(cls, pids):
+        """Bank with the gains, limits and current state of PID instances, in order."""
+        bank = cls(
+            [p.kp for p in pids], [p.ki for p in pids], [p.kd for p in pids],
+            [p.saturation_max if p.saturation_max is not None else np.inf for p in pids],
+            [p.saturation_min if p.saturation_min is not None else -np.inf for p in pids],
+            len(pids),
+        )
+        bank.error_last[:] = [p.error_last for p in pids]
+        bank.integral_error[:] = [p.integral_error for p in pids]
+        return bank
+
+    def __len__(self):
+        return len(self.kp)
+
+    def reset(self, mask=None):
+        """Clear the state of the controllers in mask (all of them by default)."""
+        if mask is None:
+            mask = slice(None)
+        self.error_last[mask] = 0
+        self.integral_error[mask] = 0
+
+    def store(self, i, pid):
+        """Copy the state of controller i into a PID instance."""
+        pid.error_last = float(self.error_last[i])
+        pid.integral_error = float(self.integral_error[i])
+
+    def compute(self, error, dt, index=None):
+        """Outputs of every controller, or only of those in index (an integer array), for one step.
+
+        Same arithmetic as PID.compute, element by element.
+        """
+        if index is None:
+            error_last, integral_error = self.error_last, self.integral_error
+            kp, ki, kd, saturation_max, saturation_min = self.kp, self.ki, self.kd, self.saturation_max, self.saturation_min
+        else:
+            error_last, integral_error = self.error_last[index], self.integral_error[index]
+            kp, ki, kd = self.kp[index], self.ki[index], self.kd[index]
+            saturation_max, saturation_min = self.saturation_max[index], self.saturation_min[index]
+
+        derivative_error = (error - error_last) / dt
+        integral_error = integral_error + error * dt
+        output = kp * error + ki * integral_error + kd * derivative_error
+        output = np.minimum(np.maximum(output, saturation_min), saturation_max)
+
+        if index is None:
+            self.error_last[:] = error
+            self.integral_error[:] = integral_error
+        else:
+            self.error_last[index] = error
+            self.integral_error[index] = integral_error
+        return output
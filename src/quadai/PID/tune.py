@@ -0,0 +1,281 @@
+"""
+Offline tuning of the cascaded PID gains with CMA-ES
+
+A candidate gain set is scored by flying it headless over a fixed set of
+random target sequences in the arena of a simulation, with the balloon game
+rules (reach within 50 px, lost beyond 1000 px and respawned after 3 s).
+The score is the mean number of targets reached per sequence, minus
+--loss-penalty per loss. Every (candidate, sequence) pair is one drone and
+all of them fly in one vectorized rollout; the population of each
+generation is split over a process pool.
+
+The non-zero KP/KD gains are searched in log space around DEFAULT_GAINS
+(integral gains and saturation limits stay as they are), so the search is
+scale-free and never flips a gain's sign.
+
+Usage:
+python -m quadai.PID.tune --sim sim3 --generations 60 --out pid_gains.json
+python -m quadai sim3 --pid-gains pid_gains.json
+"""
+
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+from quadai import physics
+from quadai.PID.cascade import DEFAULT_GAINS, LOOPS, CascadePositionController, save_gains
+from quadai.simulations import get_simulation, generate_targets
+
+# Where a game drone starts (Player's initial position), and its thrust mapping as a PIDPlayer
+START_POSITION = (400, 400)
+THRUSTER_MEAN = 0.04
+THRUSTER_AMPLITUDE = 0.04
+DIFF_AMPLITUDE = 0.003
+
+# (loop, index of KP/KI/KD) of every tuned gain
+TUNED = [(loop, k) for loop in LOOPS for k in range(3) if DEFAULT_GAINS[loop][k] != 0]
+
+
+class CMAES:
+    """(mu/mu_w, lambda)-CMA-ES minimizing a function of R^n, with the default settings of Hansen's tutorial."""
+
+    def __init__(self, mean, sigma, population=None, seed=None):
+        n = len(mean)
+        self.n = n
+        self.mean = np.array(mean, dtype=np.float64)
+        self.sigma = sigma
+        self.population = population or 4 + int(3 * np.log(n))
+        self.mu = self.population // 2
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1 / np.sum(self.weights**2)
+
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3)**2 + self.mueff)
+        self.cmu = min(1 - self.c1, 2 * (self.mueff - 2 + 1 / self.mueff) / ((n + 2)**2 + self.mueff))
+        self.damps = 1 + 2 * max(0, np.sqrt((self.mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n**2))
+
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.B = np.eye(n)
+        self.D = np.ones(n)
+        self.C = np.eye(n)
+        self.generation = 0
+        self.rng = np.random.default_rng(seed)
+
+    def ask(self):
+        """population candidate points, one per row."""
+        z = self.rng.standard_normal((self.population, self.n))
+        return self.mean + self.sigma * (z * self.D) @ self.B.T
+
+    def tell(self, solutions, values):
+        """Update the distribution from the points of ask() and their function values (lower is better)."""
+        n = self.n
+        best = np.argsort(values)[:self.mu]
+        y = (solutions[best] - self.mean) / self.sigma
+        y_w = self.weights @ y
+        self.mean = self.mean + self.sigma * y_w
+
+        c_inv_sqrt = self.B @ np.diag(1 / self.D) @ self.B.T
+        self.ps = (1 - self.cs) * self.ps + np.sqrt(self.cs * (2 - self.cs) * self.mueff) * c_inv_sqrt @ y_w
+        ps_norm = np.linalg.norm(self.ps) / np.sqrt(1 - (1 - self.cs)**(2 * (self.generation + 1)))
+        hsig = ps_norm / self.chi_n < 1.4 + 2 / (n + 1)
+        self.pc = (1 - self.cc) * self.pc + hsig * np.sqrt(self.cc * (2 - self.cc) * self.mueff) * y_w
+
+        rank_one = np.outer(self.pc, self.pc) + (1 - hsig) * self.cc * (2 - self.cc) * self.C
+        rank_mu = (y.T * self.weights) @ y
+        self.C = (1 - self.c1 - self.cmu) * self.C + self.c1 * rank_one + self.cmu * rank_mu
+        self.sigma *= np.exp((self.cs / self.damps) * (np.linalg.norm(self.ps) / self.chi_n - 1))
+
+        self.C = (self.C + self.C.T) / 2
+        eigenvalues, self.B = np.linalg.eigh(self.C)
+        self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+        self.generation += 1
+
+
+def gains_from_vector(vector, base=DEFAULT_GAINS):
+    """Gain set with every TUNED gain of base scaled by exp of the matching vector entry."""
+    gains = {loop: list(base[loop]) for loop in LOOPS}
+    for (loop, k), value in zip(TUNED, vector):
+        gains[loop][k] = base[loop][k] * float(np.exp(value))
+    return {loop: tuple(gains[loop]) for loop in LOOPS}
+
+
+def make_sequences(sim_mode, count, length, seed):
+    """count target sequences of the simulation's arena, as an array (count, length, 2)."""
+    settings = get_simulation(sim_mode)
+    rng = random.Random(seed)
+    return np.array([generate_targets(sim_mode, settings["width"], settings["height"], length, rng) for _ in range(count)],
+                    dtype=np.float64)
+
+
+def rollout(gain_sets, targets, duration, width, height, dt=1/60, respawn_time=3):
+    """Mean targets reached and mean losses per sequence of each gain set.
+
+    Every gain set flies every sequence of targets (count, length, 2); all of
+    those drones are stepped together.
+    """
+    n_sets, n_sequences = len(gain_sets), len(targets)
+    size = n_sets * n_sequences
+    gains = {
+        loop: tuple(np.repeat([g[loop][k] for g in gain_sets], n_sequences) for k in range(5))
+        for loop in LOOPS
+    }
+    controller = CascadePositionController(size, gains)
+    sequence = np.tile(np.arange(n_sequences), n_sets)
+    last_target = targets.shape[1] - 1
+
+    x = np.full(size, float(START_POSITION[0]))
+    y = np.full(size, float(START_POSITION[1]))
+    xd, yd, a, ad = np.zeros(size), np.zeros(size), np.zeros(size), np.zeros(size)
+    state = (x, xd, y, yd, a, ad)
+    counter = np.zeros(size, dtype=np.int64)
+    losses = np.zeros(size, dtype=np.int64)
+    respawn_timer = np.zeros(size)
+
+    for _ in range(int(round(duration / dt))):
+        alive = respawn_timer <= 0
+        index = None if alive.all() else np.flatnonzero(alive)
+        target = targets[sequence, np.minimum(counter, last_target)]
+        xt, yt = target[:, 0], target[:, 1]
+
+        obs = np.stack([xt - x, xd, yt - y, yd, a, ad], axis=1)
+        if index is None:
+            action0, action1 = controller.compute(obs, dt)
+            thruster_left = THRUSTER_MEAN + action0 * THRUSTER_AMPLITUDE + action1 * DIFF_AMPLITUDE
+            thruster_right = THRUSTER_MEAN + action0 * THRUSTER_AMPLITUDE - action1 * DIFF_AMPLITUDE
+            physics.step_batch(x, xd, y, yd, a, ad, thruster_left, thruster_right)
+        else:
+            action0, action1 = controller.compute(obs[index], dt, index)
+            thruster_left = THRUSTER_MEAN + action0 * THRUSTER_AMPLITUDE + action1 * DIFF_AMPLITUDE
+            thruster_right = THRUSTER_MEAN + action0 * THRUSTER_AMPLITUDE - action1 * DIFF_AMPLITUDE
+            alive_state = [s[index] for s in state]
+            physics.step_batch(*alive_state, thruster_left, thruster_right)
+            for s, new in zip(state, alive_state):
+                s[index] = new
+
+        dist = np.sqrt((x - xt)**2 + (y - yt)**2)
+        reached = alive & (dist < 50)
+        lost = alive & ~reached & (dist > 1000)
+        counter[reached] += 1
+        losses[lost] += 1
+        respawn_timer[lost] = respawn_time
+
+        # Dead drones wait out their timer, then restart from the middle of the arena
+        dead = ~alive
+        respawn_timer[dead] -= dt
+        respawn = dead & (respawn_timer < 0)
+        x[respawn] = width / 2
+        y[respawn] = height / 2
+        for s in (xd, yd, a, ad):
+            s[respawn] = 0
+        respawn_timer[respawn] = 0
+
+    return counter.reshape(n_sets, n_sequences).mean(axis=1), losses.reshape(n_sets, n_sequences).mean(axis=1)
+
+
+def _rollout(args):
+    return rollout(*args)
+
+
+def evaluate(pool, workers, gain_sets, targets, duration, width, height, loss_penalty):
+    """Score of every gain set (higher is better), with the sets split over the pool's workers."""
+    chunks = [c for c in np.array_split(np.arange(len(gain_sets)), workers) if len(c)]
+    jobs = [([gain_sets[i] for i in chunk], targets, duration, width, height) for chunk in chunks]
+    results = pool.map(_rollout, jobs) if pool is not None else map(_rollout, jobs)
+    reached, losses = (np.concatenate(r) for r in zip(*results))
+    return reached - loss_penalty * losses, reached, losses
+
+
+def tune(sim_mode="sim3", generations=40, population=None, sequences=32, duration=60, sigma=0.5,
+         loss_penalty=1.0, seed=0, workers=None, verbose=True):
+    """CMA-ES search of the PID gains; returns the best gains and the search statistics."""
+    settings = get_simulation(sim_mode)
+    width, height = settings["width"], settings["height"]
+    # Enough targets per sequence that even a perfect drone can't run out (one target per 0.3 s)
+    length = int(duration / 0.3) + 1
+    targets = make_sequences(sim_mode, sequences, length, seed)
+    held_out = make_sequences(sim_mode, sequences, length, seed + 1)
+
+    es = CMAES(np.zeros(len(TUNED)), sigma, population, seed)
+    workers = workers or os.cpu_count()
+    pool = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=workers)
+
+    try:
+        best_vector, best_score = np.zeros(len(TUNED)), -np.inf
+        start = time.time()
+        for generation in range(generations):
+            vectors = es.ask()
+            # The current mean rides along, so the best-so-far is not just a lucky sample
+            vectors = np.vstack([vectors, es.mean])
+            scores, reached, losses = evaluate(pool, workers, [gains_from_vector(v) for v in vectors],
+                                               targets, duration, width, height, loss_penalty)
+            es.tell(vectors[:-1], -scores[:-1])
+            i = int(np.argmax(scores))
+            if scores[i] > best_score:
+                best_vector, best_score = vectors[i], scores[i]
+            if verbose:
+                print("generation {:>3}  best {:7.2f}  mean {:7.2f}  reached {:6.2f}  losses {:5.2f}  sigma {:.3f}  {:.0f}s".format(
+                    generation, scores[i], scores[:-1].mean(), reached[i], losses[i], es.sigma, time.time() - start))
+
+        # Compare with the hand-tuned gains on sequences the search never saw
+        final = [gains_from_vector(best_vector), DEFAULT_GAINS]
+        scores, reached, losses = evaluate(pool, workers, final, held_out, duration, width, height, loss_penalty)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    stats = {
+        "sim_mode": sim_mode,
+        "generations": generations,
+        "sequences": sequences,
+        "duration": duration,
+        "seed": seed,
+        "held_out": {
+            "tuned": {"score": float(scores[0]), "reached": float(reached[0]), "losses": float(losses[0])},
+            "default": {"score": float(scores[1]), "reached": float(reached[1]), "losses": float(losses[1])},
+        },
+    }
+    return final[0], stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m quadai.PID.tune")
+    parser.add_argument("--sim", default="sim3", choices=["sim1", "sim2", "sim3", "swarm"], help="arena to tune for")
+    parser.add_argument("--generations", type=int, default=40)
+    parser.add_argument("--population", type=int, default=None, help="candidates per generation (default: CMA-ES default)")
+    parser.add_argument("--sequences", type=int, default=32, help="target sequences every candidate flies")
+    parser.add_argument("--duration", type=float, default=60, help="seconds flown per sequence")
+    parser.add_argument("--sigma", type=float, default=0.5, help="initial step size, in log-gain units")
+    parser.add_argument("--loss-penalty", type=float, default=1.0, help="score lost per drone loss, in targets")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--out", default="pid_gains.json")
+    parser.add_argument("--force", action="store_true",
+                        help="write the tuned gains even if they do not beat the defaults on the held-out sequences")
+    args = parser.parse_args(argv)
+
+    gains, stats = tune(args.sim, args.generations, args.population, args.sequences, args.duration, args.sigma,
+                        args.loss_penalty, args.seed, args.workers)
+    held_out = stats["held_out"]
+    print("held-out score: tuned {:.2f}, default {:.2f}".format(held_out["tuned"]["score"], held_out["default"]["score"]))
+    if held_out["tuned"]["score"] <= held_out["default"]["score"]:
+        if not args.force:
+            print("WARNING: the tuned gains do not beat the defaults on the held-out sequences, {} not written"
+                  " (--force writes them anyway)".format(args.out))
+            return
+        print("WARNING: the tuned gains do not beat the defaults on the held-out sequences, writing them (--force)")
+    save_gains(args.out, gains, **stats)
+    print("gains written to", args.out)
+
+
+if __name__ == "__main__":
+    main()
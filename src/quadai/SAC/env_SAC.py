@@ -7,35 +7,33 @@ import os
 import gym
 from gym import spaces
 import numpy as np
-import pygame
-from math import sin, cos, pi, sqrt
-from pygame.locals import *
+from math import pi, sqrt
+
+from quadai import physics
 
 class droneEnv(gym.Env):
-    def __init__(self, render_every_frame=False, mouse_target=False, width=900, height=900):
+    def __init__(self, render_every_frame=False, mouse_target=False, width=900, height=900, scenarios=None,
+                 targets_per_episode=1, time_limit=20):
         super(droneEnv, self).__init__()
         self.render_every_frame = render_every_frame
         self.mouse_target = mouse_target
         self.width = width
         self.height = height
+        # quadai.scenarios.ScenarioGenerator drawing start states and targets (with np.random), if any
+        self.scenarios = scenarios
+        # Targets to reach in one episode, each within time_limit seconds (more than one: like the balloon game)
+        self.targets_per_episode = targets_per_episode
+        self.time_limit = time_limit
 
-        pygame.init()
-        if self.render_every_frame:
-            self.screen = pygame.display.set_mode((self.width, self.height))
-        self.FramePerSec = pygame.time.Clock()
-
-        self.player = pygame.Surface((10,10))
-        self.player.fill((255,0,0))
-
-        self.target = pygame.Surface((10,10))
-        self.target.fill((0,255,0))
+        # Built on first render, so headless training never imports pygame
+        self.renderer = None
 
-        self.gravity = 0.08
+        self.gravity = physics.GRAVITY
         self.thruster_amplitude = 0.04
         self.diff_amplitude = 0.003
         self.thruster_mean = 0.04
-        self.mass = 1
-        self.arm = 25
+        self.mass = physics.MASS
+        self.arm = physics.ARM
 
         # SAC action space is continuous: 2 actions (thrust and diff)
         self.action_space = spaces.Box(low=-1, high=1, shape=(2,))
@@ -47,11 +45,17 @@ class droneEnv(gym.Env):
         (self.a, self.ad, self.add)=(0,0,0)
         (self.x, self.xd, self.xdd)=(self.width/2,0,0)
         (self.y, self.yd, self.ydd)=(self.height/2,0,0)
-        self.xt = np.random.randint(self.width/4, 3*self.width/4)
-        self.yt = np.random.randint(self.height/4, 3*self.height/4)
+        if self.scenarios is not None:
+            scenario = self.scenarios.draw(np.random, 1)
+            (self.x, self.xd, self.y, self.yd, self.a, self.ad, self.xt, self.yt) = (
+                float(scenario[name][0]) for name in ("x", "xd", "y", "yd", "a", "ad", "xt", "yt"))
+        else:
+            self.xt = np.random.randint(self.width/4, 3*self.width/4)
+            self.yt = np.random.randint(self.height/4, 3*self.height/4)
 
         self.time = 0
-        self.time_limit = 20
+        self.targets_reached = 0
+        self.target_reward = 0.0
         self.prev_dist = sqrt((self.xt - self.x)**2 + (self.yt - self.y)**2)
 
         if self.render_every_frame:
@@ -59,6 +63,15 @@ class droneEnv(gym.Env):
 
         return self._get_obs()
 
+    def _next_target(self):
+        if self.scenarios is not None:
+            xt, yt = self.scenarios.targets(np.random, np.array([self.x]), np.array([self.y]))
+            (self.xt, self.yt) = (float(xt[0]), float(yt[0]))
+        else:
+            self.xt = np.random.randint(self.width/4, 3*self.width/4)
+            self.yt = np.random.randint(self.height/4, 3*self.height/4)
+        self.time = 0
+
     def _get_obs(self):
         angle_to_up = self.a / 180 * pi
         velocity = sqrt(self.xd**2 + self.yd**2)
@@ -83,20 +96,9 @@ class droneEnv(gym.Env):
         thruster_left += action1 * self.diff_amplitude
         thruster_right -= action1 * self.diff_amplitude
 
-        self.xdd = 0
-        self.ydd = self.gravity
-        self.add = 0
-
-        self.xdd += (-(thruster_left+thruster_right)*sin(self.a*pi/180)/self.mass)
-        self.ydd += (-(thruster_left+thruster_right)*cos(self.a*pi/180)/self.mass)
-        self.add += self.arm*(thruster_right-thruster_left)/self.mass
-
-        self.xd += self.xdd
-        self.yd += self.ydd
-        self.ad += self.add
-        self.x += self.xd
-        self.y += self.yd
-        self.a += self.ad
+        (self.x, self.xd, self.y, self.yd, self.a, self.ad, self.xdd, self.ydd, self.add) = physics.step(
+            self.x, self.xd, self.y, self.yd, self.a, self.ad,
+            thruster_left, thruster_right, self.gravity, self.mass, self.arm)
 
         dist = sqrt((self.x - self.xt)**2+(self.y - self.yt)**2)
 
@@ -104,10 +106,6 @@ class droneEnv(gym.Env):
         if dist < old_dist:
             self.reward += 0.05
 
-        if dist < 50:
-            self.reward += 100
-            done = True
-
         if dist > 1000:
             self.reward -= 1000
             done = True
@@ -115,21 +113,44 @@ class droneEnv(gym.Env):
         if self.time > self.time_limit:
             done = True
 
+        # Reached target: on to the next one, unless it was the last of the episode
+        info = {}
+        reached = dist < 50
+        if reached:
+            self.reward += 100
+            self.targets_reached += 1
+            info["target_reward"] = self.target_reward + self.reward
+            info["target_time"] = self.time
+            self.target_reward = 0.0
+            if self.targets_reached >= self.targets_per_episode:
+                done = True
+            elif not done:
+                self._next_target()
+        else:
+            self.target_reward += self.reward
+        if done:
+            info["targets_reached"] = self.targets_reached
+
+        if self.scenarios is not None and (reached or done):
+            self.scenarios.record(reached)
+
         if self.render_every_frame:
             self.render("yes")
 
-        return self._get_obs(), self.reward, done, {}
+        return self._get_obs(), self.reward, done, info
+
+    def _get_renderer(self):
+        if self.renderer is None:
+            from quadai.rendering import EnvRenderer
+            self.renderer = EnvRenderer(self.width, self.height)
+        return self.renderer
 
     def render(self, mode):
         if self.render_every_frame:
-            pygame.event.get()
-            self.screen.fill((0,0,0))
-            self.screen.blit(self.target,(self.xt-5,self.yt-5))
-            rotated_player = pygame.transform.rotate(self.player,self.a)
-            self.screen.blit(rotated_player,(self.x-5,self.y-5))
-            pygame.display.update()
-            self.FramePerSec.tick(60)
+            self._get_renderer().draw(self.x, self.y, self.a, self.xt, self.yt)
 
     def close(self):
-        pass
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
 
@@ -1,39 +1,24 @@
 """
 train_SAC.py
-Train an SAC agent with improved hyperparameters, more steps, EvalCallback.
-Use env_SAC with reward shaping.
+Train an SAC agent with improved hyperparameters, more steps, and evaluations.
+Use env_SAC with reward shaping, collected from batches of drones by
+quadai.train (see there for every option), e.g.
+python train_SAC.py --workers 8 --envs-per-worker 16 --replay-ratio 0.5 --seed 0
 """
 
-import os
-from stable_baselines3 import SAC
-from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common.callbacks import EvalCallback
-import pandas as pd
-
-from env_SAC import droneEnv
-
-log_dir = "tmp_sac/"
-os.makedirs(log_dir, exist_ok=True)
-
-env = droneEnv(render_every_frame=False, mouse_target=False, width=900, height=900)
-env = Monitor(env, log_dir)
-
-eval_env = droneEnv(render_every_frame=False, mouse_target=False, width=900, height=900)
-
-model = SAC(
-    "MlpPolicy", env, verbose=1, tensorboard_log=log_dir,
-    learning_rate=1e-4,  # lower learning rate
-    batch_size=256,
-    buffer_size=500000,
-    tau=0.02,
-    gamma=0.99,
-    policy_kwargs={"net_arch":[256,256]}
-)
-
-eval_callback = EvalCallback(eval_env, best_model_save_path='./sac_logs/',
-                             log_path='./sac_logs/', eval_freq=50000,
-                             deterministic=True, render=False)
-
-model.learn(total_timesteps=6000000, callback=eval_callback)
-
-model.save("sac_improved_model.zip")
+import sys
+
+from quadai.train import main
+
+if __name__ == "__main__":
+    main(
+        sys.argv[1:], algo="SAC",
+        total_timesteps=6000000,
+        envs_per_worker=64,
+        replay_ratio=1.0,  # one gradient step per collected transition, as with a single env
+        log_dir="tmp_sac/",
+        eval_dir="./sac_logs/",
+        # Resumed from here when run again after a crash or a stop
+        checkpoint_dir="tmp_sac/checkpoint/",
+        save_path="sac_improved_model.zip",
+    )
@@ -4,27 +4,76 @@ We have 3 simulations:
 - sim1 (default): Human, PID, SAC(v2_5000000), DQN
 - sim2: Manual(Human), PID, SAC1(v1_3330000), SAC2(v2_5000000)
 - sim3: Same drones as sim1 but bigger window and more targets
+- swarm: Human against many PID, SAC and DQN drones in the sim3 arena
 
 Usage:
-python -m quadai        -> sim1
-python -m quadai sim1   -> sim1
-python -m quadai sim2   -> sim2
-python -m quadai sim3   -> sim3
+python -m quadai            -> sim1
+python -m quadai sim1       -> sim1
+python -m quadai sim2       -> sim2
+python -m quadai sim3       -> sim3
+python -m quadai swarm      -> swarm of 60 AI drones
+python -m quadai swarm 150  -> swarm of 150 AI drones
+
+Options:
+--fast              AI drones only, simulated as fast as the CPU allows
+--render-every N    with --fast, draw one frame every N physics ticks (0: never)
+--fps F             frames drawn per second in real time (physics stays at 60 Hz)
+--time T            simulation time in seconds, skipping the menu
+--exported          run SAC and DQN through NumPy exports of their models
+--profile [FILE]    show frame timings on screen and write their histograms to FILE (profile.json)
+--pid-gains FILE    gains of the PID drones, from python -m quadai.PID.tune
+--record FILE       record the match, tick by tick, to FILE
+--replay FILE       watch a recorded match again (no controllers run)
+--speed S           with --replay, play S times faster than real time (e.g. 0.25, 4)
+--scenario LEVEL    draw the targets from a level of quadai.scenarios (near, medium, env, ...)
+
+python -m quadai sim3 --fast --render-every 0 --time 250
 """
 
-import sys
+import argparse
 import warnings
-import quadai
 from quadai.balloon import balloon
+from quadai.simulations import DEFAULT_SWARM_SIZE
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m quadai")
+    parser.add_argument("sim_mode", nargs="?", default="sim1")
+    parser.add_argument("swarm_size", nargs="?", type=int, default=DEFAULT_SWARM_SIZE)
+    parser.add_argument("--fast", action="store_true")
+    parser.add_argument("--render-every", type=int, default=60)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--time", type=float, default=None)
+    parser.add_argument("--exported", action="store_true")
+    parser.add_argument("--profile", nargs="?", const="profile.json", default=None)
+    parser.add_argument("--pid-gains", default=None)
+    parser.add_argument("--record", default=None)
+    parser.add_argument("--replay", default=None)
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--scenario", default=None)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
     sim_mode = "sim1"
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ["sim1", "sim2", "sim3"]:
-            sim_mode = sys.argv[1]
-    balloon(sim_mode)
+    if args.sim_mode in ["sim1", "sim2", "sim3", "swarm"]:
+        sim_mode = args.sim_mode
+    balloon(
+        sim_mode,
+        swarm_size=args.swarm_size,
+        fps=args.fps,
+        fast_forward=args.fast,
+        render_every=args.render_every if args.fast else 1,
+        time_limit=args.time,
+        exported=args.exported,
+        profile=args.profile,
+        pid_gains=args.pid_gains,
+        record=args.record,
+        replay=args.replay,
+        replay_speed=args.speed,
+        scenario=args.scenario,
+    )
 
 if __name__ == "__main__":
     print("Quadcopter Simulation, By Utkarsh, Adarsh, Amit")
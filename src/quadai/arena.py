@@ -0,0 +1,193 @@
+"""
+arena.py
+State of a balloon match for every drone at once. Positions, speeds, scores
+and respawn timers live in NumPy arrays, physics runs as one vectorized
+step, and players that can share a policy (e.g. SAC drones using the same
+model) are driven by a single batched act_batch call per frame.
+
+Nothing here draws or imports pygame; balloon() renders from these arrays.
+"""
+
+from math import pi
+
+import numpy as np
+
+from quadai import physics
+from quadai.profiling import NULL_PROFILER
+
+
+class ControllerGroup:
+    """Players answering to the same act_batch call, with their rows in the arena arrays."""
+
+    def __init__(self, players, indices):
+        self.player_class = type(players[0])
+        self.obs_type = self.player_class.obs_type
+        self.players = players
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.span_name = "act " + str(self.player_class.controller)
+
+
+class Arena:
+    def __init__(self, players, targets, width, height, time_limit, respawn_timer_max=3, dt=1/60, profiler=NULL_PROFILER):
+        # Every step asks every controller, so models loading in the background must be done (player.wait_ready())
+        not_ready = [p.name for p in players if not p.is_ready()]
+        if not_ready:
+            raise ValueError("Players still loading their model: " + ", ".join(not_ready))
+        self.players = players
+        self.targets = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+        self.width = width
+        self.height = height
+        self.time_limit = time_limit
+        self.respawn_timer_max = respawn_timer_max
+        self.dt = dt
+        # Times inference per controller and the physics step (see quadai.profiling)
+        self.profiler = profiler
+        # Gets every frame once stepped when set (a quadai.recording.Recorder)
+        self.recorder = None
+
+        # Start from whatever state the players were created with
+        self.x = np.array([p.x_position for p in players], dtype=np.float64)
+        self.xd = np.array([p.x_speed for p in players], dtype=np.float64)
+        self.y = np.array([p.y_position for p in players], dtype=np.float64)
+        self.yd = np.array([p.y_speed for p in players], dtype=np.float64)
+        self.a = np.array([p.angle for p in players], dtype=np.float64)
+        self.ad = np.array([p.angular_speed for p in players], dtype=np.float64)
+        self.xdd = np.zeros(len(players))
+        self.ydd = np.zeros(len(players))
+        self.add = np.zeros(len(players))
+        self.thruster_left = np.zeros(len(players))
+        self.thruster_right = np.zeros(len(players))
+
+        self.target_counter = np.array([p.target_counter for p in players], dtype=np.int64)
+        self.dead = np.array([p.dead for p in players], dtype=bool)
+        self.respawn_timer = np.array([p.respawn_timer for p in players], dtype=np.float64)
+
+        self.time = 0
+        self.step_count = 0
+        self.game_over = False
+
+        groups = {}
+        for index, player in enumerate(players):
+            groups.setdefault(player.group_key(), []).append(index)
+        self.groups = [ControllerGroup([players[i] for i in indices], indices) for indices in groups.values()]
+
+    def has_target(self):
+        return self.target_counter < len(self.targets)
+
+    def current_targets(self):
+        """(xt, yt) of every player's current target; the last target once all are collected."""
+        index = np.minimum(self.target_counter, len(self.targets) - 1)
+        return self.targets[index, 0], self.targets[index, 1]
+
+    def pid_observations(self, xt, yt, has_target):
+        error_x = np.where(has_target, xt - self.x, 0)
+        error_y = np.where(has_target, yt - self.y, 0)
+        return np.stack([error_x, self.xd, error_y, self.yd, self.a, self.ad], axis=1)
+
+    def rl_observations(self, xt, yt, has_target):
+        """Same 7-float observation as droneEnv._get_obs, for every drone."""
+        angle_to_up = self.a / 180 * pi
+        velocity = np.sqrt(self.xd**2 + self.yd**2)
+        dist = np.sqrt((self.x - xt)**2 + (self.y - yt)**2)
+        distance_to_target = np.where(has_target, dist / 500, 0)
+        angle_to_target = np.where(has_target, np.arctan2(yt - self.y, xt - self.x), 0)
+        angle_target_and_velocity = angle_to_target - np.arctan2(self.yd, self.xd)
+        return np.stack(
+            [angle_to_up, velocity, self.ad, distance_to_target, angle_to_target, angle_target_and_velocity, distance_to_target],
+            axis=1,
+        ).astype(np.float32)
+
+    def act(self, alive):
+        """Ask every group for thrusts of its living drones."""
+        xt, yt = self.current_targets()
+        has_target = self.has_target()
+        pid_obs = rl_obs = None
+        for group in self.groups:
+            members = alive[group.indices]
+            if not members.any():
+                continue
+            if members.all():
+                indices, players = group.indices, group.players
+            else:
+                indices = group.indices[members]
+                players = [p for p, m in zip(group.players, members) if m]
+
+            if group.obs_type == "pid":
+                if pid_obs is None:
+                    pid_obs = self.pid_observations(xt, yt, has_target)
+                obs = pid_obs[indices]
+            elif group.obs_type == "rl":
+                if rl_obs is None:
+                    rl_obs = self.rl_observations(xt, yt, has_target)
+                obs = rl_obs[indices]
+            else:
+                obs = None
+
+            with self.profiler.span(group.span_name):
+                thruster_left, thruster_right = group.player_class.act_batch(players, obs)
+            self.thruster_left[indices] = thruster_left
+            self.thruster_right[indices] = thruster_right
+
+    def move(self, alive):
+        if alive.all():
+            self.xdd, self.ydd, self.add = physics.step_batch(
+                self.x, self.xd, self.y, self.yd, self.a, self.ad,
+                self.thruster_left, self.thruster_right)
+            return
+        indices = np.flatnonzero(alive)
+        state = [s[indices] for s in (self.x, self.xd, self.y, self.yd, self.a, self.ad)]
+        xdd, ydd, add = physics.step_batch(*state, self.thruster_left[indices], self.thruster_right[indices])
+        for s, new in zip((self.x, self.xd, self.y, self.yd, self.a, self.ad), state):
+            s[indices] = new
+        self.xdd[indices] = xdd
+        self.ydd[indices] = ydd
+        self.add[indices] = add
+
+    def step(self):
+        """Advance the match by one frame."""
+        self.time += self.dt
+        self.step_count += 1
+
+        was_dead = self.dead.copy()
+        alive = ~was_dead
+        if alive.any():
+            self.act(alive)
+            with self.profiler.span("move"):
+                self.move(alive)
+
+            xt, yt = self.current_targets()
+            dist = np.sqrt((self.x - xt)**2 + (self.y - yt)**2)
+            checked = alive & self.has_target()
+            reached = checked & (dist < 50)
+            lost = checked & ~reached & (dist > 1000)
+
+            self.target_counter[reached] += 1
+            if (self.target_counter[reached] >= len(self.targets)).any():
+                self.game_over = True
+            self.dead[lost] = True
+            self.respawn_timer[lost] = self.respawn_timer_max
+
+        if was_dead.any():
+            self.respawn_timer[was_dead] -= self.dt
+            respawn = was_dead & (self.respawn_timer < 0)
+            self.dead[respawn] = False
+            self.x[respawn] = self.width / 2
+            self.y[respawn] = self.height / 2
+            for s in (self.xd, self.yd, self.a, self.ad, self.xdd, self.ydd, self.add):
+                s[respawn] = 0
+
+        if self.time > self.time_limit:
+            self.game_over = True
+
+        if self.recorder is not None:
+            self.recorder.record(self)
+
+    def sync_players(self):
+        """Copy the arena state back onto the Player objects."""
+        for i, player in enumerate(self.players):
+            (player.x_position, player.x_speed, player.x_acceleration) = (self.x[i], self.xd[i], self.xdd[i])
+            (player.y_position, player.y_speed, player.y_acceleration) = (self.y[i], self.yd[i], self.ydd[i])
+            (player.angle, player.angular_speed, player.angular_acceleration) = (self.a[i], self.ad[i], self.add[i])
+            player.target_counter = int(self.target_counter[i])
+            player.dead = bool(self.dead[i])
+            player.respawn_timer = float(self.respawn_timer[i])
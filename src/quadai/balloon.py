@@ -3,10 +3,15 @@ Main game file with three simulations:
 Sim-1: Human, PID, SAC(v2_5000000), DQN
 Sim-2: Human, PID, SAC1(v1_3330000), SAC2(v2_5000000) - no DQN, but two SAC variants
 Sim-3: Like Sim-1 but bigger arena and more targets
+Swarm: Human against dozens of PID, SAC and DQN drones in the Sim-3 arena
 
-Results are stored in results.xlsx with:
+The drones of a match live in a quadai.arena.Arena, which steps all of them
+at once; this file only handles the menu, drawing and saving results.
+
+Results are appended to results.csv (python -m quadai.results turns it into results.xlsx) with:
 Columns: Simulation, TimeChosen, PID, SAC, DQN, Human
-SAC variants combined with commas for Sim-2 if multiple SAC.
+SAC variants combined with commas for Sim-2 if multiple SAC
+(and likewise for every controller in the swarm).
 
 Sim-1 shows sun/clouds, Sim-2 and Sim-3 do not.
 Sim-2 and Sim-3 have more spread out target generation.
@@ -16,14 +21,23 @@ import os
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-from random import randrange
-from math import sin, cos, pi, sqrt
-import numpy as np
 import pygame
 from pygame.locals import *
-import pandas as pd
 
-from quadai.player import HumanPlayer, PIDPlayer, SACPlayer, DQNPlayer
+from quadai.arena import Arena
+from quadai.profiling import NULL_PROFILER, FrameProfiler
+from quadai.recording import Recorder, Recording, ReplayArena
+from quadai.rendering import BackgroundCache, RotationCache, TextCache
+from quadai.results import ResultsSink
+from quadai.simulations import DEFAULT_SWARM_SIZE, get_simulation, make_players, generate_targets
+
+
+# Most physics ticks run for one drawn frame before the game slows down instead
+MAX_CATCH_UP_TICKS = 5
+# Ticks between event checks when fast-forwarding without drawing
+FAST_FORWARD_BATCH = 600
+# Frames between refreshes of the profiler overlay numbers
+PROFILE_OVERLAY_EVERY = 30
 
 
 def correct_path(current_path):
@@ -37,32 +51,29 @@ def show_menu(screen, WIDTH, HEIGHT):
 
     options = [100, 200, 250]
     selected_option = None
+    background = BackgroundCache()
+    text_cache = TextCache()
 
     while True:
         pygame.event.pump()
-        top_color = (131, 176, 181)
-        bottom_color = (100, 140, 150)
-        for y in range(HEIGHT):
-            alpha = y / HEIGHT
-            r = int(top_color[0]*(1 - alpha) + bottom_color[0]*alpha)
-            g = int(top_color[1]*(1 - alpha) + bottom_color[1]*alpha)
-            b = int(top_color[2]*(1 - alpha) + bottom_color[2]*alpha)
-            pygame.draw.line(screen,(r,g,b),(0,y),(WIDTH,y))
-
-        title_text = menu_font.render("Choose Simulation Time:", True, (255, 255, 255))
+        background.draw(screen)
+
+        title_text = text_cache.render(menu_font, "Choose Simulation Time:")
         screen.blit(title_text,(WIDTH/2 - title_text.get_width()/2, HEIGHT/2 - 100))
 
         for i, opt in enumerate(options):
-            opt_text = info_font.render(str(opt) + " seconds", True, (255, 255, 255))
+            opt_text = text_cache.render(info_font, str(opt) + " seconds")
             screen.blit(opt_text,(WIDTH/2 - opt_text.get_width()/2, HEIGHT/2 - 20 + i*40))
 
-        inst_text = info_font.render("Use UP/DOWN to select, ENTER to confirm, ESC to quit",True,(255,255,255))
+        inst_text = text_cache.render(info_font, "Use UP/DOWN to select, ENTER to confirm, ESC to quit")
         screen.blit(inst_text,(WIDTH/2 - inst_text.get_width()/2, HEIGHT/2 + 100))
 
         for event in pygame.event.get():
             if event.type == QUIT:
                 pygame.quit()
                 exit()
+            if event.type == VIDEORESIZE:
+                background.invalidate()
             if event.type == KEYDOWN:
                 if event.key == K_UP:
                     if selected_option is None:
@@ -83,337 +94,365 @@ def show_menu(screen, WIDTH, HEIGHT):
 
         if selected_option is not None:
             arrow_font = info_font
-            arrow_text = arrow_font.render("->", True, (255, 255, 255))
+            arrow_text = text_cache.render(arrow_font, "->")
             screen.blit(arrow_text,(WIDTH/2 - 100 - arrow_text.get_width()/2, HEIGHT/2 - 20 + selected_option*40))
 
         pygame.display.update()
 
 
-def balloon(sim_mode="sim1"):
-    if sim_mode == "sim1":
-        WIDTH, HEIGHT = 800, 800
-        targets_count = 100
-        players = [
-            HumanPlayer(),
-            PIDPlayer(),
-            SACPlayer(model_path="models/sac_model_v2_5000000_steps.zip", name="SAC"),
-            DQNPlayer()
-        ]
-        sim_name = "Sim-1"
-        sim_description = "This simulation tests four drones: Human, PID, SAC, DQN. A baseline scenario."
-
-        sun = pygame.image.load(correct_path("assets/balloon-flat-asset-pack/png/background-elements/sun.png"))
-        sun.set_alpha(124)
-        cloud1 = pygame.image.load(correct_path("assets/balloon-flat-asset-pack/png/background-elements/cloud-1.png"))
-        cloud1.set_alpha(124)
-        cloud2 = pygame.image.load(correct_path("assets/balloon-flat-asset-pack/png/background-elements/cloud-2.png"))
-        cloud2.set_alpha(124)
-        x_cloud1, y_cloud1, speed_cloud1 = (150, 200, 0.3)
-        x_cloud2, y_cloud2, speed_cloud2 = (400, 500, -0.2)
-
-    elif sim_mode == "sim2":
-        WIDTH, HEIGHT = 900, 900
-        targets_count = 200
-        players = [
-            HumanPlayer(),
-            PIDPlayer(),
-            SACPlayer(model_path="models/sac_model_v1_3330000_steps.zip", name="SAC1"),
-            SACPlayer(model_path="models/sac_model_v2_5000000_steps.zip", name="SAC2")
-        ]
-        sim_name = "Sim-2"
-        sim_description = "This simulation compares Manual, PID, and two SAC variants in a larger arena."
-        sun = cloud1 = cloud2 = None
-        x_cloud1 = y_cloud1 = speed_cloud1 = 0
-        x_cloud2 = y_cloud2 = speed_cloud2 = 0
-
-    elif sim_mode == "sim3":
-        WIDTH, HEIGHT = 950, 950
-        targets_count = 150
-        players = [
-            HumanPlayer(),
-            PIDPlayer(),
-            SACPlayer(model_path="models/sac_model_v2_5000000_steps.zip", name="SAC"),
-            DQNPlayer()
-        ]
-        sim_name = "Sim-3"
-        sim_description = "This simulation is like Sim-1 but with a bigger arena and more targets."
-        sun = cloud1 = cloud2 = None
-        x_cloud1 = y_cloud1 = speed_cloud1 = 0
-        x_cloud2 = y_cloud2 = speed_cloud2 = 0
+def hud_entries(players, arena, max_entries=6):
+    """(name, score, dead) for the score boxes at the top; swarms are summed per controller."""
+    if len(players)<=max_entries:
+        return [(p.name,int(arena.target_counter[i]),bool(arena.dead[i])) for i,p in enumerate(players)]
+    controllers={}
+    for i,p in enumerate(players):
+        controllers.setdefault(p.controller,[]).append(i)
+    entries=[]
+    for controller,indices in controllers.items():
+        score=int(arena.target_counter[indices].sum())
+        dead=len(indices)==1 and bool(arena.dead[indices[0]])
+        entries.append((controller,score,dead))
+    return entries
+
+
+def score_columns(players):
+    """Scores per controller for the results row: a plain score for one player, name=score pairs for several."""
+    columns={}
+    for p in players:
+        columns.setdefault(p.controller,[]).append(p)
+    scores={}
+    for controller,members in columns.items():
+        if len(members)==1 and members[0].name==controller:
+            scores[controller]=str(members[0].target_counter)
+        else:
+            scores[controller]=",".join(f"{p.name}={p.target_counter}" for p in members)
+    return scores
+
+
+def score_lines(players, max_lines=8):
+    """Lines for the game over screen; one per player, or one per controller for big swarms."""
+    if len(players)<=max_lines:
+        return [f"{p.name} collected: {p.target_counter}" for p in players]
+    lines=[]
+    controllers={}
+    for p in players:
+        controllers.setdefault(p.controller,[]).append(p.target_counter)
+    for controller,counts in controllers.items():
+        if len(counts)==1:
+            lines.append(f"{controller} collected: {counts[0]}")
+        else:
+            lines.append(f"{controller} x{len(counts)}: best {max(counts)}, mean {sum(counts)/len(counts):.1f}")
+    return lines
+
+
+class MatchRenderer:
+    """Draws the frames of a match: sky, clouds, targets, drones and the HUD.
+
+    Sprites, fonts and the background/rotation/text caches are loaded once;
+    draw() paints one frame of an arena onto screen, inside profiler spans.
+    Needs pygame.display.set_mode to have been called.
+    """
+
+    def __init__(self, settings, sim_name, time_limit, rotation_step=2, profiler=NULL_PROFILER):
+        self.settings = settings
+        self.width, self.height = settings["width"], settings["height"]
+        self.sim_name = sim_name
+        self.sim_description = settings["description"]
+        self.time_limit = time_limit
+        self.profiler = profiler
+
+        # Sky gradient and the static sun are drawn once, then blitted every frame
+        self.background = BackgroundCache()
+        if settings["scenery"]:
+            sun = pygame.image.load(correct_path("assets/balloon-flat-asset-pack/png/background-elements/sun.png"))
+            sun.set_alpha(124)
+            self.background.add_decoration(sun, lambda width, height: (width-170, -50))
+            self.cloud1 = pygame.image.load(correct_path("assets/balloon-flat-asset-pack/png/background-elements/cloud-1.png"))
+            self.cloud1.set_alpha(124)
+            self.cloud2 = pygame.image.load(correct_path("assets/balloon-flat-asset-pack/png/background-elements/cloud-2.png"))
+            self.cloud2.set_alpha(124)
+        self.x_cloud1, self.y_cloud1, self.speed_cloud1 = (150, 200, 0.3)
+        self.x_cloud2, self.y_cloud2, self.speed_cloud2 = (400, 500, -0.2)
+        self.cloud_step = 0
+
+        player_width = 80
+        self.player_animation_speed = 0.3
+        self.player_animation = []
+        for i in range(1, 5):
+            image = pygame.image.load(correct_path(os.path.join("assets/balloon-flat-asset-pack/png/objects/drone-sprites","drone-"+str(i)+".png")))
+            image.convert()
+            self.player_animation.append(pygame.transform.scale(image, (player_width, int(player_width*0.30))))
+
+        # Rotated drone sprites, keyed by animation frame and angle rounded to rotation_step degrees
+        self.rotations = RotationCache(angle_step=rotation_step)
+
+        target_width = 30
+        self.target_animation_speed = 0.1
+        self.target_animation = []
+        for i in range(1, 8):
+            image = pygame.image.load(correct_path(os.path.join("assets/balloon-flat-asset-pack/png/balloon-sprites/red-plain","red-plain-"+str(i)+".png")))
+            image.convert()
+            self.target_animation.append(pygame.transform.scale(image,(target_width,int(target_width*1.73))))
+
+        # HUD labels, name tags, timer and game over lines are rendered once per distinct string
+        self.text_cache = TextCache()
+        self.name_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Bold.ttf"), 20)
+        self.name_hud_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Bold.ttf"), 15)
+        self.time_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Bold.ttf"), 30)
+        self.score_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Regular.ttf"), 20)
+        self.respawn_timer_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Bold.ttf"), 90)
+        self.respawning_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Regular.ttf"), 15)
+        self.sim_info_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Regular.ttf"), 18)
+        self.profile_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Regular.ttf"), 14)
+        self.profile_lines = []
+
+    def display_info(self, screen, position, name, score, dead):
+        text_cache = self.text_cache
+        name_text = text_cache.render(self.name_font,name)
+        screen.blit(name_text,(position,100))
+        target_text = text_cache.render(self.score_font,"Score: "+str(score))
+        screen.blit(target_text,(position,125))
+        if dead:
+            respawning_text = text_cache.render(self.respawning_font,"Respawning...")
+            screen.blit(respawning_text,(position,150))
+
+    def draw(self, screen, arena, players, targets):
+        """One frame of the match (without pygame.display.update)."""
+        profiler = self.profiler
+        text_cache = self.text_cache
+        WIDTH, HEIGHT = self.width, self.height
+
+        with profiler.span("background"):
+            self.background.draw(screen)
+
+        step=arena.step_count
+
+        with profiler.span("hud"):
+            sim_name_text=text_cache.render(self.name_font,self.sim_name)
+            screen.blit(sim_name_text,(20,20))
+            line_surface=text_cache.render(self.sim_info_font,self.sim_description)
+            screen.blit(line_surface,(20,50))
+
+            time_text_surf=text_cache.render(self.time_font,"Time: "+str(int(self.time_limit-arena.time)))
+            screen.blit(time_text_surf,(WIDTH-time_text_surf.get_width()-20,20))
+
+        if self.settings["scenery"]:
+            with profiler.span("clouds"):
+                # Clouds drift per physics tick, so they keep their speed at any frame rate
+                cloud_ticks=step-self.cloud_step
+                self.cloud_step=step
+                self.x_cloud1 += self.speed_cloud1*cloud_ticks
+                if self.x_cloud1 > WIDTH:
+                    self.x_cloud1 = -self.cloud1.get_width()
+                screen.blit(self.cloud1, (self.x_cloud1, self.y_cloud1))
+
+                self.x_cloud2 += self.speed_cloud2*cloud_ticks
+                if self.x_cloud2 < -self.cloud2.get_width():
+                    self.x_cloud2 = WIDTH
+                screen.blit(self.cloud2, (self.x_cloud2, self.y_cloud2))
+
+        with profiler.span("drones"):
+            target_sprite=self.target_animation[int(step*self.target_animation_speed)%len(self.target_animation)]
+            player_frame=int(step*self.player_animation_speed)%len(self.player_animation)
+            player_sprite=self.player_animation[player_frame]
+            has_target=arena.has_target()
+            for player_index,player in enumerate(players):
+                x_position=arena.x[player_index]
+                y_position=arena.y[player_index]
+
+                if arena.dead[player_index] and player.name=="Human":
+                    respawn_text=text_cache.render(self.respawn_timer_font,str(int(arena.respawn_timer[player_index])+1))
+                    respawn_text.set_alpha(124)
+                    screen.blit(respawn_text,(WIDTH/2-respawn_text.get_width()/2,HEIGHT/2-respawn_text.get_height()/2))
 
+                if not arena.game_over and has_target[player_index]:
+                    target=targets[arena.target_counter[player_index]]
+                    target_sprite.set_alpha(player.alpha)
+                    screen.blit(target_sprite,(target[0]-int(target_sprite.get_width()/2),target[1]-int(target_sprite.get_height()/2)))
+
+                # Its own span inside "drones", to show how much the rotation cache saves
+                with profiler.span("rotate"):
+                    player_copy=self.rotations.rotate(player_sprite,arena.a[player_index],key=player_frame)
+                player_copy.set_alpha(player.alpha)
+                screen.blit(player_copy,(x_position-int(player_copy.get_width()/2),y_position-int(player_copy.get_height()/2)))
+
+                name_hud_text=text_cache.render(self.name_hud_font,player.name)
+                screen.blit(name_hud_text,(x_position-int(name_hud_text.get_width()/2),y_position-40-int(name_hud_text.get_height()/2)))
+
+        with profiler.span("hud"):
+            info_x_start=20
+            for i,(name,score,dead) in enumerate(hud_entries(players,arena)):
+                self.display_info(screen,info_x_start+i*120,name,score,dead)
+
+        if profiler.enabled:
+            # Numbers change every frame, so only refresh them now and then to keep them readable
+            if profiler.frames%PROFILE_OVERLAY_EVERY==0:
+                self.profile_lines=profiler.overlay_lines()
+            for i,line in enumerate(self.profile_lines):
+                profile_text=text_cache.render(self.profile_font,line)
+                screen.blit(profile_text,(20,HEIGHT-20-(len(self.profile_lines)-i)*18))
+
+    def draw_game_over(self, screen, players, saved_msg):
+        text_cache = self.text_cache
+        WIDTH, HEIGHT = self.width, self.height
+        screen.fill((0,0,0))
+        final_title = text_cache.render(self.time_font,"Simulation Over!")
+        screen.blit(final_title,(WIDTH/2-final_title.get_width()/2,HEIGHT/2-150))
+
+        score_y = HEIGHT/2-50
+        for line in score_lines(players):
+            p_score_line=text_cache.render(self.score_font,line)
+            screen.blit(p_score_line,(WIDTH/2-p_score_line.get_width()/2,score_y))
+            score_y+=40
+
+        saved_text=text_cache.render(self.score_font,saved_msg)
+        screen.blit(saved_text,(WIDTH/2-saved_text.get_width()/2,score_y+40))
+
+        close_text=text_cache.render(self.score_font,"Close the window to exit.")
+        screen.blit(close_text,(WIDTH/2-close_text.get_width()/2,score_y+80))
+
+
+def balloon(sim_mode="sim1", swarm_size=DEFAULT_SWARM_SIZE, rotation_step=2,
+            fps=60, fast_forward=False, render_every=1, time_limit=None, exported=False, profile=None, pid_gains=None,
+            record=None, replay=None, replay_speed=1.0, scenario=None):
+    """Play a simulation.
+
+    Physics always advances in fixed 1/60 s ticks. In real time, as many ticks
+    run per frame as the wall clock requires and frames are drawn at fps.
+    With fast_forward the match runs AI drones only, as fast as the CPU allows,
+    drawing one frame every render_every ticks (never, if render_every is 0).
+    time_limit skips the menu. exported plays SAC and DQN through their NumPy
+    exports (quadai.policy_export) instead of stable-baselines3. profile is a
+    file to write frame timing histograms to at the end; it also turns on the
+    timing overlay. pid_gains is a gains file from quadai.PID.tune for the PID
+    drones. record is a file to record the match to (see quadai.recording).
+    replay plays such a file back instead of a match, replay_speed times faster
+    than real time, without running any controller; nothing is saved.
+    scenario is a level of quadai.scenarios to draw the targets from.
+    """
+    if replay is not None:
+        recording = Recording(replay)
+        sim_mode = recording.header.get("sim_mode", sim_mode)
+    settings = get_simulation(sim_mode)
+    WIDTH, HEIGHT = settings["width"], settings["height"]
+    targets_count = settings["targets_count"]
+    sim_name = settings["name"]
+    if replay is not None:
+        arena = ReplayArena(recording, replay_speed)
+        players = arena.players
+        time_limit = arena.time_limit
+        sim_name += " (replay x{:g})".format(replay_speed)
+        # Playback speed is replay_speed, in real time
+        fast_forward = False
     else:
-        WIDTH, HEIGHT = 800, 800
-        targets_count = 100
-        players = [
-            HumanPlayer(),
-            PIDPlayer(),
-            SACPlayer(model_path="models/sac_model_v2_5000000_steps.zip", name="SAC"),
-            DQNPlayer()
-        ]
-        sim_name = "Sim-1"
-        sim_description = "This simulation tests four drones: Human, PID, SAC, DQN. A baseline scenario."
-        sun = pygame.image.load(correct_path("assets/balloon-flat-asset-pack/png/background-elements/sun.png"))
-        sun.set_alpha(124)
-        cloud1 = pygame.image.load(correct_path("assets/balloon-flat-asset-pack/png/background-elements/cloud-1.png"))
-        cloud1.set_alpha(124)
-        cloud2 = pygame.image.load(correct_path("assets/balloon-flat-asset-pack/png/background-elements/cloud-2.png"))
-        cloud2.set_alpha(124)
-        x_cloud1, y_cloud1, speed_cloud1 = (150, 200, 0.3)
-        x_cloud2, y_cloud2, speed_cloud2 = (400, 500, -0.2)
-
-    FPS = 60
-    gravity = 0.08
-    mass = 1
-    arm = 25
+        # Nobody can steer a fast-forwarded drone, so those matches are AI only.
+        # Models load on a background thread while the menu is up; the match starts once they are ready.
+        players = make_players(sim_mode, swarm_size=swarm_size, human=not fast_forward, exported=exported, background=True, pid_gains=pid_gains)
 
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
 
-    time_limit = show_menu(screen, WIDTH, HEIGHT)
-
-    player_width = 80
-    player_animation_speed = 0.3
-    player_animation = []
-    for i in range(1, 5):
-        image = pygame.image.load(correct_path(os.path.join("assets/balloon-flat-asset-pack/png/objects/drone-sprites","drone-"+str(i)+".png")))
-        image.convert()
-        player_animation.append(pygame.transform.scale(image, (player_width, int(player_width*0.30))))
-
-    target_width = 30
-    target_animation_speed = 0.1
-    target_animation = []
-    for i in range(1, 8):
-        image = pygame.image.load(correct_path(os.path.join("assets/balloon-flat-asset-pack/png/balloon-sprites/red-plain","red-plain-"+str(i)+".png")))
-        image.convert()
-        target_animation.append(pygame.transform.scale(image,(target_width,int(target_width*1.73))))
-
-    name_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Bold.ttf"), 20)
-    name_hud_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Bold.ttf"), 15)
-    time_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Bold.ttf"), 30)
-    score_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Regular.ttf"), 20)
-    respawn_timer_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Bold.ttf"), 90)
-    respawning_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Regular.ttf"), 15)
-    sim_info_font = pygame.font.Font(correct_path("assets/fonts/Roboto-Regular.ttf"), 18)
-
-    def display_info(position, player):
-        name_text = name_font.render(player.name, True, (255,255,255))
-        screen.blit(name_text,(position,100))
-        target_text = score_font.render("Score: "+str(player.target_counter),True,(255,255,255))
-        screen.blit(target_text,(position,125))
-        if player.dead:
-            respawning_text = respawning_font.render("Respawning...",True,(255,255,255))
-            screen.blit(respawning_text,(position,150))
+    if time_limit is None:
+        time_limit = show_menu(screen, WIDTH, HEIGHT)
+    if replay is None and not all(player.is_ready() for player in players):
+        # The menu hides most of the loading time; a head start for PID and Human over
+        # still-loading models would skew the saved results
+        loading_text = pygame.font.Font(correct_path("assets/fonts/Roboto-Regular.ttf"), 20).render(
+            "Loading models...", True, (255, 255, 255))
+        screen.fill((0, 0, 0))
+        screen.blit(loading_text, (WIDTH/2-loading_text.get_width()/2, HEIGHT/2))
+        pygame.display.update()
+        for player in players:
+            player.wait_ready()
 
-    # More randomization for sim2 and sim3
-    if sim_mode == "sim2" or sim_mode == "sim3":
-        left_margin = 50
-        right_margin = 50
-        top_margin = 50
-        bottom_margin = 50
-        targets = []
-        for i in range(targets_count):
-            x_pos = randrange(left_margin, WIDTH - right_margin)
-            y_pos = randrange(top_margin, HEIGHT - bottom_margin)
-            targets.append((x_pos, y_pos))
+    profiler = FrameProfiler(enabled=profile is not None)
+    renderer = MatchRenderer(settings, sim_name, time_limit, rotation_step, profiler)
+
+    recorder = None
+    if replay is not None:
+        targets = arena.targets
     else:
-        # sim1 default
-        targets = []
-        for i in range(targets_count):
-            targets.append((randrange(200, WIDTH-200), randrange(200, HEIGHT-200)))
+        # More randomization for sim2 and sim3 (wider target margin in the settings)
+        targets = generate_targets(sim_mode, WIDTH, HEIGHT, targets_count, scenario=scenario)
+        arena = Arena(players, targets, WIDTH, HEIGHT, time_limit, profiler=profiler)
+        if record is not None:
+            recorder = arena.recorder = Recorder(record, arena, sim_mode=sim_mode, scenario=scenario)
 
     FramePerSec=pygame.time.Clock()
-    time=0
-    step=0
-    respawn_timer_max=3
+    accumulator=0.0
     running=True
-    game_over=False
+    results=ResultsSink()
     results_saved=False
 
     while running:
-        for event in pygame.event.get():
-            if event.type==QUIT:
-                running=False
-
-        if game_over:
-            screen.fill((0,0,0))
-            final_title = time_font.render("Simulation Over!", True, (255,255,255))
-            screen.blit(final_title,(WIDTH/2-final_title.get_width()/2,HEIGHT/2-150))
-
-            score_y = HEIGHT/2-50
-            pid_score=""
-            sac_score=""
-            dqn_score=""
-            human_score=""
-            sac_variants=[]
-
-            scores=[(p.name,p.target_counter)for p in players]
-            for p_name,p_score_val in scores:
-                p_score_line=score_font.render(f"{p_name} collected: {p_score_val}",True,(255,255,255))
-                screen.blit(p_score_line,(WIDTH/2-p_score_line.get_width()/2,score_y))
-                score_y+=40
-                if p_name=="PID": pid_score=str(p_score_val)
-                elif p_name=="Human": human_score=str(p_score_val)
-                elif p_name=="DQN": dqn_score=str(p_score_val)
-                elif p_name.startswith("SAC"):
-                    sac_variants.append(f"{p_name}={p_score_val}")
-
-            if len(sac_variants)>0:
-                sac_score=",".join(sac_variants)
-
-            saved_msg="Results saved to results.xlsx"
-            saved_text=score_font.render(saved_msg,True,(255,255,255))
-            screen.blit(saved_text,(WIDTH/2-saved_text.get_width()/2,score_y+40))
-
-            close_text=score_font.render("Close the window to exit.",True,(255,255,255))
-            screen.blit(close_text,(WIDTH/2-close_text.get_width()/2,score_y+80))
+        with profiler.span("events"):
+            for event in pygame.event.get():
+                if event.type==QUIT:
+                    running=False
+                if event.type==VIDEORESIZE:
+                    renderer.background.invalidate()
+
+        if arena.game_over:
+            arena.sync_players()
+            saved_msg="Replay of "+os.path.basename(replay) if replay is not None else "Results saved to results.csv"
+            renderer.draw_game_over(screen,players,saved_msg)
             pygame.display.update()
-            FramePerSec.tick(FPS)
+            FramePerSec.tick(fps)
 
-            if not results_saved:
+            if not results_saved and replay is None:
+                scores=score_columns(players)
                 result_row={
                     "Simulation": sim_name,
                     "TimeChosen": str(time_limit),
-                    "PID": pid_score,
-                    "SAC": sac_score,
-                    "DQN": dqn_score,
-                    "Human": human_score
+                    "PID": scores.get("PID",""),
+                    "SAC": scores.get("SAC",""),
+                    "DQN": scores.get("DQN",""),
+                    "Human": scores.get("Human","")
                 }
-                results_df=pd.DataFrame([result_row])
-                excel_path=os.path.join(os.path.dirname(__file__),"../../","results.xlsx")
-                if not os.path.exists(excel_path):
-                    with pd.ExcelWriter(excel_path,engine="openpyxl")as writer:
-                        results_df.to_excel(writer,sheet_name="Results",index=False)
-                else:
-                    existing_df=pd.read_excel(excel_path,sheet_name="Results")
-                    combined_df=pd.concat([existing_df,results_df],ignore_index=True)
-                    with pd.ExcelWriter(excel_path,engine="openpyxl",mode='w')as writer:
-                        combined_df.to_excel(writer,sheet_name="Results",index=False)
-
+                results.append(result_row)
                 results_saved = True
+            if fast_forward:
+                # Nobody is watching a fast-forwarded match: exit instead of waiting for the window to close
+                running=False
             continue
 
-        top_color=(131,176,181)
-        bottom_color=(100,140,150)
-        for y in range(HEIGHT):
-            alpha=y/HEIGHT
-            r=int(top_color[0]*(1-alpha)+bottom_color[0]*alpha)
-            g=int(top_color[1]*(1-alpha)+bottom_color[1]*alpha)
-            b=int(top_color[2]*(1-alpha)+bottom_color[2]*alpha)
-            pygame.draw.line(screen,(r,g,b),(0,y),(WIDTH,y))
-
-        sim_name_text=name_font.render(sim_name,True,(255,255,255))
-        screen.blit(sim_name_text,(20,20))
-        line_surface=sim_info_font.render(sim_description,True,(255,255,255))
-        screen.blit(line_surface,(20,50))
-
-        time+=1/60
-        step+=1
-
-        time_text_surf=time_font.render("Time: "+str(int(time_limit-time)),True,(255,255,255))
-        screen.blit(time_text_surf,(WIDTH-time_text_surf.get_width()-20,20))
-
-        if sim_mode == "sim1":
-            x_cloud1 += speed_cloud1
-            if x_cloud1 > WIDTH:
-                x_cloud1 = -cloud1.get_width()
-            screen.blit(cloud1, (x_cloud1, y_cloud1))
-
-            x_cloud2 += speed_cloud2
-            if x_cloud2 < -cloud2.get_width():
-                x_cloud2 = WIDTH
-            screen.blit(cloud2, (x_cloud2, y_cloud2))
-
-            screen.blit(sun, (WIDTH-170, -50))
-
-        for player_index,player in enumerate(players):
-            if not player.dead:
-                if player.target_counter<len(targets):
-                    dist=sqrt((player.x_position-targets[player.target_counter][0])**2+(player.y_position-targets[player.target_counter][1])**2)
-                else:
-                    dist=0
-
-                if player.name=="PID":
-                    error_x=(targets[player.target_counter][0]-player.x_position) if player.target_counter<len(targets)else 0
-                    error_y=(targets[player.target_counter][1]-player.y_position) if player.target_counter<len(targets)else 0
-                    obs=[error_x,player.x_speed,error_y,player.y_speed,player.angle,player.angular_speed]
-                    thruster_left,thruster_right=player.act(obs)
-
-                elif player.name.startswith("SAC")or player.name=="DQN":
-                    angle_to_up=player.angle/180*pi
-                    velocity=sqrt(player.x_speed**2+player.y_speed**2)
-                    angle_velocity=player.angular_speed
-                    if player.target_counter<len(targets):
-                        distance_to_target=dist/500
-                        angle_to_target=np.arctan2(targets[player.target_counter][1]-player.y_position,targets[player.target_counter][0]-player.x_position)
-                    else:
-                        distance_to_target=0
-                        angle_to_target=0
-                    angle_target_and_velocity=angle_to_target-np.arctan2(player.y_speed,player.x_speed)
-                    obs_7=np.array([angle_to_up,velocity,angle_velocity,distance_to_target,angle_to_target,angle_target_and_velocity,distance_to_target],dtype=np.float32)
-                    thruster_left,thruster_right=player.act(obs_7)
-                else:
-                    thruster_left,thruster_right=player.act([])
-
-                player.x_acceleration=0
-                player.y_acceleration=gravity
-                player.angular_acceleration=0
-
-                player.x_acceleration+=(-(thruster_left+thruster_right)*sin(player.angle*pi/180)/mass)
-                player.y_acceleration+=(-(thruster_left+thruster_right)*cos(player.angle*pi/180)/mass)
-                player.angular_acceleration+=(arm*(thruster_right-thruster_left)/mass)
-
-                player.x_speed+=player.x_acceleration
-                player.y_speed+=player.y_acceleration
-                player.angular_speed+=player.angular_acceleration
-
-                player.x_position+=player.x_speed
-                player.y_position+=player.y_speed
-                player.angle+=player.angular_speed
-
-                if player.target_counter<len(targets):
-                    dist=sqrt((player.x_position-targets[player.target_counter][0])**2+(player.y_position-targets[player.target_counter][1])**2)
-                    if dist<50:
-                        player.target_counter+=1
-                        if player.target_counter>=len(targets):
-                            game_over=True
-                    elif dist>1000:
-                        player.dead=True
-                        player.respawn_timer=respawn_timer_max
-
+        if fast_forward:
+            # Run unthrottled, only stopping to draw every render_every ticks
+            ticks=render_every if render_every>0 else FAST_FORWARD_BATCH
+        else:
+            # Fixed physics timestep: catch up with wall-clock time since the last frame
+            accumulator+=FramePerSec.tick(fps)/1000
+            ticks=int(accumulator/arena.dt)
+            if ticks>MAX_CATCH_UP_TICKS:
+                # Too slow to keep up; slow the simulation down rather than spiral
+                ticks=MAX_CATCH_UP_TICKS
+                accumulator=0.0
             else:
-                if player.name=="Human":
-                    respawn_text=respawn_timer_font.render(str(int(player.respawn_timer)+1),True,(255,255,255))
-                    respawn_text.set_alpha(124)
-                    screen.blit(respawn_text,(WIDTH/2-respawn_text.get_width()/2,HEIGHT/2-respawn_text.get_height()/2))
+                accumulator-=ticks*arena.dt
 
-                player.respawn_timer-=1/60
-                if player.respawn_timer<0:
-                    player.dead=False
-                    (player.angle,player.angular_speed,player.angular_acceleration)=(0,0,0)
-                    (player.x_position,player.x_speed,player.x_acceleration)=(WIDTH/2,0,0)
-                    (player.y_position,player.y_speed,player.y_acceleration)=(HEIGHT/2,0,0)
+        # All drones act and move in one batched step per tick
+        with profiler.span("ticks"):
+            for _ in range(ticks):
+                arena.step()
+                if arena.game_over:
+                    break
 
-            if not game_over and player.target_counter<len(targets):
-                target_sprite=target_animation[int(step*target_animation_speed)%len(target_animation)]
-                target_sprite.set_alpha(player.alpha)
-                screen.blit(target_sprite,(targets[player.target_counter][0]-int(target_sprite.get_width()/2),targets[player.target_counter][1]-int(target_sprite.get_height()/2)))
-
-            player_sprite=player_animation[int(step*player_animation_speed)%len(player_animation)]
-            player_copy=pygame.transform.rotate(player_sprite,player.angle)
-            player_copy.set_alpha(player.alpha)
-            screen.blit(player_copy,(player.x_position-int(player_copy.get_width()/2),player.y_position-int(player_copy.get_height()/2)))
-
-            name_hud_text=name_hud_font.render(player.name,True,(255,255,255))
-            screen.blit(name_hud_text,(player.x_position-int(name_hud_text.get_width()/2),player.y_position-40-int(name_hud_text.get_height()/2)))
-
-        info_x_start=20
-        for i,p in enumerate(players):
-            display_info(info_x_start+i*120,p)
-
-        if time>time_limit:
-            game_over=True
+        if fast_forward and render_every<=0:
+            profiler.end_frame()
+            continue
 
-        pygame.display.update()
-        FramePerSec.tick(FPS)
+        renderer.draw(screen,arena,players,targets)
 
+        with profiler.span("display"):
+            pygame.display.update()
+        profiler.end_frame()
+
+    # Let the writer threads finish the last row and frames before the process can exit
+    results.close()
+    if recorder is not None:
+        recorder.close()
+        print("Match recorded to", record)
+    if profile is not None:
+        profiler.dump(profile)
+        print("Frame profile written to", profile)
     pygame.quit()
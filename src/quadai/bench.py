@@ -0,0 +1,275 @@
+"""
+bench.py
+Benchmarks of the hot paths: environment steps, PID control, SAC/DQN
+inference, headless arena frames and the balloon game's drawing. Results go
+to a JSON file so two commits can be compared.
+
+Every benchmark repeats its call until at least --min-time seconds have passed,
+--repeat times, and keeps the fastest run (the least disturbed by the rest of
+the machine).
+
+Usage:
+python -m quadai.bench                                 -> everything, saved to bench.json
+python -m quadai.bench --only inference --out new.json
+python -m quadai.bench --compare old.json             -> also print the speedup over old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import warnings
+
+import numpy as np
+
+BATCH_SIZES = [1, 4, 16, 64, 256, 1024]
+ARENA_DRONES = [3, 30, 150, 600]
+VEC_ENVS = 64
+
+
+def measure(fn, min_time=0.2, repeat=3):
+    """Fastest seconds per call of fn() over repeat runs of at least min_time each."""
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        calls = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            fn()
+            calls += 1
+            elapsed = time.perf_counter() - start
+        best = min(best, elapsed / calls)
+    return best
+
+
+def measure_timed(fn, min_time=0.2, repeat=3):
+    """Like measure, for an fn() that returns the seconds of its own that count (leaving out its setup)."""
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        calls = 0
+        counted = 0.0
+        start = time.perf_counter()
+        while time.perf_counter() - start < min_time:
+            counted += fn()
+            calls += 1
+        best = min(best, counted / calls)
+    return best
+
+
+def result(name, seconds, items=1, **params):
+    """One benchmark entry: seconds per call, and items handled per second (env steps, drones, ...)."""
+    return {"name": name, "params": params, "us_per_call": seconds * 1e6, "items_per_s": items / seconds}
+
+
+def bench_env(min_time, repeat):
+    from quadai.SAC.env_SAC import droneEnv as SACEnv
+    from quadai.DQN.env_DQN import droneEnv as DQNEnv
+    from quadai.vec_env import DroneVecEnv
+
+    results = []
+    for name, env, action in [
+        ("env_SAC.step", SACEnv(False, False), np.zeros(2, dtype=np.float32)),
+        ("env_DQN.step", DQNEnv(False, False), 0),
+    ]:
+        env.reset()
+
+        def step():
+            if env.step(action)[2]:
+                env.reset()
+
+        results.append(result(name, measure(step, min_time, repeat)))
+
+    for discrete in (False, True):
+        env = DroneVecEnv(VEC_ENVS, discrete_actions=discrete, seed=0)
+        env.reset()
+        actions = np.zeros(VEC_ENVS, dtype=np.int64) if discrete else np.zeros((VEC_ENVS, 2), dtype=np.float32)
+        name = "DroneVecEnv.step (" + ("discrete" if discrete else "continuous") + ")"
+        results.append(result(name, measure(lambda: env.step(actions), min_time, repeat), VEC_ENVS, num_envs=VEC_ENVS))
+    return results
+
+
+def bench_pid(min_time, repeat):
+    from quadai.PID.controller_PID import PID
+    from quadai.player import PIDPlayer
+
+    pid = PID(0.2, 0, 0.2, 25, -25)
+    results = [result("PID.compute", measure(lambda: pid.compute(3.0, 1 / 60), min_time, repeat))]
+
+    player = PIDPlayer()
+    obs = np.array([30.0, 0.5, -20.0, 0.1, 2.0, 0.01])
+    results.append(result("PIDPlayer.act", measure(lambda: player.act(obs), min_time, repeat)))
+
+    rng = np.random.default_rng(0)
+    for batch in BATCH_SIZES:
+        players = [PIDPlayer() for _ in range(batch)]
+        obs_batch = rng.normal(size=(batch, 6))
+        seconds = measure(lambda: PIDPlayer.act_batch(players, obs_batch), min_time, repeat)
+        results.append(result("PIDPlayer.act_batch", seconds, batch, batch=batch))
+    return results
+
+
+def bench_inference(min_time, repeat, backends=("sb3", "exported")):
+    from quadai.player import SACPlayer, DQNPlayer, ExportedSACPlayer, ExportedDQNPlayer
+
+    classes = {"sb3": (SACPlayer, DQNPlayer), "exported": (ExportedSACPlayer, ExportedDQNPlayer)}
+    rng = np.random.default_rng(0)
+    results = []
+    for backend in backends:
+        for player_class in classes[backend]:
+            player = player_class()
+            if backend == "sb3":
+                # Reproducible exploration (DQN samples its action space when exploring)
+                player.action_value.action_space.seed(0)
+            obs = rng.normal(size=7).astype(np.float32)
+            name = player_class.__name__
+            results.append(result(name + ".act", measure(lambda: player.act(obs), min_time, repeat), backend=backend))
+            for batch in BATCH_SIZES:
+                players = [player] * batch
+                obs_batch = rng.normal(size=(batch, 7)).astype(np.float32)
+                seconds = measure(lambda: player_class.act_batch(players, obs_batch), min_time, repeat)
+                results.append(result(name + ".act_batch", seconds, batch, backend=backend, batch=batch))
+    return results
+
+
+def bench_arena(min_time, repeat, exported=True):
+    from quadai.arena import Arena
+    from quadai.simulations import get_simulation, make_players, generate_targets
+    import random
+
+    settings = get_simulation("swarm")
+    results = []
+    for drones in ARENA_DRONES:
+        players = make_players("swarm", swarm_size=drones, human=False, exported=exported)
+        targets = generate_targets("swarm", settings["width"], settings["height"], settings["targets_count"], random.Random(0))
+        arena = Arena(players, targets, settings["width"], settings["height"], time_limit=float("inf"))
+        seconds = measure(arena.step, min_time, repeat)
+        results.append(result("Arena.step", seconds, drones, drones=drones, exported=exported))
+    return results
+
+
+def bench_render(min_time, repeat, exported=True):
+    """Drawing one balloon game frame (no physics) of sim1, with scenery, and of the swarm arena, on an offscreen SDL display."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+
+    from quadai.arena import Arena
+    from quadai.balloon import MatchRenderer
+    from quadai.simulations import get_simulation, make_players, generate_targets
+    import random
+
+    results = []
+    pygame.init()
+    for sim_mode in ("sim1", "swarm"):
+        settings = get_simulation(sim_mode)
+        screen = pygame.display.set_mode((settings["width"], settings["height"]))
+        for drones in ARENA_DRONES:
+            players = make_players("swarm", swarm_size=drones, human=False, exported=exported)
+            targets = generate_targets(sim_mode, settings["width"], settings["height"], settings["targets_count"], random.Random(0))
+            # Long enough that no benchmark reaches game over
+            time_limit = 10 ** 6
+            arena = Arena(players, targets, settings["width"], settings["height"], time_limit=time_limit)
+            renderer = MatchRenderer(settings, settings["name"], time_limit)
+
+            def frame():
+                # The drones move between frames, so the rotation cache sees new angles like in a match
+                arena.step()
+                start = time.perf_counter()
+                renderer.draw(screen, arena, players, targets)
+                pygame.display.update()
+                return time.perf_counter() - start
+
+            seconds = measure_timed(frame, min_time, repeat)
+            entry = result("MatchRenderer.draw", seconds, drones, sim=sim_mode, drones=drones, exported=exported)
+            entry["ms_per_frame"] = seconds * 1e3
+            results.append(entry)
+    pygame.quit()
+    return results
+
+
+BENCHMARKS = {
+    "env": bench_env,
+    "pid": bench_pid,
+    "inference": bench_inference,
+    "arena": bench_arena,
+    "render": bench_render,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(only=None, min_time=0.2, repeat=3):
+    warnings.filterwarnings("ignore")
+    np.random.seed(0)
+    results = []
+    for group, bench in BENCHMARKS.items():
+        if only and group not in only:
+            continue
+        for entry in bench(min_time, repeat):
+            entry["group"] = group
+            results.append(entry)
+            print_result(entry)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+
+
+def key(entry):
+    return (entry["name"], json.dumps(entry["params"], sort_keys=True))
+
+
+def label(entry):
+    params = " ".join("{}={}".format(k, v) for k, v in entry["params"].items())
+    return (entry["name"] + " " + params).strip()
+
+
+def print_result(entry, baseline=None):
+    line = "{:<60} {:>12.2f} us {:>14.0f} /s".format(label(entry), entry["us_per_call"], entry["items_per_s"])
+    if baseline is not None:
+        line += " {:>7.2f}x".format(baseline["us_per_call"] / entry["us_per_call"])
+    print(line)
+
+
+def compare(report, baseline_report):
+    """Print every result of report with its speedup over the same benchmark in baseline_report."""
+    baseline = {key(entry): entry for entry in baseline_report["results"]}
+    print("Compared to", baseline_report["meta"].get("commit"), "(speedup > 1 is faster)")
+    for entry in report["results"]:
+        print_result(entry, baseline.get(key(entry)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m quadai.bench")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="benchmark groups to run (default: all)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing run")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per benchmark; the fastest is kept")
+    parser.add_argument("--out", default="bench.json")
+    parser.add_argument("--compare", default=None, help="earlier --out file to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args.only, args.min_time, args.repeat)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+checkpoint.py
+Training checkpoints that include the replay buffer, for resuming SAC/DQN runs.
+
+A checkpoint directory holds:
+- model-<timesteps>.zip: the model, as saved by stable-baselines3 (without its buffer)
+- one .npy file per replay buffer array, the same shape as in memory
+- state.json: buffer position, whether it is full, the timesteps trained and
+  the name of the model file (and the curriculum levels of the envs, if
+  they follow one), rewritten last, so it always describes data
+  that is on disk: a crash before it is replaced leaves the previous model
+  and buffer state paired
+
+Checkpoints are incremental: the buffer files are memory-mapped and only the
+rows added since the previous checkpoint are written into them, so a
+checkpoint of a full 1M transition buffer costs as much as the transitions of
+one checkpoint interval, not a rewrite of the whole buffer.
+
+quadai.train resumes from --checkpoint-dir when it holds a checkpoint.
+"""
+
+import json
+import os
+import zipfile
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+BUFFER_FIELDS = ("observations", "next_observations", "actions", "rewards", "dones", "timeouts")
+
+
+class ReplayBufferCheckpoint:
+    """Incremental on-disk copy of an SB3 ReplayBuffer in directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.state_path = os.path.join(directory, "state.json")
+        self.state = None
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        self.arrays = None
+
+    def exists(self):
+        return self.state is not None
+
+    def _path(self, field):
+        return os.path.join(self.directory, field + ".npy")
+
+    def _fields(self, buffer):
+        return [field for field in BUFFER_FIELDS if getattr(buffer, field, None) is not None]
+
+    def _open(self, buffer, create):
+        self.arrays = {}
+        for field in self._fields(buffer):
+            array = getattr(buffer, field)
+            path = self._path(field)
+            if create:
+                self.arrays[field] = np.lib.format.open_memmap(path, mode="w+", dtype=array.dtype, shape=array.shape)
+            else:
+                stored = np.lib.format.open_memmap(path, mode="r+")
+                if stored.shape != array.shape or stored.dtype != array.dtype:
+                    raise ValueError("{} holds a {} {} buffer array, the model has {} {} (different buffer_size or "
+                                     "number of envs?)".format(path, stored.shape, stored.dtype, array.shape, array.dtype))
+                self.arrays[field] = stored
+
+    def _write_state(self, state):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+        self.state = state
+
+    def save(self, buffer, num_timesteps, **info):
+        """Write the rows of buffer added since the last save, then the state (plus info); returns how many rows were written."""
+        os.makedirs(self.directory, exist_ok=True)
+        size = buffer.buffer_size
+        if self.arrays is None:
+            # First save of this run into a fresh directory (a resumed run has opened its files in restore())
+            self._open(buffer, create=not self.exists())
+        if not self.exists():
+            start, rows = 0, size if buffer.full else buffer.pos
+        else:
+            start = self.state["pos"]
+            # One row per vectorized step; pos alone cannot tell "no new rows" from "a whole buffer of them"
+            steps = (num_timesteps - self.state["num_timesteps"]) // buffer.n_envs
+            rows = size if steps >= size else (buffer.pos - start) % size
+
+        if rows >= size:
+            slices = [slice(0, size)]
+        elif start + rows <= size:
+            slices = [slice(start, start + rows)]
+        else:
+            slices = [slice(start, size), slice(0, start + rows - size)]
+        for field, stored in self.arrays.items():
+            array = getattr(buffer, field)
+            for rows_slice in slices:
+                stored[rows_slice] = array[rows_slice]
+            stored.flush()
+
+        self._write_state(dict(
+            info,
+            pos=int(buffer.pos),
+            full=bool(buffer.full),
+            buffer_size=int(size),
+            n_envs=int(buffer.n_envs),
+            num_timesteps=int(num_timesteps),
+        ))
+        return min(rows, size)
+
+    def restore(self, buffer):
+        """Load the checkpointed rows into buffer (same buffer_size and number of envs)."""
+        if self.state["n_envs"] != buffer.n_envs or self.state["buffer_size"] != buffer.buffer_size:
+            raise ValueError("Checkpoint buffer has {} rows of {} envs, the model's has {} of {}".format(
+                self.state["buffer_size"], self.state["n_envs"], buffer.buffer_size, buffer.n_envs))
+        self._open(buffer, create=False)
+        rows = buffer.buffer_size if self.state["full"] else self.state["pos"]
+        for field, stored in self.arrays.items():
+            getattr(buffer, field)[:rows] = stored[:rows]
+        buffer.pos = self.state["pos"]
+        buffer.full = self.state["full"]
+
+
+class TrainingCheckpoint:
+    """Model plus replay buffer checkpoints in directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.buffer = ReplayBufferCheckpoint(directory)
+
+    @property
+    def model_path(self):
+        """Model file of the current checkpoint."""
+        # Checkpoints from before model files were numbered hold model.zip
+        return os.path.join(self.directory, self.buffer.state.get("model", "model.zip"))
+
+    def exists(self):
+        return self.buffer.exists() and os.path.exists(self.model_path)
+
+    def save(self, model, **info):
+        """Checkpoint model and its replay buffer; info is kept in state.json."""
+        os.makedirs(self.directory, exist_ok=True)
+        # A new model file, made current by the buffer's state.json, the last thing written
+        name = "model-{}.zip".format(model.num_timesteps)
+        model.save(os.path.join(self.directory, name))
+        rows = self.buffer.save(model.replay_buffer, model.num_timesteps, model=name, **info)
+        # Older models, and any left by a save that crashed before its state.json
+        for other in os.listdir(self.directory):
+            if other.startswith("model") and other.endswith(".zip") and other != name:
+                os.remove(os.path.join(self.directory, other))
+        return rows
+
+    def load(self, algo, env, **kwargs):
+        """The checkpointed model of class algo ("SAC"/"DQN") on env, with its replay buffer."""
+        import stable_baselines3
+        model = getattr(stable_baselines3, algo).load(self.model_path, env=env, **kwargs)
+        if algo == "DQN":
+            # SB3 saves target_update_interval already divided by n_envs and load() divides it again
+            with zipfile.ZipFile(self.model_path) as archive:
+                model.target_update_interval = json.loads(archive.read("data"))["target_update_interval"]
+        self.buffer.restore(model.replay_buffer)
+        return model
+
+
+class CheckpointCallback(BaseCallback):
+    """Saves a TrainingCheckpoint every save_freq transitions and when training ends."""
+
+    def __init__(self, checkpoint, save_freq=100000, verbose=1):
+        super().__init__(verbose)
+        self.checkpoint = checkpoint
+        self.save_freq = save_freq
+        self.last_save = None
+
+    def _on_training_start(self):
+        self.last_save = self.num_timesteps
+
+    def _save(self):
+        self.last_save = self.num_timesteps
+        info = {}
+        # Envs with a scenarios curriculum (quadai.vec_env), so a resumed run carries on at the same levels
+        levels = getattr(self.training_env, "curriculum_levels", lambda: None)()
+        if levels is not None:
+            info["curriculum_levels"] = levels
+        rows = self.checkpoint.save(self.model, **info)
+        if self.verbose > 0:
+            print("Checkpoint at {} timesteps ({} new buffer rows)".format(self.num_timesteps, rows))
+
+    def _on_step(self):
+        return True
+
+    def _on_rollout_end(self):
+        # Not in _on_step: SB3 stores a step's transition after calling it, the rollout's are all stored by now
+        if self.num_timesteps - self.last_save >= self.save_freq:
+            self._save()
+
+    def _on_training_end(self):
+        if self.num_timesteps != self.last_save:
+            self._save()
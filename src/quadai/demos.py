@@ -0,0 +1,324 @@
+"""
+demos.py
+Demonstration datasets for SAC: (obs, action, reward, next_obs, done)
+transitions in the 7-float observation and 2-float action format of env_SAC.
+
+Two sources:
+- pid: the cascaded PID controller (quadai.PID.cascade) flying many
+  DroneVecEnv drones at once, with some Gaussian noise on its actions so the
+  data covers more than its own trajectories
+- recordings: drones of recorded matches (quadai.recording), e.g. the Human
+  player of games played with --record. Actions are recovered from the
+  recorded thrusts and rewards recomputed with env_SAC's shaping
+
+A dataset is a directory of shards, each a directory holding one .npy file per
+field, written whole and renamed into place, so a dataset stays readable while
+it is being generated. DemoDataset memory-maps them.
+
+With a dataset, quadai.train can prefill the SAC replay buffer (--demos) and
+warm start the actor by behavior cloning (--bc-epochs).
+
+Usage:
+python -m quadai.demos pid --out demos/pid --transitions 5000000 --workers 4
+python -m quadai.demos recordings match1.rec match2.rec --controllers Human --out demos/human
+python -m quadai.demos info demos/pid
+python -m quadai.train SAC --demos demos/pid demos/human --bc-epochs 2
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+FIELDS = ("obs", "actions", "rewards", "next_obs", "dones")
+
+# Physics step of the envs, and env_SAC's mapping of actions to thrusts
+DT = 1 / 60
+THRUSTER_MEAN = 0.04
+THRUSTER_AMPLITUDE = 0.04
+DIFF_AMPLITUDE = 0.003
+
+
+def shard_path(directory, index):
+    return os.path.join(directory, "shard-{:05d}".format(index))
+
+
+def write_shard(directory, index, transitions):
+    """Save a dict of FIELDS arrays as shard index of the dataset in directory."""
+    path = shard_path(directory, index)
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for field in FIELDS:
+        np.save(os.path.join(tmp_path, field + ".npy"), transitions[field])
+    # Readers only ever see whole shards
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_info(directory, **info):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "dataset.json"), "w") as f:
+        json.dump(info, f, indent=2)
+
+
+def pid_shard(directory, index, seed, n_envs, steps, noise=0.1, gains=None):
+    """Fly n_envs drones with the cascaded PID for steps env steps and save their transitions as one shard."""
+    from quadai.PID.cascade import DEFAULT_GAINS, CascadePositionController
+    from quadai.vec_env import DroneVecEnv
+
+    env_seed, noise_seed = seed.spawn(2)
+    env = DroneVecEnv(n_envs, discrete_actions=False, seed=env_seed)
+    controller = CascadePositionController(n_envs, gains or DEFAULT_GAINS)
+    rng = np.random.default_rng(noise_seed)
+
+    transitions = {
+        "obs": np.empty((steps, n_envs, 7), dtype=np.float32),
+        "actions": np.empty((steps, n_envs, 2), dtype=np.float32),
+        "rewards": np.empty((steps, n_envs), dtype=np.float32),
+        "next_obs": np.empty((steps, n_envs, 7), dtype=np.float32),
+        "dones": np.empty((steps, n_envs), dtype=bool),
+    }
+    obs = env.reset()
+    for t in range(steps):
+        actions = np.stack(controller.compute(env.pid_observations(), DT), axis=1)
+        if noise > 0:
+            actions = np.clip(actions + rng.normal(0, noise, actions.shape), -1, 1)
+        next_obs, rewards, dones, infos = env.step(actions)
+
+        transitions["obs"][t] = obs
+        transitions["actions"][t] = actions
+        transitions["rewards"][t] = rewards
+        transitions["next_obs"][t] = next_obs
+        transitions["dones"][t] = dones
+        for i in np.flatnonzero(dones):
+            # next_obs of a finished env is already the first one of its next episode
+            transitions["next_obs"][t, i] = infos[i]["terminal_observation"]
+        # New episodes start with fresh PID state
+        controller.reset(dones)
+        obs = next_obs
+
+    flat = {field: array.reshape((steps * n_envs,) + array.shape[2:]) for field, array in transitions.items()}
+    return write_shard(directory, index, flat)
+
+
+def _pid_shard(args):
+    return pid_shard(*args)
+
+
+def generate_pid(directory, transitions, n_envs=1024, steps_per_shard=1000, noise=0.1, seed=0, workers=1, gains=None):
+    """PID dataset of at least transitions transitions, in shards of n_envs * steps_per_shard."""
+    per_shard = n_envs * steps_per_shard
+    shards = -(-transitions // per_shard)
+    write_info(directory, source="pid", n_envs=n_envs, steps_per_shard=steps_per_shard, noise=noise, seed=seed,
+               gains=gains)
+    # Shard i always gets the same seed, however many workers generate them
+    seeds = np.random.SeedSequence(seed).spawn(shards)
+    jobs = [(directory, i, seeds[i], n_envs, steps_per_shard, noise, gains) for i in range(shards)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path in pool.map(_pid_shard, jobs):
+                print(path)
+    else:
+        for job in jobs:
+            print(_pid_shard(job))
+
+
+def observations(x, xd, y, yd, a, ad, xt, yt):
+    """Same 7-float observation as droneEnv._get_obs, for arrays of states and targets."""
+    angle_to_up = a / 180 * np.pi
+    velocity = np.sqrt(xd**2 + yd**2)
+    dist_to_target = np.sqrt((xt - x)**2 + (yt - y)**2) / 500
+    angle_to_target = np.arctan2(yt - y, xt - x)
+    angle_target_and_velocity = angle_to_target - np.arctan2(yd, xd)
+    return np.stack(
+        [angle_to_up, velocity, ad, dist_to_target, angle_to_target, angle_target_and_velocity, dist_to_target],
+        axis=1,
+    ).astype(np.float32)
+
+
+def recording_transitions(recording, drone):
+    """Transitions of one drone of a Recording, between consecutive ticks where it was alive and had a target."""
+    states = {name: np.asarray(recording[name][:, drone], dtype=np.float64)
+              for name in ("x", "xd", "y", "yd", "a", "ad", "thruster_left", "thruster_right")}
+    counter = np.asarray(recording["target_counter"][:, drone])
+    dead = np.asarray(recording["dead"][:, drone], dtype=bool)
+
+    # Tick t -> t + 1, for drones alive at t and still after a target
+    t = np.flatnonzero(~dead[:-1] & (counter[:-1] < len(recording.targets)))
+    xt, yt = recording.targets[counter[t]].T
+    before = {name: values[t] for name, values in states.items()}
+    after = {name: values[t + 1] for name, values in states.items()}
+
+    reached = counter[t + 1] > counter[t]
+    lost = dead[t + 1]
+    old_dist = np.sqrt((before["x"] - xt)**2 + (before["y"] - yt)**2)
+    dist = np.sqrt((after["x"] - xt)**2 + (after["y"] - yt)**2)
+    # env_SAC's reward shaping
+    rewards = np.where(dist < old_dist, 0.05, 0.0) + np.where(reached, 100.0, 0.0) - np.where(lost, 1000.0, 0.0)
+
+    # The thrusts recorded at t + 1 are those that moved the drone from t to t + 1
+    thruster_left, thruster_right = after["thruster_left"], after["thruster_right"]
+    action0 = ((thruster_left + thruster_right) / 2 - THRUSTER_MEAN) / THRUSTER_AMPLITUDE
+    action1 = (thruster_left - thruster_right) / (2 * DIFF_AMPLITUDE)
+
+    state_names = ("x", "xd", "y", "yd", "a", "ad")
+    return {
+        "obs": observations(*(before[name] for name in state_names), xt, yt),
+        "actions": np.clip(np.stack([action0, action1], axis=1), -1, 1).astype(np.float32),
+        "rewards": rewards.astype(np.float32),
+        "next_obs": observations(*(after[name] for name in state_names), xt, yt),
+        "dones": reached | lost,
+    }
+
+
+def convert_recordings(directory, paths, controllers=("Human",)):
+    """One shard per recording, with the transitions of its drones flown by one of controllers."""
+    from quadai.recording import Recording
+
+    write_info(directory, source="recordings", recordings=[os.path.abspath(p) for p in paths],
+               controllers=list(controllers))
+    for index, path in enumerate(paths):
+        recording = Recording(path)
+        drones = [i for i, p in enumerate(recording.players) if p["controller"] in controllers]
+        parts = [recording_transitions(recording, i) for i in drones]
+        if not parts:
+            print(path, "has no", "/".join(controllers), "drone")
+            continue
+        transitions = {field: np.concatenate([p[field] for p in parts]) for field in FIELDS}
+        print(write_shard(directory, index, transitions), len(transitions["obs"]), "transitions")
+
+
+class DemoDataset:
+    """Memory-mapped shards of one or more dataset directories."""
+
+    def __init__(self, directories):
+        if isinstance(directories, str):
+            directories = [directories]
+        self.shards = []
+        for directory in directories:
+            for path in sorted(glob.glob(os.path.join(directory, "shard-?????"))):
+                self.shards.append({field: np.load(os.path.join(path, field + ".npy"), mmap_mode="r")
+                                    for field in FIELDS})
+        if not self.shards:
+            raise FileNotFoundError("No dataset shards in " + ", ".join(directories))
+
+    def __len__(self):
+        return sum(len(shard["obs"]) for shard in self.shards)
+
+    def stats(self):
+        dones = sum(int(np.count_nonzero(shard["dones"])) for shard in self.shards)
+        reached = sum(int(np.count_nonzero(shard["rewards"] >= 50)) for shard in self.shards)
+        lost = sum(int(np.count_nonzero(shard["rewards"] <= -500)) for shard in self.shards)
+        return {"transitions": len(self), "shards": len(self.shards), "episodes_ended": dones, "reached": reached,
+                "lost": lost}
+
+
+def prefill_replay_buffer(replay_buffer, dataset, limit=None):
+    """Copy up to limit transitions of dataset into an SB3 ReplayBuffer; returns how many were added.
+
+    Rows are copied whole into the buffer's (buffer_size, n_envs, ...) arrays,
+    so the count is a multiple of the buffer's n_envs.
+    """
+    if replay_buffer.optimize_memory_usage:
+        raise ValueError("Cannot prefill a replay buffer with optimize_memory_usage")
+    n_envs = replay_buffer.n_envs
+    space = (replay_buffer.buffer_size - (0 if replay_buffer.full else replay_buffer.pos)) * n_envs
+    remaining = min(len(dataset), space, limit if limit is not None else len(dataset))
+    remaining -= remaining % n_envs
+    added = 0
+    for shard in dataset.shards:
+        take = min(len(shard["obs"]), remaining - added)
+        take -= take % n_envs
+        if take <= 0:
+            break
+        rows = take // n_envs
+        index = (replay_buffer.pos + np.arange(rows)) % replay_buffer.buffer_size
+        replay_buffer.observations[index] = shard["obs"][:take].reshape(rows, n_envs, -1)
+        replay_buffer.next_observations[index] = shard["next_obs"][:take].reshape(rows, n_envs, -1)
+        replay_buffer.actions[index] = shard["actions"][:take].reshape(rows, n_envs, -1)
+        replay_buffer.rewards[index] = shard["rewards"][:take].reshape(rows, n_envs)
+        replay_buffer.dones[index] = shard["dones"][:take].reshape(rows, n_envs)
+        replay_buffer.timeouts[index] = False
+        if replay_buffer.pos + rows >= replay_buffer.buffer_size:
+            replay_buffer.full = True
+        replay_buffer.pos = int((replay_buffer.pos + rows) % replay_buffer.buffer_size)
+        added += take
+    return added
+
+
+def behavior_cloning(model, dataset, epochs=1, batch_size=256, seed=0, verbose=1):
+    """Train the actor of an SB3 SAC model to output the dataset's actions (mean squared error); returns the last epoch's loss."""
+    import torch as th
+    import torch.nn.functional as F
+
+    rng = np.random.default_rng(seed)
+    actor = model.actor
+    model.policy.set_training_mode(True)
+    loss_mean = None
+    for epoch in range(epochs):
+        losses = []
+        for shard_index in rng.permutation(len(dataset.shards)):
+            shard = dataset.shards[shard_index]
+            obs = np.asarray(shard["obs"])
+            # tanh never reaches +-1 exactly
+            actions = np.clip(np.asarray(shard["actions"]), -0.999, 0.999)
+            order = rng.permutation(len(obs))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                predicted = actor(th.as_tensor(obs[batch], device=model.device), deterministic=True)
+                loss = F.mse_loss(predicted, th.as_tensor(actions[batch], device=model.device))
+                actor.optimizer.zero_grad()
+                loss.backward()
+                actor.optimizer.step()
+                losses.append(loss.item())
+        loss_mean = float(np.mean(losses))
+        if verbose > 0:
+            print("Behavior cloning epoch {}: loss {:.5f}".format(epoch + 1, loss_mean))
+    model.policy.set_training_mode(False)
+    return loss_mean
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m quadai.demos")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pid = commands.add_parser("pid", help="generate PID demonstrations")
+    pid.add_argument("--out", required=True, help="dataset directory")
+    pid.add_argument("--transitions", type=int, default=1000000)
+    pid.add_argument("--envs", type=int, default=1024, help="drones flown at once")
+    pid.add_argument("--steps-per-shard", type=int, default=1000)
+    pid.add_argument("--noise", type=float, default=0.1, help="std of the Gaussian noise added to the PID actions")
+    pid.add_argument("--seed", type=int, default=0)
+    pid.add_argument("--workers", type=int, default=1, help="processes generating shards")
+    pid.add_argument("--pid-gains", default=None, help="gains file (python -m quadai.PID.tune)")
+
+    recordings = commands.add_parser("recordings", help="convert drones of recorded matches")
+    recordings.add_argument("paths", nargs="+")
+    recordings.add_argument("--out", required=True, help="dataset directory")
+    recordings.add_argument("--controllers", nargs="+", default=["Human"])
+
+    info = commands.add_parser("info", help="size and outcomes of datasets")
+    info.add_argument("paths", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "pid":
+        gains = None
+        if args.pid_gains:
+            from quadai.PID.cascade import load_gains
+            gains = load_gains(args.pid_gains)
+        generate_pid(args.out, args.transitions, args.envs, args.steps_per_shard, args.noise, args.seed, args.workers,
+                     gains)
+    elif args.command == "recordings":
+        convert_recordings(args.out, args.paths, args.controllers)
+    else:
+        print(json.dumps(DemoDataset(args.paths).stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
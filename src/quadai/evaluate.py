@@ -0,0 +1,259 @@
+"""
+evaluate.py
+Evaluation of SAC/DQN models on a fixed, seeded suite of target scenarios.
+
+All the scenarios of the suite run at once in one DroneVecEnv, each drone
+starting at the centre like droneEnv.reset, until every one of them has
+finished its episode. A model is scored by:
+- success_rate: share of the episodes reaching the target
+- crash_rate: share of the episodes lost (more than 1000 px from the target)
+- timeout_rate: share of the episodes still flying after the time limit
+- time_to_target: mean (and median) seconds to reach the target, over the successes
+- mean_reward / std_reward: returns with the env's reward shaping
+Same seed, same suite, so scores of different models and runs compare.
+
+AsyncEvalCallback evaluates snapshots of a model while it trains, in a worker
+process, so training does not pause during evaluations (see quadai.train).
+
+Usage:
+python -m quadai.evaluate                                   -> every registered model
+python -m quadai.evaluate models/sac_improved_model.zip sac_logs/best_model.zip --episodes 2000
+python -m quadai.evaluate sac-v2 dqn-v0 --backend exported --json eval.json
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+EPISODES = 1000
+
+ALGOS = ("SAC", "DQN")
+
+
+def scenario_suite(episodes=EPISODES, seed=0, width=900, height=900):
+    """(xt, yt) target arrays of a suite, drawn like droneEnv.reset draws its target."""
+    rng = np.random.default_rng(seed)
+    xt = rng.integers(int(width / 4), int(3 * width / 4), size=episodes)
+    yt = rng.integers(int(height / 4), int(3 * height / 4), size=episodes)
+    return xt, yt
+
+
+def run_suite(policy, discrete_actions, scenarios, width=900, height=900):
+    """Metrics of policy (anything with an SB3-like predict) over one episode of every scenario."""
+    from quadai.vec_env import DroneVecEnv
+
+    xt, yt = scenarios
+    episodes = len(xt)
+    env = DroneVecEnv(episodes, discrete_actions, width, height)
+    obs = env.reset_to(xt, yt)
+
+    finished = np.zeros(episodes, dtype=bool)
+    success = np.zeros(episodes, dtype=bool)
+    lost = np.zeros(episodes, dtype=bool)
+    steps = np.zeros(episodes, dtype=np.int64)
+    returns = np.zeros(episodes)
+    step = 0
+    # Every episode ends by the time limit, so this stops after time_limit * 60 steps at the most
+    while not finished.all():
+        actions, _ = policy.predict(obs, deterministic=True)
+        obs, rewards, dones, infos = env.step(actions)
+        step += 1
+        active = ~finished
+        returns[active] += rewards[active]
+        # Envs restart once done; only their first episode counts
+        for i in np.flatnonzero(dones & active):
+            success[i] = infos[i]["is_success"]
+            lost[i] = infos[i]["lost"]
+            steps[i] = step
+        finished |= dones
+
+    times = steps[success] / 60
+    return {
+        "episodes": episodes,
+        "success_rate": float(success.mean()),
+        "crash_rate": float(lost.mean()),
+        "timeout_rate": float((~success & ~lost).mean()),
+        "time_to_target": float(times.mean()) if len(times) else None,
+        "time_to_target_median": float(np.median(times)) if len(times) else None,
+        "mean_reward": float(returns.mean()),
+        "std_reward": float(returns.std()),
+    }
+
+
+def detect_algo(path):
+    """"SAC" or "DQN", from the policy class saved in a stable-baselines3 zip."""
+    with zipfile.ZipFile(path) as archive:
+        data = json.loads(archive.read("data"))
+    module = data["policy_class"]["__module__"]
+    algo = module.split(".")[1].upper()
+    if algo not in ALGOS:
+        raise ValueError("{} holds a {} model; only {} can be evaluated".format(path, module, ", ".join(ALGOS)))
+    return algo
+
+
+def load_policy(model, algo=None, backend="sb3"):
+    """(algo, policy) of a registered model name or of any model zip."""
+    from quadai import registry
+
+    if os.path.exists(model):
+        model = os.path.abspath(model)
+        algo = algo or detect_algo(model)
+    algo, path = registry.resolve(model, algo)
+    return algo, registry.load(path, algo, backend)
+
+
+def evaluate(model, algo=None, backend="sb3", episodes=EPISODES, seed=0):
+    algo, policy = load_policy(model, algo, backend)
+    start = time.perf_counter()
+    metrics = run_suite(policy, algo == "DQN", scenario_suite(episodes, seed))
+    metrics["seconds"] = time.perf_counter() - start
+    return metrics
+
+
+def init_worker():
+    import warnings
+    warnings.filterwarnings("ignore")
+    # One thread, to leave the other cores to training
+    import torch
+    torch.set_num_threads(1)
+
+
+def evaluate_snapshot(algo, path, episodes, seed):
+    import stable_baselines3
+    policy = getattr(stable_baselines3, algo).load(path, device="cpu")
+    return run_suite(policy, algo == "DQN", scenario_suite(episodes, seed))
+
+
+class AsyncEvalCallback(BaseCallback):
+    """Callback saving a snapshot every eval_freq transitions and evaluating it in a worker process.
+
+    Results go to log_dir/evaluations.jsonl and to the logger (eval/...); the
+    snapshot with the best success rate (then mean reward) is kept as
+    log_dir/best_model.zip. With workers=0 snapshots are evaluated in the
+    training process, which then waits for them. A resumed run keeps the
+    best score of the evaluations already in log_dir.
+    """
+
+    def __init__(self, algo, log_dir, eval_freq=50000, episodes=EPISODES, seed=0, workers=1, verbose=1):
+        super().__init__(verbose)
+        self.algo = algo
+        self.log_dir = log_dir
+        self.eval_freq = eval_freq
+        self.episodes = episodes
+        self.seed = seed
+        self.workers = workers
+        self.pool = None
+        self.pending = []
+        self.last_eval = 0
+        self.best = self._best_logged()
+
+    def _best_logged(self):
+        """Best score in log_dir/evaluations.jsonl, if best_model.zip is there too."""
+        path = os.path.join(self.log_dir, "evaluations.jsonl")
+        if not os.path.exists(path) or not os.path.exists(os.path.join(self.log_dir, "best_model.zip")):
+            return None
+        with open(path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        return max(((e["success_rate"], e["mean_reward"]) for e in entries), default=None)
+
+    def _init_callback(self):
+        os.makedirs(os.path.join(self.log_dir, "snapshots"), exist_ok=True)
+        if self.workers > 0 and self.pool is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+            self.pool = ProcessPoolExecutor(self.workers, mp.get_context(start_method), initializer=init_worker)
+
+    def _on_training_start(self):
+        # A resumed run is due its first evaluation eval_freq transitions after the checkpoint
+        self.last_eval = self.num_timesteps
+
+    def _on_step(self):
+        if self.num_timesteps - self.last_eval >= self.eval_freq:
+            self.last_eval = self.num_timesteps
+            path = os.path.join(self.log_dir, "snapshots", "{}.zip".format(self.num_timesteps))
+            self.model.save(path)
+            if self.pool is None:
+                # The model itself: loading the snapshot here would draw from torch's RNG and change the training run
+                metrics = run_suite(self.model, self.algo == "DQN", scenario_suite(self.episodes, self.seed))
+                self._report(self.num_timesteps, path, metrics)
+            else:
+                future = self.pool.submit(evaluate_snapshot, self.algo, path, self.episodes, self.seed)
+                self.pending.append((self.num_timesteps, path, future))
+        self._collect(wait=False)
+        return True
+
+    def _collect(self, wait):
+        for entry in list(self.pending):
+            timesteps, path, future = entry
+            if wait or future.done():
+                self.pending.remove(entry)
+                self._report(timesteps, path, future.result())
+
+    def _report(self, timesteps, path, metrics):
+        metrics = dict(metrics, timesteps=timesteps)
+        with open(os.path.join(self.log_dir, "evaluations.jsonl"), "a") as f:
+            f.write(json.dumps(metrics) + "\n")
+        for key in ("success_rate", "crash_rate", "timeout_rate", "mean_reward"):
+            self.logger.record("eval/" + key, metrics[key])
+        if metrics["time_to_target"] is not None:
+            self.logger.record("eval/time_to_target", metrics["time_to_target"])
+
+        score = (metrics["success_rate"], metrics["mean_reward"])
+        if self.best is None or score > self.best:
+            self.best = score
+            os.replace(path, os.path.join(self.log_dir, "best_model.zip"))
+        else:
+            os.remove(path)
+        if self.verbose > 0:
+            print("Eval num_timesteps={}: {}".format(timesteps, format_metrics(metrics)))
+
+    def _on_training_end(self):
+        self._collect(wait=True)
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+def format_metrics(metrics):
+    time_to_target = metrics["time_to_target"]
+    return "success {:6.1%}  crash {:6.1%}  timeout {:6.1%}  time to target {}  reward {:8.1f} +/- {:.1f}".format(
+        metrics["success_rate"], metrics["crash_rate"], metrics["timeout_rate"],
+        "{:5.2f} s".format(time_to_target) if time_to_target is not None else "   -   ",
+        metrics["mean_reward"], metrics["std_reward"])
+
+
+def main(argv=None):
+    from quadai import registry
+
+    parser = argparse.ArgumentParser(prog="python -m quadai.evaluate")
+    parser.add_argument("models", nargs="*", help="registered names or model zips (default: every registered model)")
+    parser.add_argument("--algo", choices=ALGOS, default=None, help="only needed if it cannot be read from the zip")
+    parser.add_argument("--backend", choices=registry.BACKENDS, default="sb3")
+    parser.add_argument("--episodes", type=int, default=EPISODES, help="scenarios in the suite")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the suite")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    import warnings
+    warnings.filterwarnings("ignore")
+
+    results = {}
+    for model in args.models or list(registry.MODELS):
+        metrics = evaluate(model, args.algo, args.backend, args.episodes, args.seed)
+        results[model] = metrics
+        print("{:<40} {}  ({:.1f} s)".format(model, format_metrics(metrics), metrics["seconds"]))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"episodes": args.episodes, "seed": args.seed, "backend": args.backend, "results": results}, f,
+                      indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+physics.py
+Drone rigid-body update shared by the balloon game, the human game and the
+training environments, so trained policies see the same dynamics everywhere.
+
+step() advances one drone held in Python floats, step_batch() advances many
+drones held in NumPy arrays. Both use the same operation order, so a drone
+gives the same trajectory in either path.
+"""
+
+from math import sin, cos, pi
+
+import numpy as np
+
+# Physics constants
+GRAVITY = 0.08
+MASS = 1
+# Length from center of mass to propeller
+ARM = 25
+
+
+def step(x, xd, y, yd, a, ad, thruster_left, thruster_right, gravity=GRAVITY, mass=MASS, arm=ARM):
+    """Advance one drone by one frame.
+
+    Returns (x, xd, y, yd, a, ad, xdd, ydd, add): the new state followed by
+    the accelerations that produced it. The angle a is in degrees.
+    """
+    # Calculate accelerations according to Newton's laws of motion
+    xdd = 0
+    ydd = gravity
+    add = 0
+
+    xdd += -(thruster_left + thruster_right) * sin(a * pi / 180) / mass
+    ydd += -(thruster_left + thruster_right) * cos(a * pi / 180) / mass
+    add += arm * (thruster_right - thruster_left) / mass
+
+    # Calculate speed, then position
+    xd += xdd
+    yd += ydd
+    ad += add
+    x += xd
+    y += yd
+    a += ad
+
+    return x, xd, y, yd, a, ad, xdd, ydd, add
+
+
+def step_batch(x, xd, y, yd, a, ad, thruster_left, thruster_right, gravity=GRAVITY, mass=MASS, arm=ARM):
+    """Advance many drones by one frame, updating the float64 state arrays in place.
+
+    thruster_left and thruster_right are arrays (or scalars) broadcastable to
+    the state. Returns the accelerations (xdd, ydd, add).
+    """
+    thrust = thruster_left + thruster_right
+    angle = a * pi / 180
+
+    xdd = -thrust * np.sin(angle) / mass
+    ydd = gravity + (-thrust * np.cos(angle) / mass)
+    add = arm * (thruster_right - thruster_left) / mass
+
+    xd += xdd
+    yd += ydd
+    ad += add
+    x += xd
+    y += yd
+    a += ad
+
+    return xdd, ydd, add
@@ -2,16 +2,23 @@
 This is where the players for the main game are defined
 """
 
-import os
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-import pygame
-from pygame.locals import *
-from stable_baselines3 import SAC, DQN
+import numpy as np
+from quadai import registry
+from quadai.PID.cascade import DEFAULT_GAINS, CascadePositionController, load_gains
 from quadai.PID.controller_PID import PID
 
+# Below this many drones, per-drone scalar PIDs beat the NumPy call overhead of a PID bank
+PID_BANK_MIN_PLAYERS = 8
+
 class Player:
+    # Which observation act() expects: "pid" (errors and state), "rl" (7-float env observation) or None
+    obs_type = None
+    # Controller family, used to group scores (e.g. SAC1 and SAC2 are both "SAC")
+    controller = None
+
     def __init__(self):
         self.thruster_mean = 0.04
         self.thruster_amplitude = 0.04
@@ -23,13 +30,54 @@ class Player:
         self.dead = False
         self.respawn_timer = 3
 
+    def is_ready(self):
+        # False while the player's model is still loading in the background
+        return True
+
+    def wait_ready(self):
+        pass
+
+    def group_key(self):
+        # Players returning the same key are driven by one act_batch call per frame
+        return id(self)
+
+    @classmethod
+    def act_batch(cls, players, obs):
+        """Thrusts for several players of this class; obs has one row per player (or is None)."""
+        thrusts = np.array(
+            [player.act(obs[i] if obs is not None else []) for i, player in enumerate(players)],
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        return thrusts[:, 0], thrusts[:, 1]
+
+    def continuous_thrusts(self, action0, action1):
+        thruster_left = self.thruster_mean
+        thruster_right = self.thruster_mean
+        thruster_left += action0 * self.thruster_amplitude
+        thruster_right += action0 * self.thruster_amplitude
+        thruster_left += action1 * self.diff_amplitude
+        thruster_right -= action1 * self.diff_amplitude
+        return thruster_left, thruster_right
+
+    def discrete_thrusts(self, action):
+        # 0: nothing, 1:Up, 2:Down, 3:Right rotate, 4:Left rotate; works on arrays of actions too
+        offsets_left = np.array([0, self.thruster_amplitude, -self.thruster_amplitude, self.diff_amplitude, -self.diff_amplitude])
+        offsets_right = np.array([0, self.thruster_amplitude, -self.thruster_amplitude, -self.diff_amplitude, self.diff_amplitude])
+        return self.thruster_mean + offsets_left[action], self.thruster_mean + offsets_right[action]
+
 class HumanPlayer(Player):
+    controller = "Human"
+
     def __init__(self):
         self.name = "Human"
         self.alpha = 255
         super().__init__()
 
     def act(self, obs):
+        # Only the human player needs pygame, so headless matches never import it
+        import pygame
+        from pygame.locals import K_UP, K_DOWN, K_LEFT, K_RIGHT
+
         thruster_left = self.thruster_mean
         thruster_right = self.thruster_mean
         pressed_keys = pygame.key.get_pressed()
@@ -46,21 +94,63 @@ class HumanPlayer(Player):
         return thruster_left, thruster_right
 
 class PIDPlayer(Player):
-    def __init__(self):
-        self.name = "PID"
+    obs_type = "pid"
+    controller = "PID"
+
+    def __init__(self, name="PID", gains=None):
+        self.name = name
         self.alpha = 50
         super().__init__()
 
         self.thruster_amplitude = 0.04
         self.diff_amplitude = 0.003
 
+        # gains: dict like DEFAULT_GAINS, or a gains file from python -m quadai.PID.tune
+        if isinstance(gains, str):
+            gains = load_gains(gains)
+        gains = gains or DEFAULT_GAINS
         self.dt = 1 / 60
-        self.xPID = PID(0.2, 0, 0.2, 25, -25)
-        self.aPID = PID(0.02, 0, 0.01, 1, -1)
-        self.yPID = PID(2.5, 0, 1.5, 100, -100)
-        self.ydPID = PID(1, 0, 0, 1, -1)
+        self.xPID = PID(*gains["x"])
+        self.aPID = PID(*gains["a"])
+        self.yPID = PID(*gains["y"])
+        self.ydPID = PID(*gains["yd"])
+
+        # Shared CascadePositionController holding this drone's PID state while driven by act_batch
+        self.bank = None
+        self.bank_index = None
+
+    def pids(self):
+        return (self.xPID, self.aPID, self.yPID, self.ydPID)
+
+    def unbank(self):
+        """Move this drone's PID state from its shared bank back into its own PIDs."""
+        if self.bank is not None:
+            self.bank.store(self.bank_index, self.pids())
+            self.bank = self.bank_index = None
+
+    def group_key(self):
+        return type(self)
+
+    @classmethod
+    def act_batch(cls, players, obs):
+        if len(players) < PID_BANK_MIN_PLAYERS:
+            return super().act_batch(players, obs)
+        bank = players[0].bank
+        if bank is None or any(player.bank is not bank for player in players):
+            # New set of drones: gather their PIDs into one bank, which keeps their state from now on
+            for player in players:
+                player.unbank()
+            bank = CascadePositionController.from_pids([player.pids() for player in players])
+            for i, player in enumerate(players):
+                player.bank, player.bank_index = bank, i
+        index = None
+        if len(players) < len(bank):
+            index = np.fromiter((player.bank_index for player in players), dtype=np.intp, count=len(players))
+        action0, action1 = bank.compute(obs, players[0].dt, index)
+        return players[0].continuous_thrusts(action0, action1)
 
     def act(self, obs):
+        self.unbank()
         error_x, xd, error_y, yd, a, ad = obs
 
         thruster_left = self.thruster_mean
@@ -82,53 +172,107 @@ class PIDPlayer(Player):
         return thruster_left, thruster_right
 
 class SACPlayer(Player):
-    def __init__(self, model_path="models/sac_model_v2_5000000_steps.zip", name="SAC"):
+    obs_type = "rl"
+    controller = "SAC"
+
+    def __init__(self, model="sac-v2", name="SAC", background=False, model_path=None):
+        """model: a registered name or a zip path; model_path is its former name, still accepted."""
         self.name = name
         self.alpha = 50
         self.thruster_amplitude = 0.04
         self.diff_amplitude = 0.003
         super().__init__()
-        full_path = os.path.join(os.path.dirname(__file__), model_path)
-        self.action_value = SAC.load(full_path)
+        _, self.model_path = registry.resolve(model_path or model, "SAC")
+        self.background = background
+        self.policy = self.load_policy()
+
+    @property
+    def action_value(self):
+        return self.policy.result()
+
+    def is_ready(self):
+        return self.policy.done()
+
+    def wait_ready(self):
+        self.policy.result()
+
+    def load_policy(self):
+        return registry.load_future(self.model_path, "SAC", "sb3", self.background)
+
+    def group_key(self):
+        return (type(self), self.model_path)
 
     def act(self, obs):
         action, _ = self.action_value.predict(obs)
         action0, action1 = action[0], action[1]
+        return self.continuous_thrusts(action0, action1)
 
-        thruster_left = self.thruster_mean
-        thruster_right = self.thruster_mean
-        thruster_left += action0 * self.thruster_amplitude
-        thruster_right += action0 * self.thruster_amplitude
-        thruster_left += action1 * self.diff_amplitude
-        thruster_right -= action1 * self.diff_amplitude
-        return thruster_left, thruster_right
+    @classmethod
+    def act_batch(cls, players, obs):
+        action, _ = players[0].action_value.predict(obs)
+        # float64 like the scalar path, where float32 actions meet Python floats
+        action = np.asarray(action, dtype=np.float64)
+        return players[0].continuous_thrusts(action[:, 0], action[:, 1])
 
 class DQNPlayer(Player):
-    def __init__(self):
-        self.name = "DQN"
+    obs_type = "rl"
+    controller = "DQN"
+
+    def __init__(self, model="dqn-v0", name="DQN", background=False, model_path=None):
+        """Same arguments as SACPlayer."""
+        self.name = name
         self.alpha = 50
         self.thruster_amplitude = 0.04
         self.diff_amplitude = 0.003
-        model_path = os.path.join(os.path.dirname(__file__), "models/dqn_model_v0_1000000_steps.zip")
+        _, self.model_path = registry.resolve(model_path or model, "DQN")
         super().__init__()
-        self.action_value = DQN.load(model_path)
+        self.background = background
+        self.policy = self.load_policy()
+
+    @property
+    def action_value(self):
+        return self.policy.result()
+
+    def is_ready(self):
+        return self.policy.done()
+
+    def wait_ready(self):
+        self.policy.result()
+
+    def load_policy(self):
+        return registry.load_future(self.model_path, "DQN", "sb3", self.background)
+
+    def group_key(self):
+        return (type(self), self.model_path)
 
     def act(self, obs):
         action, _ = self.action_value.predict(obs)
+        return self.discrete_thrusts(int(action))
 
-        thruster_left = self.thruster_mean
-        thruster_right = self.thruster_mean
+    @classmethod
+    def act_batch(cls, players, obs):
+        model = players[0].action_value
+        action, _ = model.policy.predict(obs, deterministic=True)
+        # Epsilon-greedy per drone, as each player calling predict() on its own would get
+        explore = np.random.rand(len(players)) < model.exploration_rate
+        if explore.any():
+            action[explore] = np.random.randint(model.action_space.n, size=int(explore.sum()))
+        return players[0].discrete_thrusts(action)
 
-        if action == 1:
-            thruster_left += self.thruster_amplitude
-            thruster_right += self.thruster_amplitude
-        elif action == 2:
-            thruster_left -= self.thruster_amplitude
-            thruster_right -= self.thruster_amplitude
-        elif action == 3:
-            thruster_left += self.diff_amplitude
-            thruster_right -= self.diff_amplitude
-        elif action == 4:
-            thruster_left -= self.diff_amplitude
-            thruster_right += self.diff_amplitude
-        return thruster_left, thruster_right
+class ExportedSACPlayer(SACPlayer):
+    """SACPlayer acting through the NumPy export of its model (see quadai.policy_export)."""
+
+    def load_policy(self):
+        return registry.load_future(self.model_path, "SAC", "exported", self.background)
+
+class ExportedDQNPlayer(DQNPlayer):
+    """DQNPlayer acting through the NumPy export of its model (see quadai.policy_export)."""
+
+    def load_policy(self):
+        return registry.load_future(self.model_path, "DQN", "exported", self.background)
+
+    @classmethod
+    def act_batch(cls, players, obs):
+        # NumpyPolicy already explores per observation
+        action, _ = players[0].action_value.predict(obs)
+        return players[0].discrete_thrusts(action)
@@ -0,0 +1,206 @@
+"""
+policy_export.py
+Export the acting network of a saved SAC or DQN model (models/*.zip) to plain
+NumPy arrays, and run it without stable-baselines3 or torch.
+
+Exporting reads policy.pth from the zip with torch; NumpyPolicy then only
+needs NumPy and works on single observations or batches of them.
+
+An export is one flat file of float32 weights (models/exported/<name>.weights)
+plus a JSON index of where each array starts (<name>.json). Loading maps the
+weights file read-only with np.memmap, so processes running the same policy
+share its pages instead of each holding a copy.
+
+Usage:
+python -m quadai.policy_export                                -> export every models/*.zip
+python -m quadai.policy_export models/sac_model_v2_5000000_steps.zip
+"""
+
+import glob
+import io
+import json
+import os
+import sys
+import zipfile
+
+import numpy as np
+
+EXPORT_DIR = os.path.join(os.path.dirname(__file__), "models", "exported")
+
+# Arrays in a weights file start on 64-byte boundaries
+FLAT_ALIGN = 16
+
+# Same clamp as stable-baselines3's SAC actor
+LOG_STD_MIN = -20
+LOG_STD_MAX = 2
+
+
+def _linear_layers(state_dict, prefix):
+    """(weight, bias) of the Linear layers under prefix, in network order."""
+    indices = sorted(int(key[len(prefix):].split(".")[0]) for key in state_dict if key.startswith(prefix) and key.endswith(".weight"))
+    return [(state_dict[prefix + str(i) + ".weight"], state_dict[prefix + str(i) + ".bias"]) for i in indices]
+
+
+def extract_policy(model_path):
+    """Weights of the acting network in an SB3 zip as a dict of float32 arrays."""
+    import torch
+
+    with zipfile.ZipFile(model_path) as archive:
+        state_dict = torch.load(io.BytesIO(archive.read("policy.pth")), map_location="cpu")
+        data = json.loads(archive.read("data"))
+    state_dict = {key: value.detach().numpy().astype(np.float32) for key, value in state_dict.items()}
+
+    params = {}
+    if "actor.mu.weight" in state_dict:
+        params["kind"] = np.array("sac")
+        hidden = _linear_layers(state_dict, "actor.latent_pi.")
+        params["out_weight"] = state_dict["actor.mu.weight"]
+        params["out_bias"] = state_dict["actor.mu.bias"]
+        params["log_std_weight"] = state_dict["actor.log_std.weight"]
+        params["log_std_bias"] = state_dict["actor.log_std.bias"]
+        params["exploration_rate"] = np.array(0.0)
+    elif "q_net.q_net.0.weight" in state_dict:
+        params["kind"] = np.array("dqn")
+        layers = _linear_layers(state_dict, "q_net.q_net.")
+        hidden = layers[:-1]
+        params["out_weight"], params["out_bias"] = layers[-1]
+        params["exploration_rate"] = np.array(float(data.get("exploration_rate", 0.0)))
+    else:
+        raise ValueError("Don't know how to export the policy in " + model_path)
+
+    params["n_hidden"] = np.array(len(hidden))
+    for i, (weight, bias) in enumerate(hidden):
+        params["hidden_{}_weight".format(i)] = weight
+        params["hidden_{}_bias".format(i)] = bias
+    return params
+
+
+def exported_path(model_path):
+    return os.path.join(EXPORT_DIR, os.path.splitext(os.path.basename(model_path))[0] + ".weights")
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def save_flat(params, path):
+    """Write params as a raw float32 file at path plus its JSON index; scalars go in the index only."""
+    index = {"dtype": "float32", "arrays": {}, "meta": {}}
+    arrays = []
+    offset = 0
+    for key, value in params.items():
+        value = np.asarray(value)
+        if value.ndim == 0:
+            index["meta"][key] = value.item()
+            continue
+        index["arrays"][key] = {"offset": offset, "shape": list(value.shape)}
+        arrays.append(value.astype(np.float32).ravel())
+        offset += -(-value.size // FLAT_ALIGN) * FLAT_ALIGN
+    data = np.zeros(offset, dtype=np.float32)
+    for key, array in zip(index["arrays"], arrays):
+        start = index["arrays"][key]["offset"]
+        data[start:start + array.size] = array
+
+    # Several workers may export the same model at once: write aside, then swap in, index last
+    suffix = ".tmp" + str(os.getpid())
+    data.tofile(path + suffix)
+    with open(index_path(path) + suffix, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(path + suffix, path)
+    os.replace(index_path(path) + suffix, index_path(path))
+
+
+def load_flat(path):
+    """params saved by save_flat, with the arrays as read-only views into one memory map of the file."""
+    with open(index_path(path)) as f:
+        index = json.load(f)
+    data = np.memmap(path, dtype=index["dtype"], mode="r")
+    params = dict(index["meta"])
+    for key, entry in index["arrays"].items():
+        size = int(np.prod(entry["shape"]))
+        params[key] = data[entry["offset"]:entry["offset"] + size].reshape(entry["shape"])
+    return params
+
+
+def export_policy(model_path, out_path=None):
+    out_path = out_path or exported_path(model_path)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    save_flat(extract_policy(model_path), out_path)
+    return out_path
+
+
+class NumpyPolicy:
+    """ReLU MLP from an exported SAC actor or DQN Q-network.
+
+    predict() follows stable-baselines3's signature: it takes one observation
+    or a batch and returns (actions, None). Without deterministic=True, SAC
+    samples from its squashed Gaussian and DQN explores epsilon-greedily per
+    observation, as the SB3 models do.
+    """
+
+    def __init__(self, params):
+        self.kind = str(params["kind"])
+        self.exploration_rate = float(params["exploration_rate"])
+        # Transposed views (no copies, so memory-mapped weights stay shared): a batch goes through as obs @ weight
+        self.hidden = [
+            (params["hidden_{}_weight".format(i)].T, params["hidden_{}_bias".format(i)])
+            for i in range(int(params["n_hidden"]))
+        ]
+        self.out = (params["out_weight"].T, params["out_bias"])
+        if self.kind == "sac":
+            self.log_std = (params["log_std_weight"].T, params["log_std_bias"])
+        self.n_actions = self.out[1].shape[0]
+
+    @classmethod
+    def load(cls, path):
+        return cls(load_flat(path))
+
+    def latent(self, obs):
+        x = obs
+        for weight, bias in self.hidden:
+            x = np.maximum(x @ weight + bias, 0)
+        return x
+
+    def forward(self, obs, deterministic=False):
+        x = self.latent(obs)
+        out = x @ self.out[0] + self.out[1]
+        if self.kind == "sac":
+            if not deterministic:
+                log_std = np.clip(x @ self.log_std[0] + self.log_std[1], LOG_STD_MIN, LOG_STD_MAX)
+                out = out + np.exp(log_std) * np.random.standard_normal(out.shape).astype(np.float32)
+            return np.tanh(out)
+
+        actions = out.argmax(axis=1)
+        if not deterministic and self.exploration_rate > 0:
+            explore = np.random.rand(len(actions)) < self.exploration_rate
+            if explore.any():
+                actions[explore] = np.random.randint(self.n_actions, size=int(explore.sum()))
+        return actions
+
+    def predict(self, obs, deterministic=False):
+        obs = np.asarray(obs, dtype=np.float32)
+        single = obs.ndim == 1
+        actions = self.forward(obs.reshape(-1, obs.shape[-1]), deterministic)
+        if single:
+            actions = actions[0]
+        return actions, None
+
+
+def load_exported(model_path):
+    """NumpyPolicy for a models/*.zip path, exporting it first if that was never done."""
+    full_path = os.path.join(os.path.dirname(__file__), model_path)
+    path = exported_path(full_path)
+    if not os.path.exists(index_path(path)):
+        export_policy(full_path, path)
+    return NumpyPolicy.load(path)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    paths = argv or sorted(glob.glob(os.path.join(os.path.dirname(__file__), "models", "*.zip")))
+    for path in paths:
+        print(path, "->", export_policy(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+profiling.py
+Frame timing for the balloon game.
+
+Code marks its phases with named spans:
+
+    with profiler.span("background"):
+        background.draw(screen)
+
+and the game calls end_frame() once per drawn frame. Span times are summed
+within a frame (physics runs several ticks per frame), averaged over the last
+frames for the on-screen overlay, and kept whole for the histograms dumped at
+the end of the game. Spans can nest ("rotate" runs inside "drones"), and an
+outer span's time includes its inner ones. A disabled profiler hands out a shared do-nothing span,
+so instrumented code costs next to nothing when profiling is off.
+"""
+
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+# Histogram bin edges in milliseconds
+HISTOGRAM_BINS_MS = [0, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16.7, 33.3, 66.7, 100, 250, 1000]
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class FrameProfiler:
+    def __init__(self, enabled=True, window=60):
+        self.enabled = enabled
+        self.window = window
+        self.current = {}
+        self.recent = {}
+        self.samples = {}
+        self.frames = 0
+        self.last_frame = time.perf_counter()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        self.current[name] = self.current.get(name, 0.0) + seconds
+
+    def end_frame(self):
+        """Close the current frame; its wall time since the previous end_frame is recorded as "frame"."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current["frame"] = now - self.last_frame
+        self.last_frame = now
+        for name, seconds in self.current.items():
+            if name not in self.recent:
+                self.recent[name] = deque(maxlen=self.window)
+                # Spans that started late count as 0 ms in the frames before them
+                self.samples[name] = [0.0] * self.frames
+            self.recent[name].append(seconds)
+            self.samples[name].append(seconds)
+        for name in self.recent:
+            if name not in self.current:
+                self.recent[name].append(0.0)
+                self.samples[name].append(0.0)
+        self.current = {}
+        self.frames += 1
+
+    def averages_ms(self):
+        """Mean milliseconds per frame of every span over the last window frames."""
+        return {name: 1000 * sum(values) / len(values) for name, values in self.recent.items() if values}
+
+    def overlay_lines(self):
+        averages = self.averages_ms()
+        frame = averages.get("frame", 0)
+        lines = ["frame {:.1f} ms  {:.0f} fps".format(frame, 1000 / frame if frame else 0)]
+        for name, ms in averages.items():
+            if name != "frame":
+                lines.append("{} {:.2f} ms".format(name, ms))
+        return lines
+
+    def summary(self):
+        spans = {}
+        for name, values in self.samples.items():
+            ms = np.asarray(values) * 1000
+            counts, _ = np.histogram(np.clip(ms, 0, HISTOGRAM_BINS_MS[-1]), bins=HISTOGRAM_BINS_MS)
+            spans[name] = {
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p95_ms": float(np.percentile(ms, 95)),
+                "p99_ms": float(np.percentile(ms, 99)),
+                "max_ms": float(ms.max()),
+                "histogram": {"bins_ms": HISTOGRAM_BINS_MS, "counts": counts.tolist()},
+            }
+        return {"frames": self.frames, "spans": spans}
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+# Shared disabled profiler for code that is given none
+NULL_PROFILER = FrameProfiler(enabled=False)
@@ -0,0 +1,282 @@
+"""
+recording.py
+Frame by frame recordings of balloon matches, and their playback.
+
+A recording file is a small JSON header (players, targets, arena settings)
+followed by one fixed-size binary record per physics tick, holding for every
+drone: position, speed, angle, angular speed, both thrusts, target counter,
+respawn timer and whether it is dead. Floats are stored as float32.
+
+Recorder fills preallocated NumPy buffers as the arena steps and hands full
+ones to a writer thread, so recording costs a few array copies per tick and
+a match never has to fit in memory. Recording maps the frames of a file
+read-only (np.memmap): opening is instant, and recording["x"] is a
+(ticks, drones) view of the file, not a copy.
+
+ReplayArena plays a recording back through the same attributes balloon()
+draws from, without running any controller (python -m quadai --replay FILE).
+
+Usage:
+python -m quadai sim1 --record match.rec       -> record a game
+python -m quadai --replay match.rec --speed 4  -> watch it again, 4 times faster
+python -m quadai.tournament --record recordings/
+python -m quadai.recording match.rec           -> summary of a recording
+python -m quadai.recording a.rec b.rec         -> where two recordings differ
+"""
+
+import argparse
+import json
+import queue
+import struct
+import threading
+
+import numpy as np
+
+MAGIC = b"QUADREC1"
+# Frames start at a multiple of this many bytes
+ALIGN = 64
+
+# Per drone fields of a frame, in file order
+DRONE_FIELDS = [
+    ("x", "<f4"), ("y", "<f4"), ("a", "<f4"),
+    ("xd", "<f4"), ("yd", "<f4"), ("ad", "<f4"),
+    ("thruster_left", "<f4"), ("thruster_right", "<f4"),
+    ("target_counter", "<i4"), ("respawn_timer", "<f4"), ("dead", "u1"),
+]
+
+
+def frame_dtype(drones):
+    """One frame: the tick number and time, then every DRONE_FIELDS field for all drones."""
+    return np.dtype([("step", "<i4"), ("time", "<f8")] + [(name, kind, (drones,)) for name, kind in DRONE_FIELDS])
+
+
+class Recorder:
+    """Writes a frame of arena to path after every arena.step() (Arena calls record() when set as its recorder).
+
+    Frames go to one of buffers preallocated arrays of capacity frames; a full
+    one is written by a background thread while the next fills up.
+    close() writes what is left and waits for the file to be complete.
+    """
+
+    def __init__(self, path, arena, capacity=1024, buffers=2, **info):
+        self.path = path
+        self.dtype = frame_dtype(len(arena.players))
+        header = dict(
+            info,
+            width=arena.width,
+            height=arena.height,
+            time_limit=arena.time_limit,
+            dt=arena.dt,
+            players=[{"name": p.name, "controller": p.controller, "alpha": p.alpha} for p in arena.players],
+            targets=arena.targets.tolist(),
+        )
+        self.file = open(path, "wb")
+        write_header(self.file, header)
+
+        self.free = queue.Queue()
+        for _ in range(buffers):
+            self.free.put(np.zeros(capacity, dtype=self.dtype))
+        self.full = queue.Queue()
+        self._next_buffer()
+        self.thread = threading.Thread(target=self._write_buffers, name="quadai-recorder", daemon=True)
+        self.thread.start()
+
+    def _next_buffer(self):
+        # Waits for the writer if every buffer is still queued for writing
+        self.buffer = self.free.get()
+        self.columns = {name: self.buffer[name] for name in self.dtype.names}
+        self.count = 0
+
+    def record(self, arena):
+        i = self.count
+        columns = self.columns
+        columns["step"][i] = arena.step_count
+        columns["time"][i] = arena.time
+        for name, _ in DRONE_FIELDS:
+            columns[name][i] = getattr(arena, name)
+        self.count += 1
+        if self.count == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.count:
+            self.full.put((self.buffer, self.count))
+            self._next_buffer()
+
+    def _write_buffers(self):
+        while True:
+            item = self.full.get()
+            if item is None:
+                return
+            buffer, count = item
+            self.file.write(buffer[:count].tobytes())
+            self.free.put(buffer)
+
+    def close(self):
+        self.flush()
+        self.full.put(None)
+        self.thread.join()
+        self.file.close()
+
+
+def write_header(f, header):
+    data = json.dumps(header).encode()
+    size = len(MAGIC) + 4 + len(data)
+    padding = -size % ALIGN
+    f.write(MAGIC + struct.pack("<I", len(data) + padding) + data + b" " * padding)
+
+
+def read_header(path):
+    """(header, offset of the first frame)."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a quadai recording".format(path))
+        (size,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(size))
+    return header, len(MAGIC) + 4 + size
+
+
+class Recording:
+    """Read-only view of a recording file; frames[i] is tick i + 1, recording["x"] is x of every tick and drone."""
+
+    def __init__(self, path):
+        self.path = path
+        self.header, offset = read_header(path)
+        self.players = self.header["players"]
+        self.targets = np.asarray(self.header["targets"], dtype=np.float64).reshape(-1, 2)
+        self.dtype = frame_dtype(len(self.players))
+        with open(path, "rb") as f:
+            size = f.seek(0, 2)
+        # A recording cut short (e.g. a crash) ends at its last complete frame
+        count = (size - offset) // self.dtype.itemsize
+        if count > 0:
+            self.frames = np.memmap(path, dtype=self.dtype, mode="r", offset=offset, shape=(count,))
+        else:
+            self.frames = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, field):
+        return self.frames[field]
+
+    def current_targets(self):
+        """(ticks, drones, 2) position of the target every drone was after at every tick."""
+        return self.targets[np.minimum(self["target_counter"], len(self.targets) - 1)]
+
+    def summary(self):
+        """Final score, deaths and mean thrusts of every player."""
+        if len(self) == 0:
+            return []
+        dead = self["dead"].astype(bool)
+        deaths = (dead[1:] & ~dead[:-1]).sum(axis=0) + dead[0]
+        final = self.frames[-1]
+        return [
+            {
+                "name": player["name"],
+                "controller": player["controller"],
+                "score": int(final["target_counter"][i]),
+                "deaths": int(deaths[i]),
+                "mean_thrust": float((self["thruster_left"][:, i] + self["thruster_right"][:, i]).mean() / 2),
+            }
+            for i, player in enumerate(self.players)
+        ]
+
+
+def first_difference(a, b, tolerance=1e-3, fields=("x", "y", "a")):
+    """(tick index, drone index) where two recordings of the same match first differ by more than tolerance, or None."""
+    count = min(len(a), len(b))
+    differs = np.zeros((count, len(a.players)), dtype=bool)
+    for field in fields:
+        differs |= np.abs(a[field][:count].astype(np.float64) - b[field][:count]) > tolerance
+    if not differs.any():
+        return None
+    tick, drone = np.argwhere(differs)[0]
+    return int(tick), int(drone)
+
+
+class ReplayPlayer:
+    """Name, controller and drawing alpha of a recorded player, and the score balloon() reads back."""
+
+    def __init__(self, name, controller, alpha):
+        self.name = name
+        self.controller = controller
+        self.alpha = alpha
+        self.target_counter = 0
+        self.dead = False
+
+
+class ReplayArena:
+    """Arena look-alike stepping through a Recording, speed recorded ticks per step()."""
+
+    def __init__(self, recording, speed=1.0):
+        self.recording = recording
+        self.players = [ReplayPlayer(p["name"], p["controller"], p["alpha"]) for p in recording.players]
+        self.targets = recording.targets
+        header = recording.header
+        self.width = header["width"]
+        self.height = header["height"]
+        self.time_limit = header["time_limit"]
+        self.dt = header["dt"]
+        self.speed = speed
+        self.position = 0.0
+        self.game_over = len(recording) == 0
+        self.time = 0
+        self.step_count = 0
+        if not self.game_over:
+            self._load(0)
+
+    def _load(self, index):
+        frame = self.recording.frames[index]
+        self.step_count = int(frame["step"])
+        self.time = float(frame["time"])
+        for name, _ in DRONE_FIELDS:
+            setattr(self, name, frame[name])
+        self.dead = self.dead.astype(bool)
+
+    def step(self):
+        self.position += self.speed
+        index = int(self.position)
+        if index >= len(self.recording) - 1:
+            index = len(self.recording) - 1
+            self.game_over = True
+        self._load(index)
+
+    def has_target(self):
+        return self.target_counter < len(self.targets)
+
+    def sync_players(self):
+        for i, player in enumerate(self.players):
+            player.target_counter = int(self.target_counter[i])
+            player.dead = bool(self.dead[i])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m quadai.recording")
+    parser.add_argument("paths", nargs="+", help="one recording to summarize, or two to compare")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="pixels/degrees two recordings may differ by")
+    args = parser.parse_args(argv)
+
+    recordings = [Recording(path) for path in args.paths[:2]]
+    for recording in recordings:
+        print("{}: {} ticks ({:.1f} s)".format(recording.path, len(recording), len(recording) * recording.header["dt"]))
+        for entry in recording.summary():
+            print("  {name:<10} {controller:<6} score {score:>4}  deaths {deaths:>3}  mean thrust {mean_thrust:.4f}".format(
+                **entry))
+
+    if len(recordings) == 2:
+        a, b = recordings
+        if [p["name"] for p in a.players] != [p["name"] for p in b.players]:
+            print("Different players, not compared")
+            return
+        difference = first_difference(a, b, args.tolerance)
+        if difference is None:
+            print("Same trajectories over the first {} ticks".format(min(len(a), len(b))))
+        else:
+            tick, drone = difference
+            print("First difference at tick {} ({:.2f} s), drone {}".format(
+                tick + 1, (tick + 1) * a.header["dt"], a.players[drone]["name"]))
+
+
+if __name__ == "__main__":
+    main()
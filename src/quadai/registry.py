@@ -0,0 +1,121 @@
+"""
+registry.py
+Named versions of the trained models, and the per-process cache that players
+load them through.
+
+A model is asked for by name ("sac-v2") or by its zip path relative to the
+package, with a backend:
+- "sb3": the stable-baselines3 model in the zip
+- "exported": a NumpyPolicy over the flat float32 export of the zip (see
+  quadai.policy_export). The weights are memory-mapped read-only, so every
+  process using the same model shares one copy of them through the OS page
+  cache instead of holding its own.
+
+Usage:
+python -m quadai.registry                 -> list the registered models
+python -m quadai.registry --export        -> build the flat exports of all of them
+"""
+
+import argparse
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+MODELS = {
+    "sac-v1": {"algo": "SAC", "path": "models/sac_model_v1_3330000_steps.zip"},
+    "sac-v2": {"algo": "SAC", "path": "models/sac_model_v2_5000000_steps.zip"},
+    "sac-improved": {"algo": "SAC", "path": "models/sac_improved_model.zip"},
+    "dqn-v0": {"algo": "DQN", "path": "models/dqn_model_v0_1000000_steps.zip"},
+    "dqn-improved": {"algo": "DQN", "path": "models/dqn_improved_model.zip"},
+}
+
+BACKENDS = ("sb3", "exported")
+
+# Models already loaded (or loading) in this process, as Futures, so drones sharing a model share one copy
+_loaded = {}
+_lock = threading.Lock()
+_loader = None
+
+
+def full_path(path):
+    return os.path.join(os.path.dirname(__file__), path)
+
+
+def resolve(model, algo=None):
+    """(algo, path) of a registered name, or of a zip path (algo then has to be given unless it is registered)."""
+    spec = MODELS.get(model)
+    if spec is None:
+        path = os.path.normpath(model)
+        spec = next((s for s in MODELS.values() if os.path.normpath(s["path"]) == path), None)
+    if spec is not None:
+        if algo is not None and algo != spec["algo"]:
+            raise ValueError("{} is a {} model, not {}".format(model, spec["algo"], algo))
+        return spec["algo"], spec["path"]
+    if algo is None:
+        raise KeyError("Unknown model {!r}; registered models are {}".format(model, ", ".join(MODELS)))
+    return algo, model
+
+
+def _load(algo, path, backend):
+    if backend == "exported":
+        from quadai.policy_export import load_exported
+        return load_exported(path)
+    # stable-baselines3 (and torch) only get imported by players that use them
+    import stable_baselines3
+    return getattr(stable_baselines3, algo).load(full_path(path))
+
+
+def load_future(model, algo=None, backend="sb3", background=False):
+    """Future of the loaded model.
+
+    With background=True the model loads on a worker thread and the Future
+    may still be running; otherwise it is loaded before returning.
+    """
+    global _loader
+    if backend not in BACKENDS:
+        raise ValueError("backend must be one of " + ", ".join(BACKENDS))
+    algo, path = resolve(model, algo)
+    key = (backend, os.path.normpath(path))
+    with _lock:
+        future = _loaded.get(key)
+        if future is None and background:
+            if _loader is None:
+                _loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quadai-model-loader")
+            future = _loaded[key] = _loader.submit(_load, algo, path, backend)
+    if future is None:
+        future = Future()
+        try:
+            future.set_result(_load(algo, path, backend))
+        except Exception as error:
+            future.set_exception(error)
+        with _lock:
+            future = _loaded.setdefault(key, future)
+    return future
+
+
+def load(model, algo=None, backend="sb3"):
+    return load_future(model, algo, backend).result()
+
+
+def clear():
+    """Forget every model loaded in this process."""
+    with _lock:
+        _loaded.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m quadai.registry")
+    parser.add_argument("--export", action="store_true", help="build the flat NumPy export of every model")
+    args = parser.parse_args(argv)
+
+    from quadai.policy_export import export_policy, exported_path, index_path
+    for name, spec in MODELS.items():
+        path = full_path(spec["path"])
+        if args.export:
+            export_policy(path)
+        exported = "exported" if os.path.exists(index_path(exported_path(path))) else ""
+        print("{:<14} {:<4} {:<45} {}".format(name, spec["algo"], spec["path"], exported))
+
+
+if __name__ == "__main__":
+    main()
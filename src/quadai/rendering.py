@@ -0,0 +1,136 @@
+"""
+rendering.py
+Pygame drawing helpers kept out of the physics code, so that training
+environments only import pygame when something is actually drawn.
+"""
+
+from collections import OrderedDict
+
+import pygame
+
+
+class EnvRenderer:
+    """Window used by env_SAC/env_DQN droneEnv.render: a red square for the drone, a green one for the target."""
+
+    def __init__(self, width, height):
+        pygame.init()
+        self.screen = pygame.display.set_mode((width, height))
+        self.FramePerSec = pygame.time.Clock()
+
+        self.player = pygame.Surface((10,10))
+        self.player.fill((255,0,0))
+
+        self.target = pygame.Surface((10,10))
+        self.target.fill((0,255,0))
+
+        self.rotations = RotationCache()
+
+    def draw(self, x, y, a, xt, yt):
+        pygame.event.get()
+        self.screen.fill((0,0,0))
+        self.screen.blit(self.target,(xt-5,yt-5))
+        rotated_player = self.rotations.rotate(self.player,a)
+        self.screen.blit(rotated_player,(x-5,y-5))
+        pygame.display.update()
+        self.FramePerSec.tick(60)
+
+    def close(self):
+        pygame.display.quit()
+
+
+class BackgroundCache:
+    """Sky gradient, plus any static decorations, drawn once per window size and then blitted each frame.
+
+    The cached surface is rebuilt when the screen size changes or after invalidate().
+    """
+
+    def __init__(self, top_color=(131, 176, 181), bottom_color=(100, 140, 150)):
+        self.top_color = top_color
+        self.bottom_color = bottom_color
+        self.decorations = []
+        self.surface = None
+
+    def add_decoration(self, image, position):
+        """Bake image into the background; position is (x, y) or a function of (width, height) returning it."""
+        self.decorations.append((image, position))
+        self.invalidate()
+
+    def invalidate(self):
+        self.surface = None
+
+    def render(self, size):
+        width, height = size
+        surface = pygame.Surface(size).convert()
+        top_color = self.top_color
+        bottom_color = self.bottom_color
+        for y in range(height):
+            alpha = y / height
+            r = int(top_color[0]*(1 - alpha) + bottom_color[0]*alpha)
+            g = int(top_color[1]*(1 - alpha) + bottom_color[1]*alpha)
+            b = int(top_color[2]*(1 - alpha) + bottom_color[2]*alpha)
+            pygame.draw.line(surface, (r, g, b), (0, y), (width, y))
+        for image, position in self.decorations:
+            if callable(position):
+                position = position(width, height)
+            surface.blit(image, position)
+        self.surface = surface
+
+    def draw(self, screen):
+        size = screen.get_size()
+        if self.surface is None or self.surface.get_size() != size:
+            self.render(size)
+        screen.blit(self.surface, (0, 0))
+
+
+class RotationCache:
+    """Rotated copies of sprites, reused between frames and drones.
+
+    Angles are rounded to multiples of angle_step degrees, so one sprite has at
+    most 360/angle_step rotations; the least recently used entries are dropped
+    once more than max_size are held.
+    """
+
+    def __init__(self, angle_step=2, max_size=1024):
+        self.angle_step = angle_step
+        self.max_size = max_size
+        self.cache = OrderedDict()
+
+    def clear(self):
+        self.cache.clear()
+
+    def rotate(self, image, angle, key=None):
+        """pygame.transform.rotate(image, angle) with quantized angle; key identifies image (default: the object)."""
+        bucket = round(angle / self.angle_step) % round(360 / self.angle_step)
+        cache_key = (key if key is not None else id(image), bucket)
+        rotated = self.cache.get(cache_key)
+        if rotated is not None:
+            self.cache.move_to_end(cache_key)
+            return rotated
+        rotated = pygame.transform.rotate(image, bucket * self.angle_step)
+        self.cache[cache_key] = rotated
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return rotated
+
+
+class TextCache:
+    """Rendered text surfaces, re-rendered only when the string, font or style changes."""
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self.cache = OrderedDict()
+
+    def clear(self):
+        self.cache.clear()
+
+    def render(self, font, text, color=(255, 255, 255), antialias=True):
+        key = (id(font), text, tuple(color), antialias)
+        surface = self.cache.get(key)
+        if surface is not None:
+            self.cache.move_to_end(key)
+            return surface
+        surface = font.render(text, antialias, color)
+        self.cache[key] = surface
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return surface
@@ -0,0 +1,97 @@
+"""
+results.py
+Match results of the balloon game, appended one CSV line per match.
+
+ResultsSink writes rows from a background thread, so saving never stalls a
+frame and costs the same however many matches are already stored. Excel
+reports are made on demand from the CSV.
+
+Match history from before the CSV, kept in results.xlsx, is imported into
+the CSV when it is first created, so exporting never loses those rows.
+
+Usage:
+python -m quadai.results                  -> write results.xlsx from results.csv
+python -m quadai.results --out report.xlsx
+"""
+
+import argparse
+import csv
+import os
+import queue
+import threading
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+RESULTS_PATH = os.path.normpath(os.path.join(RESULTS_DIR, "results.csv"))
+EXCEL_PATH = os.path.normpath(os.path.join(RESULTS_DIR, "results.xlsx"))
+
+FIELDS = ["Simulation", "TimeChosen", "PID", "SAC", "DQN", "Human"]
+
+
+class ResultsSink:
+    """Appends result rows (dicts keyed by FIELDS) to a CSV file on a writer thread.
+
+    append() only queues the row; close() waits until everything queued is on disk.
+    """
+
+    def __init__(self, path=RESULTS_PATH, fields=FIELDS, legacy_path=EXCEL_PATH):
+        self.path = path
+        self.fields = fields
+        self.legacy_path = legacy_path
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._write_rows, name="quadai-results", daemon=True)
+        self.thread.start()
+
+    def append(self, row):
+        self.queue.put(row)
+
+    def _write_rows(self):
+        while True:
+            row = self.queue.get()
+            if row is None:
+                return
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                migrate_excel(self.path, self.legacy_path, self.fields)
+            with open(self.path, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=self.fields, extrasaction="ignore")
+                writer.writerow(row)
+
+    def close(self, timeout=None):
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+
+def migrate_excel(csv_path=RESULTS_PATH, xlsx_path=EXCEL_PATH, fields=FIELDS):
+    """Start csv_path with the rows of the results workbook the game used to write, if there is one."""
+    rows = []
+    if os.path.exists(xlsx_path):
+        import pandas as pd
+        rows = pd.read_excel(xlsx_path, sheet_name="Results", dtype=str, keep_default_na=False).to_dict("records")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    return len(rows)
+
+
+def export_excel(csv_path=RESULTS_PATH, xlsx_path=EXCEL_PATH):
+    """Write the whole results CSV to an Excel workbook, sheet "Results"."""
+    import pandas as pd
+    if not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
+        # No match played since the CSV came in: start it from the workbook, whose rows would be lost otherwise
+        migrate_excel(csv_path, xlsx_path)
+    results = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    with pd.ExcelWriter(xlsx_path, engine="openpyxl") as writer:
+        results.to_excel(writer, sheet_name="Results", index=False)
+    return xlsx_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m quadai.results")
+    parser.add_argument("--csv", default=RESULTS_PATH, help="results file written by the game")
+    parser.add_argument("--out", default=EXCEL_PATH, help="Excel file to write")
+    args = parser.parse_args(argv)
+    print(args.csv, "->", export_excel(args.csv, args.out))
+
+
+if __name__ == "__main__":
+    main()
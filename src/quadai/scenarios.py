@@ -0,0 +1,130 @@
+"""
+scenarios.py
+Seeded scenarios for the drone environments and the balloon game: where a
+drone starts, how it is moving then, and where its targets are.
+
+A scenario level is a dict of:
+- margin: fraction of the width/height kept free of targets along every edge
+- distance: (min, max) pixels from the start (or the previous target) to the
+  next target, in a random direction; None draws targets anywhere inside the
+  margins, like droneEnv.reset does (margin 0.25)
+- speed: standard deviation of the initial x and y speeds, in pixels per tick
+- angle: standard deviation of the initial angle, in degrees
+- angular_speed: standard deviation of the initial angular speed, in degrees per tick
+Missing keys take their DEFAULT_LEVEL value.
+
+ScenarioGenerator draws batches of scenarios from a level, with any rng that
+has uniform() and normal() (a np.random.Generator, or the np.random module
+itself), so every env keeps its own seeding. Given several levels it is a
+curriculum: record() the outcome of finished episodes, and once the success
+rate over the last window episodes reaches promote_at it moves on to the next
+level.
+
+Used by DroneVecEnv and droneEnv (scenarios=...), quadai.train (--curriculum)
+and generate_targets of the balloon game.
+"""
+
+from collections import deque
+
+import numpy as np
+
+DEFAULT_LEVEL = {
+    "margin": 0.25,
+    "distance": None,
+    "speed": 0.0,
+    "angle": 0.0,
+    "angular_speed": 0.0,
+}
+
+# Curriculum from nearby targets to droneEnv's targets, then to perturbed starts over a wider area
+LEVELS = [
+    {"name": "near", "distance": (60, 150)},
+    {"name": "medium", "distance": (60, 250)},
+    {"name": "env"},
+    {"name": "perturbed", "speed": 1.0, "angle": 10, "angular_speed": 0.2},
+    {"name": "wide", "margin": 0.1, "speed": 2.0, "angle": 20, "angular_speed": 0.5},
+]
+
+
+def level_params(level):
+    return dict(DEFAULT_LEVEL, **level)
+
+
+def get_level(name):
+    """The LEVELS entry called name."""
+    for level in LEVELS:
+        if level["name"] == name:
+            return level
+    raise ValueError("Unknown scenario level {!r} (one of {})".format(name, ", ".join(l["name"] for l in LEVELS)))
+
+
+class ScenarioGenerator:
+    def __init__(self, levels=None, width=900, height=900, level=0, promote_at=0.8, window=500):
+        """levels: a list of level dicts (a curriculum starting at level), or one level dict (fixed scenarios)."""
+        if levels is None:
+            levels = LEVELS
+        if isinstance(levels, dict):
+            levels = [levels]
+        self.levels = [level_params(lvl) for lvl in levels]
+        self.width = width
+        self.height = height
+        self.level = min(level, len(self.levels) - 1)
+        self.promote_at = promote_at
+        self.outcomes = deque(maxlen=window)
+
+    @property
+    def params(self):
+        return self.levels[self.level]
+
+    def _bounds(self):
+        margin = self.params["margin"]
+        return (margin * self.width, (1 - margin) * self.width), (margin * self.height, (1 - margin) * self.height)
+
+    def targets(self, rng, x, y):
+        """One target per origin (x, y arrays): the next target of each drone."""
+        (x_low, x_high), (y_low, y_high) = self._bounds()
+        count = len(x)
+        distance = self.params["distance"]
+        if distance is None:
+            return rng.uniform(x_low, x_high, count), rng.uniform(y_low, y_high, count)
+        length = rng.uniform(distance[0], distance[1], count)
+        direction = rng.uniform(-np.pi, np.pi, count)
+        xt = np.clip(x + length * np.cos(direction), x_low, x_high)
+        yt = np.clip(y + length * np.sin(direction), y_low, y_high)
+        return xt, yt
+
+    def draw(self, rng, count):
+        """dict of count start states (x, xd, y, yd, a, ad) and their targets (xt, yt); drones start at the centre."""
+        params = self.params
+        scenario = {
+            "x": np.full(count, self.width / 2),
+            "y": np.full(count, self.height / 2),
+        }
+        for name, scale in (("xd", params["speed"]), ("yd", params["speed"]), ("a", params["angle"]),
+                            ("ad", params["angular_speed"])):
+            scenario[name] = rng.normal(0, scale, count) if scale > 0 else np.zeros(count)
+        scenario["xt"], scenario["yt"] = self.targets(rng, scenario["x"], scenario["y"])
+        return scenario
+
+    def sequence(self, rng, count, x=None, y=None):
+        """(count, 2) array of targets to collect one after the other, starting from (x, y) (default: the centre)."""
+        position = np.array([self.width / 2 if x is None else x]), np.array([self.height / 2 if y is None else y])
+        targets = np.empty((count, 2))
+        for i in range(count):
+            position = self.targets(rng, *position)
+            targets[i] = position[0][0], position[1][0]
+        return targets
+
+    def record(self, successes):
+        """Add the outcomes (bools) of finished episodes; returns True if this promoted to the next level."""
+        self.outcomes.extend(np.atleast_1d(successes).tolist())
+        if self.level + 1 >= len(self.levels) or len(self.outcomes) < self.outcomes.maxlen:
+            return False
+        if np.mean(self.outcomes) < self.promote_at:
+            return False
+        self.level += 1
+        self.outcomes.clear()
+        return True
+
+    def success_rate(self):
+        return float(np.mean(self.outcomes)) if self.outcomes else None
@@ -0,0 +1,117 @@
+"""
+simulations.py
+Settings for the balloon game simulations, kept free of pygame so the same
+configurations can be built without a window.
+
+- sim1: Human, PID, SAC(v2_5000000), DQN
+- sim2: Human, PID, SAC1(v1_3330000), SAC2(v2_5000000)
+- sim3: Same drones as sim1 but bigger window and more targets
+- swarm: Human plus a swarm of PID, SAC and DQN drones in the sim3 arena
+"""
+
+import random
+
+SIMULATIONS = {
+    "sim1": {
+        "name": "Sim-1",
+        "description": "This simulation tests four drones: Human, PID, SAC, DQN. A baseline scenario.",
+        "width": 800,
+        "height": 800,
+        "targets_count": 100,
+        "target_margin": 200,
+        "scenery": True,
+    },
+    "sim2": {
+        "name": "Sim-2",
+        "description": "This simulation compares Manual, PID, and two SAC variants in a larger arena.",
+        "width": 900,
+        "height": 900,
+        "targets_count": 200,
+        "target_margin": 50,
+        "scenery": False,
+    },
+    "sim3": {
+        "name": "Sim-3",
+        "description": "This simulation is like Sim-1 but with a bigger arena and more targets.",
+        "width": 950,
+        "height": 950,
+        "targets_count": 150,
+        "target_margin": 50,
+        "scenery": False,
+    },
+    "swarm": {
+        "name": "Swarm",
+        "description": "A swarm of PID, SAC and DQN drones against you in the Sim-3 arena.",
+        "width": 950,
+        "height": 950,
+        "targets_count": 150,
+        "target_margin": 50,
+        "scenery": False,
+    },
+}
+
+# Number of AI drones in the swarm simulation unless told otherwise
+DEFAULT_SWARM_SIZE = 60
+
+
+def get_simulation(sim_mode):
+    """Settings for sim_mode, falling back to sim1 for unknown modes."""
+    return SIMULATIONS.get(sim_mode, SIMULATIONS["sim1"])
+
+
+def make_players(sim_mode, swarm_size=DEFAULT_SWARM_SIZE, human=True, exported=False, background=False, pid_gains=None):
+    """Players of sim_mode.
+
+    exported=True runs SAC and DQN through their NumPy exports instead of
+    stable-baselines3; background=True returns before their models are
+    loaded, which then happens on a worker thread. pid_gains (a dict or a
+    gains file) replaces the default gains of the PID drones.
+    """
+    from quadai.player import HumanPlayer, PIDPlayer
+    if exported:
+        from quadai.player import ExportedSACPlayer as SACPlayer, ExportedDQNPlayer as DQNPlayer
+    else:
+        from quadai.player import SACPlayer, DQNPlayer
+
+    if sim_mode == "sim2":
+        players = [
+            PIDPlayer(gains=pid_gains),
+            SACPlayer(model="sac-v1", name="SAC1", background=background),
+            SACPlayer(model="sac-v2", name="SAC2", background=background),
+        ]
+    elif sim_mode == "swarm":
+        factories = [
+            lambda i: PIDPlayer(name="PID-" + str(i), gains=pid_gains),
+            lambda i: SACPlayer(model="sac-v2", name="SAC-" + str(i), background=background),
+            lambda i: DQNPlayer(name="DQN-" + str(i), background=background),
+        ]
+        players = [factories[i % len(factories)](i // len(factories) + 1) for i in range(swarm_size)]
+    else:
+        players = [
+            PIDPlayer(gains=pid_gains),
+            SACPlayer(model="sac-v2", name="SAC", background=background),
+            DQNPlayer(background=background),
+        ]
+    if human:
+        players.insert(0, HumanPlayer())
+    return players
+
+
+def generate_targets(sim_mode, width, height, count, rng=random, scenario=None):
+    """Target sequence shared by all players. rng needs randrange (random module or random.Random).
+
+    scenario, a level of quadai.scenarios (name or dict), draws the targets
+    from that level instead of anywhere inside the simulation's margin.
+    """
+    if scenario is not None:
+        import numpy as np
+        from quadai.scenarios import ScenarioGenerator, get_level
+        level = get_level(scenario) if isinstance(scenario, str) else scenario
+        generator = ScenarioGenerator(level, width, height)
+        targets = generator.sequence(np.random.default_rng(rng.getrandbits(64)), count)
+        return [(int(x), int(y)) for x, y in targets.round()]
+    margin = get_simulation(sim_mode)["target_margin"]
+    targets = []
+    for i in range(count):
+        targets.append((rng.randrange(margin, width - margin), rng.randrange(margin, height - margin)))
+    return targets
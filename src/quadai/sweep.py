@@ -0,0 +1,331 @@
+"""
+sweep.py
+Local hyperparameter sweeps of SAC/DQN on the drone environments.
+
+Trials (a config of model hyperparameters each) run in a process pool, with
+ASHA early stopping: every trial first trains to the smallest step budget
+(rung), and only the top 1/eta of the trials that finished a rung are
+promoted to train on to the next one. A trial resumes from the model and
+replay buffer it saved at its last rung when promoted, so no steps are
+trained twice.
+
+Everything lives in the sweep directory:
+- sweep.json: the sweep and the state of every trial, rewritten after each
+  change, so a killed sweep resumes where it stopped when run again
+- results.jsonl: one line per finished rung of a trial
+- trials/<id>/: model-<rung>.zip of every finished rung of each trial, and
+  the replay buffer of its last one (buffer-<rung>.pkl)
+- tb/: TensorBoard logs of training and of the score at every rung
+wandb logging is optional (--wandb PROJECT).
+
+Usage:
+python -m quadai.sweep --spec sweep.json --workers 16
+python -m quadai.sweep --dir sweep_sac                  -> resume an interrupted sweep
+
+A spec is a JSON file like
+{"algo": "SAC", "defaults": {"gamma": 0.99}, "one_at_a_time": {"tau": [0.001, 0.1]}, "grid": {}}
+Trials are the defaults alone, one trial per value of each one_at_a_time
+parameter (the others at their defaults) and every combination of grid.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+
+def one_at_a_time(defaults, ranges):
+    """Configs varying one parameter of defaults at a time, over the values in ranges."""
+    return [dict(defaults, **{param: value}) for param, values in ranges.items() for value in values]
+
+
+def grid(defaults, ranges):
+    """Configs for every combination of the values in ranges, on top of defaults."""
+    params = list(ranges)
+    return [dict(defaults, **dict(zip(params, values))) for values in itertools.product(*(ranges[p] for p in params))]
+
+
+def trials_from_spec(spec):
+    defaults = spec.get("defaults", {})
+    configs = [dict(defaults)]
+    configs += one_at_a_time(defaults, spec.get("one_at_a_time", {}))
+    if spec.get("grid"):
+        configs += grid(defaults, spec["grid"])
+    # The same config reached two ways is only trained once
+    unique = []
+    for config in configs:
+        if config not in unique:
+            unique.append(config)
+    return unique
+
+
+def rungs(min_steps, max_steps, eta):
+    """Step budgets min_steps * eta**k below max_steps, then max_steps."""
+    budgets = []
+    steps = min_steps
+    while steps < max_steps:
+        budgets.append(int(steps))
+        steps *= eta
+    return budgets + [int(max_steps)]
+
+
+def trial_label(config, defaults):
+    changed = ["{}={}".format(k, v) for k, v in config.items() if defaults.get(k) != v]
+    return ",".join(changed) or "defaults"
+
+
+def init_worker(threads):
+    import warnings
+    warnings.filterwarnings("ignore")
+    # Many trials run side by side; keep each one from using every core
+    import torch
+    torch.set_num_threads(threads)
+
+
+def make_model(algo, config, env, seed, tensorboard_log):
+    import stable_baselines3
+    kwargs = dict(config)
+    kwargs.pop("n_envs", None)
+    return getattr(stable_baselines3, algo)("MlpPolicy", env, seed=seed, tensorboard_log=tensorboard_log, verbose=0, **kwargs)
+
+
+def trial_files(trial_dir, rung):
+    """Model and replay buffer files a trial saves at the end of rung."""
+    return os.path.join(trial_dir, "model-{}.zip".format(rung)), os.path.join(trial_dir, "buffer-{}.pkl".format(rung))
+
+
+def train_segment(algo, trial_id, config, trial_dir, rung, start_steps, end_steps, seed, eval_seed, eval_episodes,
+                  tensorboard_log, wandb_project):
+    """Train a trial from start_steps to end_steps (rung), save it, and return its mean evaluation reward.
+
+    Files are saved per rung: a sweep killed before recording the rung reruns
+    it from the previous rung's files, not from a model already trained on.
+    """
+    import stable_baselines3
+    from stable_baselines3.common.evaluation import evaluate_policy
+    from stable_baselines3.common.vec_env import VecMonitor
+    from quadai.vec_env import DroneVecEnv
+
+    discrete = algo == "DQN"
+    if discrete:
+        from quadai.DQN.env_DQN import droneEnv
+    else:
+        from quadai.SAC.env_SAC import droneEnv
+
+    env = VecMonitor(DroneVecEnv(config.get("n_envs", 1), discrete_actions=discrete, seed=seed))
+    if rung > 0:
+        model_path, buffer_path = trial_files(trial_dir, rung - 1)
+        model = getattr(stable_baselines3, algo).load(model_path, env=env, tensorboard_log=tensorboard_log)
+        model.load_replay_buffer(buffer_path)
+    else:
+        os.makedirs(trial_dir, exist_ok=True)
+        model = make_model(algo, config, env, seed, tensorboard_log)
+
+    model.learn(end_steps - start_steps, reset_num_timesteps=start_steps == 0, tb_log_name=trial_id)
+
+    # droneEnv draws its targets from np.random: seed it so every trial and rung is scored on the same targets
+    import numpy as np
+    np.random.seed(eval_seed)
+    eval_env = droneEnv(False, False)
+    score, score_std = evaluate_policy(model, eval_env, n_eval_episodes=eval_episodes, deterministic=True)
+    model.logger.record("sweep/score", score)
+    model.logger.dump(model.num_timesteps)
+
+    model_path, buffer_path = trial_files(trial_dir, rung)
+    model.save(model_path)
+    model.save_replay_buffer(buffer_path)
+    env.close()
+
+    if wandb_project:
+        import wandb
+        run = wandb.init(project=wandb_project, name=trial_id, id=trial_id, resume="allow", config=config, reinit=True)
+        run.log({"score": score, "score_std": score_std}, step=end_steps)
+        run.finish()
+    return float(score), float(score_std)
+
+
+def _run_inline(fn, *args):
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+class Sweep:
+    """ASHA scheduling of trials; state is kept in directory/sweep.json."""
+
+    def __init__(self, directory, algo="SAC", configs=None, defaults=None, min_steps=50000, max_steps=500000, eta=3,
+                 eval_episodes=10, seed=0):
+        self.directory = directory
+        self.state_path = os.path.join(directory, "sweep.json")
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+            # Whatever was running when the sweep stopped restarts from its last finished rung
+            for trial in self.state["trials"]:
+                if trial["status"] == "running":
+                    trial["status"] = "paused" if trial["scores"] else "new"
+            return
+
+        if not configs:
+            raise ValueError("No sweep state in {} and no trials given".format(directory))
+        os.makedirs(directory, exist_ok=True)
+        defaults = defaults or {}
+        self.state = {
+            "algo": algo,
+            "rungs": rungs(min_steps, max_steps, eta),
+            "eta": eta,
+            "eval_episodes": eval_episodes,
+            "eval_seed": seed,
+            "trials": [
+                {
+                    "id": "t{:03d}".format(i),
+                    "label": trial_label(config, defaults),
+                    "config": config,
+                    "seed": seed + i,
+                    "status": "new",
+                    "scores": [],
+                }
+                for i, config in enumerate(configs)
+            ],
+        }
+        self.save()
+
+    @property
+    def trials(self):
+        return self.state["trials"]
+
+    def save(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def next_job(self):
+        """(trial, rung) to train next: the best promotion available, else a new trial, else None."""
+        eta = self.state["eta"]
+        for rung in reversed(range(len(self.state["rungs"]) - 1)):
+            finished = [t for t in self.trials if len(t["scores"]) > rung]
+            finished.sort(key=lambda t: t["scores"][rung][0], reverse=True)
+            for trial in finished[:len(finished) // eta]:
+                if trial["status"] == "paused" and len(trial["scores"]) == rung + 1:
+                    return trial, rung + 1
+        for trial in self.trials:
+            if trial["status"] == "new":
+                return trial, 0
+        return None
+
+    def record(self, trial, rung, score, score_std, seconds):
+        trial["scores"].append([score, score_std])
+        trial["status"] = "done" if rung == len(self.state["rungs"]) - 1 else "paused"
+        with open(os.path.join(self.directory, "results.jsonl"), "a") as f:
+            f.write(json.dumps({
+                "trial": trial["id"], "label": trial["label"], "rung": rung, "steps": self.state["rungs"][rung],
+                "score": score, "score_std": score_std, "seconds": seconds, "config": trial["config"],
+            }) + "\n")
+        self.save()
+        if rung > 0:
+            # Recorded: this rung's files are what a promotion resumes from now
+            _, buffer_path = trial_files(os.path.join(self.directory, "trials", trial["id"]), rung - 1)
+            if os.path.exists(buffer_path):
+                os.remove(buffer_path)
+
+    def run(self, workers=1, threads=1, wandb_project=None, tensorboard=True, verbose=True):
+        algo = self.state["algo"]
+        budgets = self.state["rungs"]
+        tensorboard_log = None
+        if tensorboard:
+            import importlib.util
+            if importlib.util.find_spec("tensorboard") is not None:
+                tensorboard_log = os.path.join(self.directory, "tb")
+
+        pool = None
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(threads,))
+        else:
+            init_worker(threads)
+
+        running = {}
+        try:
+            while True:
+                while len(running) < workers:
+                    job = self.next_job()
+                    if job is None:
+                        break
+                    trial, rung = job
+                    trial["status"] = "running"
+                    self.save()
+                    start_steps = budgets[rung - 1] if rung > 0 else 0
+                    args = (algo, trial["id"], trial["config"], os.path.join(self.directory, "trials", trial["id"]),
+                            rung, start_steps, budgets[rung], trial["seed"], self.state["eval_seed"],
+                            self.state["eval_episodes"], tensorboard_log, wandb_project)
+                    future = pool.submit(train_segment, *args) if pool is not None else _run_inline(train_segment, *args)
+                    running[future] = (trial, rung, time.time())
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    trial, rung, start = running.pop(future)
+                    try:
+                        score, score_std = future.result()
+                    except Exception as error:
+                        trial["status"] = "failed"
+                        trial["error"] = repr(error)
+                        self.save()
+                        if verbose:
+                            print("{} {} failed: {!r}".format(trial["id"], trial["label"], error))
+                        continue
+                    self.record(trial, rung, score, score_std, time.time() - start)
+                    if verbose:
+                        print("{} {:<30} rung {} ({} steps): {:.1f} +/- {:.1f}".format(
+                            trial["id"], trial["label"], rung, budgets[rung], score, score_std))
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        return self.best()
+
+    def best(self):
+        """The trial that got furthest, best score first."""
+        scored = [t for t in self.trials if t["scores"]]
+        if not scored:
+            return None
+        return max(scored, key=lambda t: (len(t["scores"]), t["scores"][-1][0]))
+
+
+def main(argv=None, configs=None, defaults=None, algo=None):
+    parser = argparse.ArgumentParser(prog="python -m quadai.sweep")
+    parser.add_argument("--spec", default=None, help="JSON sweep spec (not needed to resume)")
+    parser.add_argument("--dir", default="sweep", help="sweep directory; an existing one is resumed")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="trials trained at the same time")
+    parser.add_argument("--threads", type=int, default=1, help="torch threads per trial")
+    parser.add_argument("--min-steps", type=int, default=50000, help="steps of the first rung")
+    parser.add_argument("--max-steps", type=int, default=500000, help="steps of a trial that is never stopped")
+    parser.add_argument("--eta", type=int, default=3, help="1/eta of the trials finishing a rung are promoted")
+    parser.add_argument("--eval-episodes", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-tensorboard", action="store_true")
+    parser.add_argument("--wandb", default=None, metavar="PROJECT", help="also log every rung to this wandb project")
+    args = parser.parse_args(argv)
+
+    if args.spec:
+        with open(args.spec) as f:
+            spec = json.load(f)
+        algo = spec.get("algo", "SAC")
+        defaults = spec.get("defaults", {})
+        configs = trials_from_spec(spec)
+
+    sweep = Sweep(args.dir, algo or "SAC", configs, defaults, args.min_steps, args.max_steps, args.eta,
+                  args.eval_episodes, args.seed)
+    best = sweep.run(args.workers, args.threads, args.wandb, not args.no_tensorboard)
+    if best is not None:
+        print("best: {} {} with {:.1f} after {} steps".format(
+            best["id"], best["label"], best["scores"][-1][0], sweep.state["rungs"][len(best["scores"]) - 1]))
+
+
+if __name__ == "__main__":
+    main()
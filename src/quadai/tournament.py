@@ -0,0 +1,171 @@
+"""
+tournament.py
+Headless tournament between the AI controllers (PID, SAC, DQN).
+
+Runs many seeded matches of the balloon simulations without a window,
+spread over a process pool, and reports the score distribution of every
+drone. A match is the same as balloon(sim_mode) without the human drone:
+same arena, same target rules, same time limit.
+
+Usage:
+python -m quadai.tournament                              -> 100 matches of sim1, sim2 and sim3
+python -m quadai.tournament --sims sim3 --matches 2000 --time 250 --workers 32 --out sim3.json
+python -m quadai.tournament --sims sim1 --matches 10 --record recordings/  -> also record every match
+python -m quadai.tournament --sims sim2 --scenario near  -> targets close to each other (quadai.scenarios)
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import warnings
+
+import numpy as np
+
+from quadai.arena import Arena
+from quadai.recording import Recorder
+from quadai.simulations import DEFAULT_SWARM_SIZE, get_simulation, make_players, generate_targets
+
+
+def init_worker(exported=False):
+    warnings.filterwarnings("ignore")
+    if not exported:
+        # One match per process at a time; let the pool provide the parallelism
+        import torch
+        torch.set_num_threads(1)
+
+
+def seed_everything(seed, exported=False):
+    # SAC samples its actions and DQN explores, so both need seeding for repeatable matches
+    if exported:
+        random.seed(seed)
+        np.random.seed(seed)
+    else:
+        from stable_baselines3.common.utils import set_random_seed
+        set_random_seed(seed)
+
+
+def recording_path(record_dir, sim_mode, seed):
+    return os.path.join(record_dir, "{}-{}.rec".format(sim_mode, seed))
+
+
+def run_match(sim_mode, seed, time_limit, swarm_size=DEFAULT_SWARM_SIZE, exported=False, pid_gains=None,
+              record_dir=None, scenario=None):
+    """Play one AI-only match and return its scores; with record_dir it is also recorded there."""
+    seed_everything(seed, exported)
+    settings = get_simulation(sim_mode)
+    players = make_players(sim_mode, swarm_size=swarm_size, human=False, exported=exported, pid_gains=pid_gains)
+    targets = generate_targets(sim_mode, settings["width"], settings["height"], settings["targets_count"], random.Random(seed),
+                               scenario)
+    arena = Arena(players, targets, settings["width"], settings["height"], time_limit)
+    if record_dir is not None:
+        arena.recorder = Recorder(recording_path(record_dir, sim_mode, seed), arena, sim_mode=sim_mode, seed=seed,
+                                  scenario=scenario)
+    while not arena.game_over:
+        arena.step()
+    if arena.recorder is not None:
+        arena.recorder.close()
+    return {
+        "sim_mode": sim_mode,
+        "seed": seed,
+        "time": arena.time,
+        "scores": {p.name: int(arena.target_counter[i]) for i, p in enumerate(players)},
+        "controllers": {p.name: p.controller for p in players},
+    }
+
+
+def _run_match(args):
+    return run_match(*args)
+
+
+def summarize(scores):
+    scores = np.asarray(scores, dtype=np.float64)
+    return {
+        "matches": len(scores),
+        "mean": float(scores.mean()),
+        "std": float(scores.std()),
+        "min": float(scores.min()),
+        "p25": float(np.percentile(scores, 25)),
+        "median": float(np.median(scores)),
+        "p75": float(np.percentile(scores, 75)),
+        "max": float(scores.max()),
+    }
+
+
+def aggregate(results):
+    """Score distributions per simulation, per drone and per controller, plus win counts."""
+    summary = {}
+    for sim_mode in sorted(set(r["sim_mode"] for r in results)):
+        matches = [r for r in results if r["sim_mode"] == sim_mode]
+        by_player = {}
+        by_controller = {}
+        wins = {}
+        for match in matches:
+            best = max(match["scores"].values())
+            for name, score in match["scores"].items():
+                by_player.setdefault(name, []).append(score)
+                by_controller.setdefault(match["controllers"][name], []).append(score)
+                # Ties count as a win for every drone sharing the best score
+                wins[name] = wins.get(name, 0) + (score == best)
+        summary[sim_mode] = {
+            "players": {name: dict(summarize(s), wins=wins[name]) for name, s in by_player.items()},
+            "controllers": {name: summarize(s) for name, s in by_controller.items()},
+        }
+    return summary
+
+
+def run_tournament(sims, matches, time_limit, seed=0, workers=None, swarm_size=DEFAULT_SWARM_SIZE, exported=False,
+                   pid_gains=None, record_dir=None, scenario=None):
+    if record_dir is not None:
+        os.makedirs(record_dir, exist_ok=True)
+    jobs = [(sim_mode, seed + i, time_limit, swarm_size, exported, pid_gains, record_dir, scenario)
+            for sim_mode in sims for i in range(matches)]
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        init_worker(exported)
+        return [run_match(*job) for job in jobs]
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(exported,)) as pool:
+        return list(pool.map(_run_match, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+def print_summary(summary):
+    for sim_mode, sim_summary in summary.items():
+        print(sim_mode)
+        print("  {:<10} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8}".format("drone", "matches", "mean", "std", "median", "max", "wins"))
+        for name, s in sim_summary["players"].items():
+            print("  {:<10} {:>8} {:>8.2f} {:>8.2f} {:>8.1f} {:>8.0f} {:>8}".format(
+                name, s["matches"], s["mean"], s["std"], s["median"], s["max"], s["wins"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m quadai.tournament")
+    parser.add_argument("--sims", nargs="+", default=["sim1", "sim2", "sim3"], choices=["sim1", "sim2", "sim3", "swarm"])
+    parser.add_argument("--matches", type=int, default=100, help="matches per simulation")
+    parser.add_argument("--time", type=float, default=100, help="simulation time of a match in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first match; match i uses seed + i")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--swarm-size", type=int, default=DEFAULT_SWARM_SIZE)
+    parser.add_argument("--exported", action="store_true", help="run SAC and DQN through NumPy exports (no torch)")
+    parser.add_argument("--pid-gains", default=None, help="gains file for the PID drones (python -m quadai.PID.tune)")
+    parser.add_argument("--out", default=None, help="write summary and per-match scores to this JSON file")
+    parser.add_argument("--record", default=None, metavar="DIR", help="record every match to DIR/<sim>-<seed>.rec")
+    parser.add_argument("--scenario", default=None, help="draw the targets from this level of quadai.scenarios")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    results = run_tournament(args.sims, args.matches, args.time, args.seed, args.workers, args.swarm_size, args.exported,
+                             args.pid_gains, args.record, args.scenario)
+    summary = aggregate(results)
+    print_summary(summary)
+    print("{} matches in {:.1f}s".format(len(results), time.time() - start))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"summary": summary, "matches": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+train.py
+Training pipeline for SAC and DQN on the batched drone environments.
+
+Experience is collected from workers * envs_per_worker drones: with one
+worker they are stepped in this process by a DroneVecEnv, with more each
+worker process steps its own batch (SubprocDroneVecEnv), so collection uses
+several cores while this process trains.
+
+Every vectorized step collects one transition per env. The model is trained
+every --train-freq steps with --gradient-steps gradient steps, or, by default,
+with --replay-ratio gradient steps per collected transition (1 reproduces a
+single-env SAC run, lower trains faster on the same number of transitions).
+
+Runs are reproducible with --seed: it seeds torch, NumPy, the action sampling
+and every env worker.
+
+SAC can start from demonstrations (quadai.demos): --demos prefills its replay
+buffer with them, and --bc-epochs first trains its actor to imitate them.
+
+With --checkpoint-dir, the model and its replay buffer are checkpointed every
+--checkpoint-freq transitions (incrementally, see quadai.checkpoint), and a
+run started again with the same directory resumes from its last checkpoint.
+
+With --curriculum, drones start on the levels of quadai.scenarios, from
+nearby targets to perturbed starts, and every env worker moves to the next
+level once --promote-at of its last episodes reached their target.
+
+With --targets-per-episode N, an episode goes on to a new target every time
+one is reached, up to N targets as in the balloon game, instead of ending on
+the first one: fewer resets, and longer rollouts closer to how the models
+are played. Monitor logs then count targets_reached per episode.
+
+With --eval-dir, a snapshot is evaluated every --eval-freq transitions on the
+seeded scenario suite of quadai.evaluate, in a worker process while training
+goes on.
+
+Usage:
+python -m quadai.train SAC --workers 8 --envs-per-worker 16 --steps 6000000
+python -m quadai.train DQN --replay-ratio 0.25 --seed 1
+python -m quadai.train SAC --curriculum --steps 2000000
+python -m quadai.train SAC --targets-per-episode 20
+"""
+
+import argparse
+import json
+import os
+
+# Hyperparameters of the improved models (train_SAC.py / train_DQN.py)
+HYPERPARAMS = {
+    "SAC": {
+        "learning_rate": 1e-4,
+        "batch_size": 256,
+        "buffer_size": 500000,
+        "tau": 0.02,
+        "gamma": 0.99,
+        "policy_kwargs": {"net_arch": [256, 256]},
+    },
+    "DQN": {
+        "learning_rate": 5e-5,
+        "batch_size": 128,
+        "buffer_size": 1000000,
+        "exploration_fraction": 0.2,
+        "gamma": 0.99,
+        "policy_kwargs": {"net_arch": [256, 256]},
+    },
+}
+
+# Gradient steps per collected transition when neither --gradient-steps nor --replay-ratio is given
+REPLAY_RATIO = {"SAC": 1.0, "DQN": 0.25}
+
+
+def make_env(algo, workers=1, envs_per_worker=64, seed=None, width=900, height=900, scenarios=None,
+             targets_per_episode=1, time_limit=20):
+    from quadai.vec_env import DroneVecEnv, SubprocDroneVecEnv
+
+    discrete = algo == "DQN"
+    if workers > 1:
+        return SubprocDroneVecEnv(workers, envs_per_worker, discrete, width, height, seed, scenarios=scenarios,
+                                  targets_per_episode=targets_per_episode, time_limit=time_limit)
+    return DroneVecEnv(envs_per_worker, discrete, width, height, seed, scenarios, targets_per_episode, time_limit)
+
+
+def gradient_steps_for(replay_ratio, num_envs, train_freq):
+    """Gradient steps per training round for replay_ratio gradient steps per collected transition."""
+    return max(1, round(replay_ratio * num_envs * train_freq))
+
+
+def train(algo, total_timesteps, workers=1, envs_per_worker=64, train_freq=1, gradient_steps=None, replay_ratio=None,
+          seed=None, hyperparams=None, log_dir=None, eval_dir=None, eval_freq=50000, eval_episodes=1000, eval_workers=1,
+          demos=None, bc_epochs=0, checkpoint_dir=None, checkpoint_freq=100000, curriculum=False, curriculum_level=0,
+          promote_at=0.8, targets_per_episode=1, time_limit=20, save_path=None, verbose=1):
+    """Train an algo ("SAC" or "DQN") model up to total_timesteps transitions and return it.
+
+    A new model is made unless checkpoint_dir holds a checkpoint to resume.
+    """
+    import stable_baselines3
+    from stable_baselines3.common.callbacks import CallbackList
+    from stable_baselines3.common.vec_env import VecMonitor
+
+    from quadai.checkpoint import CheckpointCallback, TrainingCheckpoint
+    from quadai.evaluate import AsyncEvalCallback
+    from quadai.scenarios import ScenarioGenerator
+    from quadai.vec_env import CurriculumCallback
+
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    scenarios = ScenarioGenerator(level=curriculum_level, promote_at=promote_at) if curriculum else None
+    env = make_env(algo, workers, envs_per_worker, seed, scenarios=scenarios, targets_per_episode=targets_per_episode,
+                   time_limit=time_limit)
+    env = VecMonitor(env, log_dir, info_keywords=("targets_reached",) if targets_per_episode > 1 else ())
+
+    if gradient_steps is None:
+        ratio = REPLAY_RATIO[algo] if replay_ratio is None else replay_ratio
+        gradient_steps = gradient_steps_for(ratio, env.num_envs, train_freq)
+
+    checkpoint = TrainingCheckpoint(checkpoint_dir) if checkpoint_dir else None
+    resumed = checkpoint is not None and checkpoint.exists()
+    if resumed:
+        model = checkpoint.load(algo, env, verbose=verbose, tensorboard_log=log_dir)
+        if seed is not None:
+            # Not the same random streams as an uninterrupted run, but a repeatable resume
+            model.set_random_seed(seed + model.num_timesteps)
+        levels = checkpoint.buffer.state.get("curriculum_levels")
+        if curriculum and levels:
+            env.set_curriculum_levels(levels)
+        if verbose > 0:
+            print("Resuming {} from {} timesteps".format(checkpoint_dir, model.num_timesteps)
+                  + (", curriculum levels {}".format(levels) if curriculum and levels else ""))
+    else:
+        kwargs = dict(HYPERPARAMS[algo])
+        kwargs.update(hyperparams or {})
+        model = getattr(stable_baselines3, algo)(
+            "MlpPolicy", env, verbose=verbose, tensorboard_log=log_dir, seed=seed,
+            train_freq=train_freq, gradient_steps=gradient_steps, **kwargs)
+
+    if demos and not resumed:
+        if algo != "SAC":
+            raise ValueError("Demonstrations have continuous actions; only SAC can use them")
+        from quadai.demos import DemoDataset, behavior_cloning, prefill_replay_buffer
+        dataset = DemoDataset(demos)
+        added = prefill_replay_buffer(model.replay_buffer, dataset)
+        if verbose > 0:
+            print("Replay buffer prefilled with {} demonstration transitions".format(added))
+        if bc_epochs > 0:
+            behavior_cloning(model, dataset, bc_epochs, seed=seed or 0, verbose=verbose)
+
+    callbacks = []
+    if curriculum:
+        callbacks.append(CurriculumCallback(verbose=verbose))
+    if eval_dir:
+        callbacks.append(AsyncEvalCallback(algo, eval_dir, eval_freq, eval_episodes, seed or 0, eval_workers, verbose))
+    if checkpoint is not None:
+        callbacks.append(CheckpointCallback(checkpoint, checkpoint_freq, verbose))
+
+    try:
+        model.learn(total_timesteps=total_timesteps - model.num_timesteps, callback=CallbackList(callbacks),
+                    reset_num_timesteps=not resumed)
+    finally:
+        env.close()
+    if save_path:
+        model.save(save_path)
+    return model
+
+
+def main(argv=None, algo=None, **defaults):
+    """Command line training; the training scripts pass their algo and defaults (total_timesteps, save_path, ...)."""
+    parser = argparse.ArgumentParser(prog="python -m quadai.train")
+    if algo is None:
+        parser.add_argument("algo", choices=sorted(HYPERPARAMS))
+    parser.add_argument("--steps", type=int, dest="total_timesteps", default=1000000, help="transitions to collect")
+    parser.add_argument("--workers", type=int, default=1, help="env worker processes (1: step the envs in this process)")
+    parser.add_argument("--envs-per-worker", type=int, default=64)
+    parser.add_argument("--train-freq", type=int, default=1, help="vectorized steps between training rounds")
+    parser.add_argument("--gradient-steps", type=int, default=None, help="gradient steps per training round")
+    parser.add_argument("--replay-ratio", type=float, default=None,
+                        help="gradient steps per collected transition, if --gradient-steps is not given")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--hyperparams", type=json.loads, default=None, help="JSON overriding model hyperparameters")
+    parser.add_argument("--log-dir", default=None, help="monitor and TensorBoard logs")
+    parser.add_argument("--eval-dir", default=None, help="evaluation logs and best model")
+    parser.add_argument("--eval-freq", type=int, default=50000, help="transitions between evaluations")
+    parser.add_argument("--eval-episodes", type=int, default=1000, help="scenarios in the evaluation suite")
+    parser.add_argument("--eval-workers", type=int, default=1,
+                        help="evaluation processes (0: evaluate in the training process)")
+    parser.add_argument("--demos", nargs="+", default=None, help="demonstration datasets to prefill the replay buffer with")
+    parser.add_argument("--bc-epochs", type=int, default=0, help="behavior cloning epochs on --demos before training")
+    parser.add_argument("--checkpoint-dir", default=None, help="checkpoint model and replay buffer here; resume if present")
+    parser.add_argument("--checkpoint-freq", type=int, default=100000, help="transitions between checkpoints")
+    parser.add_argument("--curriculum", action="store_true", help="train on the levels of quadai.scenarios")
+    parser.add_argument("--curriculum-level", type=int, default=0, help="level a new run starts from (a resumed run keeps its checkpointed levels)")
+    parser.add_argument("--promote-at", type=float, default=0.8, help="success rate that moves the curriculum on")
+    parser.add_argument("--targets-per-episode", type=int, default=1, help="targets to reach before an episode ends")
+    parser.add_argument("--time-limit", type=float, default=20, help="seconds a drone has to reach each target")
+    parser.add_argument("--save", dest="save_path", default=None, help="where to save the final model")
+    parser.set_defaults(**defaults)
+    args = vars(parser.parse_args(argv))
+
+    train(args.pop("algo", algo), **args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+"""
+vec_env.py
+Batched drone environment: N drones simulated with NumPy arrays and advanced
+in one vectorized step. Follows the stable-baselines3 VecEnv interface so it
+can be passed straight to SAC/DQN in place of a DummyVecEnv of droneEnvs.
+
+Observation, physics and reward shaping are the same as env_SAC.droneEnv
+(discrete_actions=False) and env_DQN.droneEnv (discrete_actions=True).
+
+With scenarios (a quadai.scenarios.ScenarioGenerator), start states and
+targets are drawn from its current level, and the outcome of every episode
+is recorded into it, so a curriculum moves on as the success rate goes up.
+
+With targets_per_episode > 1, reaching a target spawns the next one, as in
+the balloon game, and the episode goes on until that many targets are
+reached, the drone is lost, or it spends time_limit seconds on one target.
+The info of a step that reaches a target holds its target_reward (reward
+collected since the previous target) and target_time; finished episodes
+report targets_reached.
+
+SubprocDroneVecEnv splits the envs over worker processes, each stepping its
+own DroneVecEnv batch, for collecting experience on several cores.
+"""
+
+import multiprocessing as mp
+
+import numpy as np
+from gym import spaces
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from quadai import physics
+
+
+class DroneVecEnv(VecEnv):
+    def __init__(self, num_envs, discrete_actions=False, width=900, height=900, seed=None, scenarios=None,
+                 targets_per_episode=1, time_limit=20):
+        self.discrete_actions = discrete_actions
+        self.width = width
+        self.height = height
+
+        self.gravity = physics.GRAVITY
+        self.thruster_amplitude = 0.04
+        self.thruster_mean = 0.04
+        self.mass = physics.MASS
+        self.arm = physics.ARM
+        self.time_limit = time_limit
+        self.targets_per_episode = targets_per_episode
+
+        if self.discrete_actions:
+            # Same as env_DQN: 0: nothing, 1:Up, 2:Down, 3:Right rotate, 4:Left rotate
+            self.diff_amplitude = 0.0006
+            self.closer_reward = 0.1
+            action_space = spaces.Discrete(5)
+        else:
+            # Same as env_SAC: 2 continuous actions (thrust and diff)
+            self.diff_amplitude = 0.003
+            self.closer_reward = 0.05
+            action_space = spaces.Box(low=-1, high=1, shape=(2,))
+        observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(7,), dtype=np.float32)
+        super(DroneVecEnv, self).__init__(num_envs, observation_space, action_space)
+
+        self.rng = np.random.default_rng(seed)
+        self.scenarios = scenarios
+
+        # Drone state, one entry per env
+        self.x = np.zeros(num_envs)
+        self.xd = np.zeros(num_envs)
+        self.y = np.zeros(num_envs)
+        self.yd = np.zeros(num_envs)
+        self.a = np.zeros(num_envs)
+        self.ad = np.zeros(num_envs)
+        self.xt = np.zeros(num_envs)
+        self.yt = np.zeros(num_envs)
+        self.time = np.zeros(num_envs)
+        self.targets_reached = np.zeros(num_envs, dtype=np.int64)
+        self.target_reward = np.zeros(num_envs)
+
+        # Thruster offsets for each discrete action, indexed by action
+        self._discrete_left = np.array([0, 1, -1, 0, 0]) * self.thruster_amplitude + np.array([0, 0, 0, 1, -1]) * self.diff_amplitude
+        self._discrete_right = np.array([0, 1, -1, 0, 0]) * self.thruster_amplitude - np.array([0, 0, 0, 1, -1]) * self.diff_amplitude
+
+        self.actions = None
+
+    def _reset_envs(self, mask):
+        count = int(np.count_nonzero(mask))
+        if count == 0:
+            return
+        self.time[mask] = 0
+        self.targets_reached[mask] = 0
+        self.target_reward[mask] = 0
+        if self.scenarios is not None:
+            scenario = self.scenarios.draw(self.rng, count)
+            for name in ("x", "xd", "y", "yd", "a", "ad", "xt", "yt"):
+                getattr(self, name)[mask] = scenario[name]
+            return
+        self.x[mask] = self.width / 2
+        self.y[mask] = self.height / 2
+        self.xd[mask] = 0
+        self.yd[mask] = 0
+        self.a[mask] = 0
+        self.ad[mask] = 0
+        self.xt[mask] = self.rng.integers(int(self.width / 4), int(3 * self.width / 4), size=count)
+        self.yt[mask] = self.rng.integers(int(self.height / 4), int(3 * self.height / 4), size=count)
+
+    def _next_targets(self, mask):
+        """Spawn the next target of the envs in mask, from where their drone is."""
+        count = int(np.count_nonzero(mask))
+        if self.scenarios is not None:
+            self.xt[mask], self.yt[mask] = self.scenarios.targets(self.rng, self.x[mask], self.y[mask])
+        else:
+            self.xt[mask] = self.rng.integers(int(self.width / 4), int(3 * self.width / 4), size=count)
+            self.yt[mask] = self.rng.integers(int(self.height / 4), int(3 * self.height / 4), size=count)
+        self.time[mask] = 0
+
+    def reset_to(self, xt, yt):
+        """Reset every env with the given targets instead of random ones (a fixed evaluation suite)."""
+        self.reset()
+        self.xt[:] = xt
+        self.yt[:] = yt
+        return self._get_obs()
+
+    def curriculum_levels(self):
+        """[level] of the scenarios curriculum, or None without scenarios (saved in training checkpoints)."""
+        return None if self.scenarios is None else [self.scenarios.level]
+
+    def set_curriculum_levels(self, levels):
+        self.scenarios.level = levels[0]
+        self.scenarios.outcomes.clear()
+
+    def _get_obs(self):
+        angle_to_up = self.a / 180 * np.pi
+        velocity = np.sqrt(self.xd**2 + self.yd**2)
+        dist_to_target = np.sqrt((self.xt - self.x)**2 + (self.yt - self.y)**2) / 500
+        angle_to_target = np.arctan2(self.yt - self.y, self.xt - self.x)
+        angle_target_and_velocity = angle_to_target - np.arctan2(self.yd, self.xd)
+        return np.stack(
+            [angle_to_up, velocity, self.ad, dist_to_target, angle_to_target, angle_target_and_velocity, dist_to_target],
+            axis=1,
+        ).astype(np.float32)
+
+    def pid_observations(self):
+        """(error_x, xd, error_y, yd, a, ad) of every env, the input of quadai.PID.cascade.CascadePositionController."""
+        return np.stack([self.xt - self.x, self.xd, self.yt - self.y, self.yd, self.a, self.ad], axis=1)
+
+    def _thrusters(self, actions):
+        if self.discrete_actions:
+            actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+            thruster_left = self.thruster_mean + self._discrete_left[actions]
+            thruster_right = self.thruster_mean + self._discrete_right[actions]
+        else:
+            # float64 like the scalar env, so float32 actions don't downcast the thrust
+            actions = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, 2)
+            action0 = actions[:, 0]
+            action1 = actions[:, 1]
+            # Same operation order as droneEnv.step
+            thruster_left = self.thruster_mean + action0 * self.thruster_amplitude + action1 * self.diff_amplitude
+            thruster_right = self.thruster_mean + action0 * self.thruster_amplitude - action1 * self.diff_amplitude
+        return thruster_left, thruster_right
+
+    def reset(self):
+        self._reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self._get_obs()
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        self.time += 1 / 60
+
+        old_dist = np.sqrt((self.x - self.xt)**2 + (self.y - self.yt)**2)
+
+        thruster_left, thruster_right = self._thrusters(self.actions)
+        physics.step_batch(
+            self.x, self.xd, self.y, self.yd, self.a, self.ad,
+            thruster_left, thruster_right, self.gravity, self.mass, self.arm)
+
+        dist = np.sqrt((self.x - self.xt)**2 + (self.y - self.yt)**2)
+
+        rewards = np.where(dist < old_dist, self.closer_reward, 0.0)
+        reached = dist < 50
+        lost = dist > 1000
+        rewards = rewards + np.where(reached, 100.0, 0.0)
+        rewards = rewards - np.where(lost, 1000.0, 0.0)
+        self.target_reward += rewards
+        self.targets_reached += reached
+        dones = (self.targets_reached >= self.targets_per_episode) | lost | (self.time > self.time_limit)
+
+        infos = [{} for _ in range(self.num_envs)]
+        if reached.any():
+            for i in np.flatnonzero(reached):
+                infos[i]["target_reward"] = float(self.target_reward[i])
+                infos[i]["target_time"] = float(self.time[i])
+            self.target_reward[reached] = 0
+            # Episodes going on after a target get their next one before the observation
+            self._next_targets(reached & ~dones)
+        if self.scenarios is not None and (reached.any() or dones.any()):
+            # One outcome per target: reached, or failed when the episode ended on it
+            self.scenarios.record(reached[reached | dones])
+
+        obs = self._get_obs()
+        if dones.any():
+            for i in np.flatnonzero(dones):
+                infos[i]["terminal_observation"] = obs[i].copy()
+                # How the episode ended: read by EvalCallback/VecMonitor (is_success) and quadai.evaluate
+                infos[i]["is_success"] = bool(reached[i])
+                infos[i]["lost"] = bool(lost[i])
+                infos[i]["targets_reached"] = int(self.targets_reached[i])
+            self._reset_envs(dones)
+            obs[dones] = self._get_obs()[dones]
+
+        return obs, rewards.astype(np.float32), dones, infos
+
+    def close(self):
+        pass
+
+    def seed(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        return [seed] * self.num_envs
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        # Methods act on the whole batch: called once, their result is split or repeated per env
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return per_env(result, self.num_envs, self._get_indices(indices))
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+    def get_images(self):
+        return []
+
+
+def per_env(result, num_envs, indices):
+    """Values for the envs in indices of a batch-level result: its rows if it has one per env, else itself."""
+    if isinstance(result, (np.ndarray, list, tuple)) and len(result) == num_envs:
+        return [result[i] for i in indices]
+    return [result for _ in indices]
+
+
+def _worker(remote, parent_remote, num_envs, discrete_actions, width, height, seed, scenarios, targets_per_episode,
+            time_limit):
+    parent_remote.close()
+    env = DroneVecEnv(num_envs, discrete_actions, width, height, seed, scenarios, targets_per_episode, time_limit)
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                env.step_async(data)
+                remote.send(env.step_wait())
+            elif cmd == "reset":
+                remote.send(env.reset())
+            elif cmd == "reset_to":
+                remote.send(env.reset_to(*data))
+            elif cmd == "pid_observations":
+                remote.send(env.pid_observations())
+            elif cmd == "seed":
+                remote.send(env.seed(data))
+            elif cmd == "get_attr":
+                remote.send(getattr(env, data))
+            elif cmd == "set_attr":
+                remote.send(setattr(env, *data))
+            elif cmd == "env_method":
+                name, args, kwargs = data
+                remote.send(getattr(env, name)(*args, **kwargs))
+            elif cmd == "close":
+                remote.close()
+                break
+    except KeyboardInterrupt:
+        pass
+
+
+def worker_seeds(seed, workers):
+    """Independent seeds for the DroneVecEnv of every worker (None stays None)."""
+    if seed is None:
+        return [None] * workers
+    return np.random.SeedSequence(seed).spawn(workers)
+
+
+class SubprocDroneVecEnv(VecEnv):
+    """workers processes of envs_per_worker drones each, seen as one VecEnv of workers * envs_per_worker envs.
+
+    Every worker gets its own copy of scenarios: a curriculum moves on in each
+    worker as that worker's drones succeed.
+    """
+
+    def __init__(self, workers, envs_per_worker, discrete_actions=False, width=900, height=900, seed=None,
+                 start_method=None, scenarios=None, targets_per_episode=1, time_limit=20):
+        self.workers = workers
+        self.envs_per_worker = envs_per_worker
+        self.discrete_actions = discrete_actions
+        self.waiting = False
+        self.closed = False
+
+        if start_method is None:
+            # Same default as stable-baselines3's SubprocVecEnv: fork is not safe once torch has started threads
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in range(workers)])
+        self.processes = []
+        for work_remote, remote, worker_seed in zip(work_remotes, self.remotes, worker_seeds(seed, workers)):
+            args = (work_remote, remote, envs_per_worker, discrete_actions, width, height, worker_seed, scenarios,
+                    targets_per_episode, time_limit)
+            # daemon: the workers die with the training process
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        if discrete_actions:
+            action_space = spaces.Discrete(5)
+        else:
+            action_space = spaces.Box(low=-1, high=1, shape=(2,))
+        observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(7,), dtype=np.float32)
+        super(SubprocDroneVecEnv, self).__init__(workers * envs_per_worker, observation_space, action_space)
+
+    def _gather(self):
+        return [remote.recv() for remote in self.remotes]
+
+    def _worker_indices(self, indices):
+        """Worker of each env in indices, and its index in that worker's batch."""
+        return [divmod(i, self.envs_per_worker) for i in self._get_indices(indices)]
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        return np.concatenate(self._gather())
+
+    def reset_to(self, xt, yt):
+        for remote, worker_xt, worker_yt in zip(self.remotes, np.split(np.asarray(xt), self.workers),
+                                                np.split(np.asarray(yt), self.workers)):
+            remote.send(("reset_to", (worker_xt, worker_yt)))
+        return np.concatenate(self._gather())
+
+    def step_async(self, actions):
+        actions = np.asarray(actions)
+        for remote, worker_actions in zip(self.remotes, np.split(actions, self.workers)):
+            remote.send(("step", worker_actions))
+        self.waiting = True
+
+    def step_wait(self):
+        results = self._gather()
+        self.waiting = False
+        obs, rewards, dones, infos = zip(*results)
+        return np.concatenate(obs), np.concatenate(rewards), np.concatenate(dones), [i for info in infos for i in info]
+
+    def pid_observations(self):
+        for remote in self.remotes:
+            remote.send(("pid_observations", None))
+        return np.concatenate(self._gather())
+
+    def curriculum_levels(self):
+        """Curriculum level of every worker, or None without scenarios."""
+        for remote in self.remotes:
+            remote.send(("env_method", ("curriculum_levels", (), {})))
+        levels = self._gather()
+        return None if levels[0] is None else [level for worker_levels in levels for level in worker_levels]
+
+    def set_curriculum_levels(self, levels):
+        """One level per worker; with another number of workers, all of them go back to the lowest level."""
+        if len(levels) != self.workers:
+            levels = [min(levels)] * self.workers
+        for remote, level in zip(self.remotes, levels):
+            remote.send(("env_method", ("set_curriculum_levels", ([level],), {})))
+        self._gather()
+
+    def seed(self, seed=None):
+        for remote, worker_seed in zip(self.remotes, worker_seeds(seed, self.workers)):
+            remote.send(("seed", worker_seed))
+        self._gather()
+        return [seed] * self.num_envs
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            self._gather()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def get_attr(self, attr_name, indices=None):
+        # Attributes are shared by the whole batch of a worker
+        values = {}
+        for worker, _ in self._worker_indices(indices):
+            if worker not in values:
+                self.remotes[worker].send(("get_attr", attr_name))
+                values[worker] = self.remotes[worker].recv()
+        return [values[worker] for worker, _ in self._worker_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        for worker in sorted({worker for worker, _ in self._worker_indices(indices)}):
+            self.remotes[worker].send(("set_attr", (attr_name, value)))
+            self.remotes[worker].recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        # Once per worker, on its whole batch, split or repeated per env like DroneVecEnv.env_method
+        worker_indices = self._worker_indices(indices)
+        workers = sorted({worker for worker, _ in worker_indices})
+        for worker in workers:
+            self.remotes[worker].send(("env_method", (method_name, method_args, method_kwargs)))
+        results = {worker: self.remotes[worker].recv() for worker in workers}
+        return [per_env(results[worker], self.envs_per_worker, [i])[0] for worker, i in worker_indices]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+    def get_images(self):
+        return []
+
+
+class CurriculumCallback(BaseCallback):
+    """Logs the curriculum level of the envs' scenarios (every worker's copy) every check_freq steps."""
+
+    def __init__(self, check_freq=1000, verbose=1):
+        super().__init__(verbose)
+        self.check_freq = check_freq
+        self.levels = None
+
+    def _on_step(self):
+        if self.n_calls % self.check_freq == 0:
+            # One copy per worker process, the same object for every env of a DroneVecEnv
+            scenarios = list({id(s): s for s in self.training_env.get_attr("scenarios")}.values())
+            levels = [s.level for s in scenarios]
+            if self.verbose > 0 and self.levels is not None and levels != self.levels:
+                print("Curriculum at {} timesteps: level {}".format(
+                    self.num_timesteps, ", ".join(scenarios[i].params["name"] for i in range(len(scenarios)))))
+            self.levels = levels
+            self.logger.record("curriculum/level", float(np.mean(levels)))
+            rates = [s.success_rate() for s in scenarios if s.success_rate() is not None]
+            if rates:
+                self.logger.record("curriculum/success_rate", float(np.mean(rates)))
+        return True
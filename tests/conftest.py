@@ -0,0 +1,8 @@
+"""
+Shared pytest setup: the tests run against src/ without installing the package.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
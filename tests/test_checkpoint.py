@@ -0,0 +1,128 @@
+"""
+Incremental replay buffer checkpoints: save, wrap the buffer around, resume.
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("stable_baselines3")
+
+from gym import spaces
+from stable_baselines3.common.buffers import ReplayBuffer
+
+from quadai.checkpoint import ReplayBufferCheckpoint, TrainingCheckpoint
+
+N_ENVS = 4
+OBSERVATION_SPACE = spaces.Box(low=-np.inf, high=np.inf, shape=(7,), dtype=np.float32)
+ACTION_SPACE = spaces.Box(low=-1, high=1, shape=(2,))
+
+
+def make_buffer(size=50):
+    return ReplayBuffer(size * N_ENVS, OBSERVATION_SPACE, ACTION_SPACE, device="cpu", n_envs=N_ENVS)
+
+
+def fill(buffer, steps, rng):
+    for _ in range(steps):
+        dones = rng.random(N_ENVS) < 0.05
+        infos = [{"TimeLimit.truncated": bool(done and rng.random() < 0.5)} for done in dones]
+        buffer.add(rng.normal(size=(N_ENVS, 7)), rng.normal(size=(N_ENVS, 7)), rng.uniform(-1, 1, (N_ENVS, 2)),
+                   rng.normal(size=N_ENVS), dones, infos)
+
+
+def assert_same(restored, buffer):
+    assert (restored.pos, restored.full) == (buffer.pos, buffer.full)
+    for field in ("observations", "next_observations", "actions", "rewards", "dones", "timeouts"):
+        np.testing.assert_array_equal(getattr(restored, field), getattr(buffer, field))
+
+
+@pytest.mark.parametrize("steps", [[30], [30, 40], [30, 40, 15], [10, 120], [60, 60, 60]],
+                         ids=["partial", "wraps", "wraps-then-partial", "more-than-buffer", "full-cycles"])
+def test_incremental_saves_restore(tmp_path, steps):
+    rng = np.random.default_rng(0)
+    buffer = make_buffer()
+    checkpoint = ReplayBufferCheckpoint(str(tmp_path))
+    num_timesteps = 0
+    for count in steps:
+        fill(buffer, count, rng)
+        num_timesteps += count * N_ENVS
+        checkpoint.save(buffer, num_timesteps)
+
+    # A new process resuming from the directory
+    restored = make_buffer()
+    resumed = ReplayBufferCheckpoint(str(tmp_path))
+    assert resumed.exists() and resumed.state["num_timesteps"] == num_timesteps
+    resumed.restore(restored)
+    assert_same(restored, buffer)
+
+    # and checkpointing on from there, around the buffer again
+    fill(restored, 70, rng)
+    resumed.save(restored, num_timesteps + 70 * N_ENVS)
+    again = make_buffer()
+    ReplayBufferCheckpoint(str(tmp_path)).restore(again)
+    assert_same(again, restored)
+
+
+def test_restore_checks_shape(tmp_path):
+    buffer = make_buffer()
+    fill(buffer, 5, np.random.default_rng(0))
+    ReplayBufferCheckpoint(str(tmp_path)).save(buffer, 5 * N_ENVS)
+    with pytest.raises(ValueError):
+        ReplayBufferCheckpoint(str(tmp_path)).restore(make_buffer(size=60))
+
+
+def test_training_checkpoint_round_trip(tmp_path):
+    from stable_baselines3 import SAC
+
+    from quadai.vec_env import DroneVecEnv
+
+    model = SAC("MlpPolicy", DroneVecEnv(N_ENVS, seed=0), buffer_size=100 * N_ENVS, learning_starts=50,
+                policy_kwargs={"net_arch": [16]}, seed=0)
+    model.learn(600)
+    checkpoint = TrainingCheckpoint(str(tmp_path))
+    checkpoint.save(model, curriculum_levels=[2])
+    model.learn(200, reset_num_timesteps=False)
+    checkpoint.save(model)
+
+    state = json.load(open(os.path.join(str(tmp_path), "state.json")))
+    assert state["model"] == "model-{}.zip".format(model.num_timesteps)
+    # Only the current model is kept
+    assert sorted(f for f in os.listdir(str(tmp_path)) if f.endswith(".zip")) == [state["model"]]
+
+    loaded = TrainingCheckpoint(str(tmp_path)).load("SAC", DroneVecEnv(N_ENVS, seed=1), device="cpu")
+    assert loaded.num_timesteps == model.num_timesteps
+    assert_same(loaded.replay_buffer, model.replay_buffer)
+    for key, value in model.policy.state_dict().items():
+        np.testing.assert_array_equal(loaded.policy.state_dict()[key].cpu().numpy(), value.cpu().numpy())
+
+
+def test_uncommitted_model_is_ignored(tmp_path):
+    from stable_baselines3 import SAC
+
+    from quadai.vec_env import DroneVecEnv
+
+    model = SAC("MlpPolicy", DroneVecEnv(N_ENVS, seed=0), buffer_size=100, learning_starts=10,
+                policy_kwargs={"net_arch": [16]}, seed=0)
+    model.learn(40)
+    checkpoint = TrainingCheckpoint(str(tmp_path))
+    checkpoint.save(model)
+    # A save that crashed after writing its model, before state.json
+    model.num_timesteps += 1000
+    model.save(os.path.join(str(tmp_path), "model-{}.zip".format(model.num_timesteps)))
+    resumed = TrainingCheckpoint(str(tmp_path))
+    assert resumed.load("SAC", DroneVecEnv(N_ENVS, seed=0), device="cpu").num_timesteps == 40
+
+
+def test_dqn_target_update_interval_survives_load(tmp_path):
+    from stable_baselines3 import DQN
+
+    from quadai.vec_env import DroneVecEnv
+
+    model = DQN("MlpPolicy", DroneVecEnv(N_ENVS, discrete_actions=True, seed=0), buffer_size=100, learning_starts=10,
+                target_update_interval=800, policy_kwargs={"net_arch": [16]}, seed=0)
+    model.learn(40)
+    TrainingCheckpoint(str(tmp_path)).save(model)
+    loaded = TrainingCheckpoint(str(tmp_path)).load("DQN", DroneVecEnv(N_ENVS, discrete_actions=True, seed=1), device="cpu")
+    assert loaded.target_update_interval == model.target_update_interval == 800 // N_ENVS
@@ -0,0 +1,76 @@
+"""
+PIDBank and the cascaded controllers built on it against single PID instances.
+"""
+
+import copy
+
+import numpy as np
+
+from quadai.PID.controller_PID import PID, PIDBank
+
+DT = 1 / 60
+
+
+def random_pids(count, seed=0):
+    rng = np.random.default_rng(seed)
+    pids = []
+    for i in range(count):
+        kp, ki, kd = rng.uniform(0, 2, 3)
+        # Every other controller without saturation on one side, like PID(..., None, ...)
+        saturation_max = None if i % 4 == 1 else float(rng.uniform(0.5, 5))
+        saturation_min = None if i % 4 == 2 else -float(rng.uniform(0.5, 5))
+        pids.append(PID(kp, ki, kd, saturation_max, saturation_min))
+    return pids
+
+
+def test_bank_matches_pids():
+    pids = random_pids(12)
+    bank = PIDBank.from_pids(pids)
+    rng = np.random.default_rng(1)
+    for _ in range(300):
+        errors = rng.normal(0, 3, len(pids))
+        outputs = bank.compute(errors, DT)
+        expected = [pid.compute(float(error), DT) for pid, error in zip(pids, errors)]
+        np.testing.assert_array_equal(outputs, expected)
+
+
+def test_bank_subset_and_state_round_trip():
+    pids = random_pids(10, seed=2)
+    reference = copy.deepcopy(pids)
+    bank = PIDBank.from_pids(pids)
+    rng = np.random.default_rng(3)
+    for _ in range(100):
+        index = np.sort(rng.choice(len(pids), 4, replace=False))
+        errors = rng.normal(0, 3, len(index))
+        outputs = bank.compute(errors, DT, index)
+        expected = [reference[i].compute(float(error), DT) for i, error in zip(index, errors)]
+        np.testing.assert_array_equal(outputs, expected)
+    for i, pid in enumerate(pids):
+        bank.store(i, pid)
+        assert pid.error_last == reference[i].error_last
+        assert pid.integral_error == reference[i].integral_error
+
+
+def test_bank_reset():
+    bank = PIDBank(1.0, 0.5, 0.1, None, None, size=8)
+    bank.compute(np.ones(8), DT)
+    mask = np.arange(8) % 2 == 0
+    bank.reset(mask)
+    assert not bank.error_last[mask].any() and not bank.integral_error[mask].any()
+    assert bank.error_last[~mask].all() and bank.integral_error[~mask].all()
+
+
+def test_pid_players_batched_like_alone():
+    from quadai.player import PIDPlayer
+
+    batched = [PIDPlayer() for _ in range(10)]
+    alone = [PIDPlayer() for _ in range(10)]
+    rng = np.random.default_rng(4)
+    for _ in range(200):
+        obs = rng.normal(0, [100, 3, 100, 3, 20, 1], (10, 6))
+        thrusts = PIDPlayer.act_batch(batched, obs)
+        expected = np.array([player.act(row) for player, row in zip(alone, obs)])
+        np.testing.assert_array_equal(np.stack(thrusts, axis=1), expected)
+    # Acting alone again picks up the state the bank kept
+    obs = rng.normal(0, [100, 3, 100, 3, 20, 1], 6)
+    assert batched[3].act(obs) == alone[3].act(obs)
@@ -0,0 +1,53 @@
+"""
+NumPy exports of SAC/DQN policies against stable-baselines3's own predictions.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+stable_baselines3 = pytest.importorskip("stable_baselines3")
+
+from quadai import registry
+from quadai.policy_export import NumpyPolicy, export_policy
+
+
+def observations(count=512, seed=0):
+    rng = np.random.default_rng(seed)
+    # Around the ranges droneEnv observes: angles, speeds, distances / 500
+    return rng.normal(0, [1, 3, 1, 0.5, 2, 2, 0.5], (count, 7)).astype(np.float32)
+
+
+def check_export(model, path, tmp_path):
+    policy = NumpyPolicy.load(export_policy(path, str(tmp_path / "policy.weights")))
+    obs = observations()
+    expected, _ = model.predict(obs, deterministic=True)
+    actions, _ = policy.predict(obs, deterministic=True)
+    if isinstance(model, stable_baselines3.DQN):
+        np.testing.assert_array_equal(actions, expected)
+    else:
+        np.testing.assert_allclose(actions, expected, atol=1e-5)
+    # One observation takes another BLAS path than a batch: equal up to float32 rounding
+    single, _ = policy.predict(obs[0], deterministic=True)
+    np.testing.assert_allclose(single, actions[0], atol=1e-6)
+
+
+@pytest.mark.parametrize("algo", ["SAC", "DQN"])
+def test_fresh_model(algo, tmp_path):
+    from quadai.vec_env import DroneVecEnv
+    env = DroneVecEnv(2, discrete_actions=algo == "DQN", seed=0)
+    model = getattr(stable_baselines3, algo)("MlpPolicy", env, seed=0, policy_kwargs={"net_arch": [32, 16]})
+    path = str(tmp_path / "model.zip")
+    model.save(path)
+    check_export(model, path, tmp_path)
+
+
+@pytest.mark.parametrize("name", sorted(registry.MODELS))
+def test_registered_model(name, tmp_path):
+    algo, path = registry.resolve(name)
+    path = registry.full_path(path)
+    if not os.path.exists(path):
+        pytest.skip("{} is not in models/".format(path))
+    model = getattr(stable_baselines3, algo).load(path, device="cpu")
+    check_export(model, path, tmp_path)
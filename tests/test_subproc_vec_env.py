@@ -0,0 +1,73 @@
+"""
+SubprocDroneVecEnv against the DroneVecEnv batches its workers step.
+"""
+
+import numpy as np
+import pytest
+
+from quadai.scenarios import ScenarioGenerator
+from quadai.vec_env import DroneVecEnv, SubprocDroneVecEnv, worker_seeds
+
+WORKERS = 2
+ENVS_PER_WORKER = 4
+
+
+@pytest.fixture
+def make_envs():
+    opened = []
+
+    def make(**kwargs):
+        env = SubprocDroneVecEnv(WORKERS, ENVS_PER_WORKER, seed=0, **kwargs)
+        opened.append(env)
+        batches = [DroneVecEnv(ENVS_PER_WORKER, seed=seed, **kwargs) for seed in worker_seeds(0, WORKERS)]
+        return env, batches
+
+    yield make
+    for env in opened:
+        env.close()
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"targets_per_episode": 3}, {"scenarios": ScenarioGenerator(level=3)}],
+                         ids=["default", "multi-target", "scenarios"])
+def test_matches_worker_batches(make_envs, kwargs):
+    env, batches = make_envs(**kwargs)
+    np.testing.assert_array_equal(env.reset(), np.concatenate([batch.reset() for batch in batches]))
+    rng = np.random.default_rng(0)
+    dones_seen = 0
+    for _ in range(600):
+        actions = rng.uniform(-1, 1, (env.num_envs, 2))
+        obs, rewards, dones, infos = env.step(actions)
+        expected = [batch.step(a) for batch, a in zip(batches, np.split(actions, WORKERS))]
+        np.testing.assert_array_equal(obs, np.concatenate([e[0] for e in expected]))
+        np.testing.assert_array_equal(rewards, np.concatenate([e[1] for e in expected]))
+        np.testing.assert_array_equal(dones, np.concatenate([e[2] for e in expected]))
+        assert [sorted(info) for info in infos] == [sorted(info) for e in expected for info in e[3]]
+        dones_seen += dones.sum()
+    assert dones_seen > 0
+
+
+def test_reset_to_and_pid_observations(make_envs):
+    env, _ = make_envs()
+    xt = np.arange(env.num_envs) * 10.0 + 300
+    yt = np.full(env.num_envs, 400.0)
+    env.reset_to(xt, yt)
+    observations = env.pid_observations()
+    np.testing.assert_array_equal(observations[:, 0], xt - 450)
+    np.testing.assert_array_equal(observations[:, 2], yt - 450)
+
+
+def test_env_method_once_per_worker(make_envs):
+    env, _ = make_envs()
+    env.reset()
+    observations = env.env_method("pid_observations", indices=[1, 6])
+    np.testing.assert_array_equal(np.stack(observations), env.pid_observations()[[1, 6]])
+    assert env.env_method("seed", 3, indices=[0, 5]) == [3, 3]
+    assert env.get_attr("targets_per_episode") == [1] * env.num_envs
+
+
+def test_curriculum_levels(make_envs):
+    env, _ = make_envs(scenarios=ScenarioGenerator())
+    assert env.curriculum_levels() == [0, 0]
+    env.set_curriculum_levels([2, 4])
+    assert env.curriculum_levels() == [2, 4]
+    assert [s.level for s in env.get_attr("scenarios", indices=[0, 4])] == [2, 4]
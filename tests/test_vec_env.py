@@ -0,0 +1,81 @@
+"""
+DroneVecEnv against the scalar droneEnvs it batches: same observations,
+rewards and dones, bit for bit, up to the end of every env's first episode.
+"""
+
+import numpy as np
+import pytest
+
+from quadai.DQN.env_DQN import droneEnv as DQNEnv
+from quadai.SAC.env_SAC import droneEnv as SACEnv
+from quadai.vec_env import DroneVecEnv
+
+NUM_ENVS = 16
+STEPS = 1500
+
+
+def scalar_envs(make, count, seed):
+    np.random.seed(seed)
+    envs = [make() for _ in range(count)]
+    return envs, [env.reset() for env in envs]
+
+
+def compare(envs, first_obs, vec_env, actions):
+    obs = vec_env.reset_to([env.xt for env in envs], [env.yt for env in envs])
+    np.testing.assert_array_equal(obs, np.stack(first_obs))
+    running = np.ones(len(envs), dtype=bool)
+    for step_actions in actions:
+        vec_obs, vec_rewards, vec_dones, vec_infos = vec_env.step(step_actions)
+        for i in np.flatnonzero(running):
+            obs, reward, done, _ = envs[i].step(step_actions[i])
+            expected_obs = vec_infos[i]["terminal_observation"] if vec_dones[i] else vec_obs[i]
+            np.testing.assert_array_equal(obs, expected_obs)
+            assert np.float32(reward) == vec_rewards[i]
+            assert done == vec_dones[i]
+            if done:
+                running[i] = False
+        if not running.any():
+            break
+    return running
+
+
+def test_continuous_matches_env_sac():
+    rng = np.random.default_rng(0)
+    envs, first_obs = scalar_envs(SACEnv, NUM_ENVS, seed=1)
+    actions = rng.uniform(-1, 1, (STEPS, NUM_ENVS, 2))
+    running = compare(envs, first_obs, DroneVecEnv(NUM_ENVS, seed=0), actions)
+    assert not running.all()
+
+
+def test_discrete_matches_env_dqn():
+    rng = np.random.default_rng(0)
+    envs, first_obs = scalar_envs(lambda: DQNEnv(False, False), NUM_ENVS, seed=2)
+    actions = rng.integers(0, 5, (STEPS, NUM_ENVS))
+    running = compare(envs, first_obs, DroneVecEnv(NUM_ENVS, discrete_actions=True, seed=0), actions)
+    assert not running.all()
+
+
+@pytest.mark.parametrize("discrete", [False, True])
+def test_same_seed_same_run(discrete):
+    rng = np.random.default_rng(3)
+    if discrete:
+        actions = rng.integers(0, 5, (300, 8))
+    else:
+        actions = rng.uniform(-1, 1, (300, 8, 2))
+    runs = []
+    for _ in range(2):
+        env = DroneVecEnv(8, discrete, seed=7)
+        env.reset()
+        runs.append([env.step(a)[:3] for a in actions])
+    for (obs_a, rewards_a, dones_a), (obs_b, rewards_b, dones_b) in zip(*runs):
+        np.testing.assert_array_equal(obs_a, obs_b)
+        np.testing.assert_array_equal(rewards_a, rewards_b)
+        np.testing.assert_array_equal(dones_a, dones_b)
+
+
+def test_env_method_runs_once_per_batch():
+    env = DroneVecEnv(4, seed=0)
+    env.reset()
+    observations = env.env_method("pid_observations", indices=[1, 3])
+    np.testing.assert_array_equal(np.stack(observations), env.pid_observations()[[1, 3]])
+    assert env.env_method("seed", 5) == [5] * 4